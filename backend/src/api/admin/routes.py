@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, date
 
 from src.infrastructure.database import get_db
 from src.infrastructure.models import ProductoModel, VentaModel, UsuarioModel
 from src.api.deps import get_current_employee
-from src.services.ai_catalog import AISearchService
-from .schemas import ProductoCreateSchema, KPIDashboardSchema, StockUpdateSchema
+from src.services.embeddings import embed
+from src.services.catalog_events import notificar_cambio_productos
+from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from .schemas import ProductoCreateSchema, KPIDashboardSchema, StockUpdateSchema, ReencolarFacturasSchema
 
 admin_router = APIRouter(
     prefix="/admin", 
@@ -44,9 +47,8 @@ def crear_producto_con_ia(data: ProductoCreateSchema, db: Session = Depends(get_
     if db.query(ProductoModel).filter(ProductoModel.sku == data.sku).first():
         raise HTTPException(status_code=400, detail="El SKU ya existe")
 
-    ai_service = AISearchService(db)
     texto_para_vector = f"{data.nombre} {data.descripcion_tecnica}"
-    vector = ai_service._generar_embedding_simulado(texto_para_vector)
+    vector = embed(texto_para_vector)
 
     nuevo_prod = ProductoModel(
         nombre=data.nombre,
@@ -62,6 +64,7 @@ def crear_producto_con_ia(data: ProductoCreateSchema, db: Session = Depends(get_
     db.add(nuevo_prod)
     db.commit()
     db.refresh(nuevo_prod)
+    notificar_cambio_productos([nuevo_prod.id])
     
     return {"msg": "Producto creado e indexado en Motor IA", "id": nuevo_prod.id}
 
@@ -83,4 +86,28 @@ def ajustar_stock_manual(
         prod.stock -= movimiento.cantidad
     
     db.commit()
-    return {"msg": "Stock actualizado", "nuevo_stock": prod.stock}
\ No newline at end of file
+    notificar_cambio_productos([prod.id], contenido=False)
+    return {"msg": "Stock actualizado", "nuevo_stock": prod.stock}
+
+@admin_router.post("/facturacion/reencolar")
+async def reencolar_facturas(data: ReencolarFacturasSchema, db: Session = Depends(get_db)):
+    """Re-envía ventas a la cola SUNAT: miles de tareas en un solo pipeline a Redis."""
+    if data.venta_ids:
+        venta_ids = data.venta_ids[:data.limite]
+    else:
+        stmt = select(VentaModel.id).where(VentaModel.estado == data.estado).order_by(VentaModel.fecha).limit(data.limite)
+        venta_ids = await run_in_threadpool(lambda: db.execute(stmt).scalars().all())
+
+    try:
+        encoladas = await QueueAdapter().encolar_facturas_async(venta_ids)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Cola de facturación no disponible: {e}")
+    return {"msg": "Facturas re-encoladas", "encoladas": encoladas}
+
+@admin_router.get("/facturacion/cola")
+def estado_cola_facturacion():
+    """Monitor de la cola SUNAT: pendientes sin confirmar, lag del grupo y reparto por worker."""
+    try:
+        return QueueAdapter().estado_pendientes()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Cola de facturación no disponible: {e}")
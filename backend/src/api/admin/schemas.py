@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
 
 class ProductoCreateSchema(BaseModel):
     nombre: str
@@ -18,4 +19,9 @@ class KPIDashboardSchema(BaseModel):
     ventas_hoy: float
     productos_bajo_stock: int
     ticket_promedio: float
-    alerta_ia: Optional[str] = None
\ No newline at end of file
+    alerta_ia: Optional[str] = None
+
+class ReencolarFacturasSchema(BaseModel):
+    venta_ids: Optional[List[UUID]] = None # Si no se indica, todas las ventas en `estado`
+    estado: str = "PENDIENTE_FACTURACION"
+    limite: int = Field(10000, gt=0, le=100000)
@@ -1,68 +1,138 @@
+import logging
+import time
+import uuid
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from src.infrastructure.database import get_db
 from src.infrastructure.models import ProductoModel
-from src.api.deps import get_current_employee
+from src.infrastructure.read_models import ProductoResumen
+from src.api.deps import get_current_employee, get_employee_claims
 # Importamos los servicios (RAGService en mayúscula)
 from src.services.rag_service import RAGService 
+from src.services.ingestion_jobs import ColaIngestaLlena, encolar_ingesta, estado_job
 from src.services.agents import PurchasingAgent
+from src.services.catalog_cache import normalizar_consulta
+from src.services.chat_cache import CHAT_CACHE_ENABLED, cache_chat
+from src.services.embeddings import obtener_motor
+from src.services.product_name_index import buscar_productos_por_nombre, tokenizar
+
+logger = logging.getLogger(__name__)
 
 ai_router = APIRouter(prefix="/ai", tags=["Inteligencia Artificial"])
 
+INTENTOS_COMPRA = ["precio", "cuesta", "vale", "cuanto", "stock", "tienes"]
+# Mismas palabras, normalizadas como los tokens del índice de nombres
+_PALABRAS_INTENTO = {t for p in INTENTOS_COMPRA + ["cuestan", "valen", "tiene", "hay"] for t in tokenizar(p)}
+
+
+def _responder_precio(db: Session, pregunta_lower: str):
+    """Router de precios: (respuesta, ids de productos citados)."""
+    palabras = [p for p in pregunta_lower.split() if any(t not in _PALABRAS_INTENTO for t in tokenizar(p))]
+
+    if not palabras:
+        return "🤖 Para darte precios, necesito saber el nombre del producto.", []
+
+    candidatos = buscar_productos_por_nombre(palabras)
+    if candidatos is None:
+        # Índice no disponible en este worker: búsqueda directa palabra a palabra.
+        # Palabras cortas ("de", "la", "x") fuera: un ILIKE con ellas casa con casi todo
+        candidatos = [
+            (fila[0], 0.0)
+            for palabra in palabras if len(palabra) > 3
+            for fila in db.execute(
+                select(ProductoModel.id).where(ProductoModel.nombre.ilike(f"%{palabra}%")).limit(1)
+            )
+        ]
+
+    # Sólo el elegido se lee de la BD (precio y stock vivos)
+    for producto_id, _ in candidatos:
+        producto = ProductoResumen.desde_fila(db.execute(
+            ProductoResumen.select().where(ProductoModel.id == producto_id)
+        ).first())
+
+        if producto:
+            stock_msg = "✅ En Stock" if producto.stock > 0 else "❌ Agotado"
+            return (
+                f"💰 El **{producto.nombre}** tiene un precio de **S/ {float(producto.precio_dinamico):.2f}**.\nEstado: {stock_msg} ({producto.stock} unds).",
+                [producto.id],
+            )
+
+    return "🤖 No encontré ese producto exacto en el inventario.", []
+
+
 @ai_router.post("/chat")
 def chatear_con_manuales(
     pregunta: str = Form(...), 
     db: Session = Depends(get_db)
 ):
     """
-    REQ-AI-01: Chatbot con Router Semántico.
+    REQ-AI-01: Chatbot con Router Semántico (con caché semántica de respuestas).
     """
     try:
         pregunta_lower = pregunta.lower()
-        
-        intentos_compra = ["precio", "cuesta", "vale", "cuanto", "stock", "tienes"]
-        
-        if any(x in pregunta_lower for x in intentos_compra):
-            palabras = [p for p in pregunta_lower.split() if len(p) > 3 and p not in intentos_compra]
-            
-            if not palabras:
-                return {"respuesta": "🤖 Para darte precios, necesito saber el nombre del producto."}
-            
-            for palabra in palabras:
-                producto = db.query(ProductoModel).filter(
-                    ProductoModel.nombre.ilike(f"%{palabra}%")
-                ).first()
-                
-                if producto:
-                    stock_msg = "✅ En Stock" if producto.stock > 0 else "❌ Agotado"
-                    return {
-                        "respuesta": f"💰 El **{producto.nombre}** tiene un precio de **S/ {float(producto.precio_dinamico):.2f}**.\nEstado: {stock_msg} ({producto.stock} unds)."
-                    }
-            
-            return {"respuesta": "🤖 No encontré ese producto exacto en el inventario."}
-
-        rag = RAGService() 
-        respuesta_rag = rag.consultar(pregunta)
-        return {"respuesta": respuesta_rag}
+        ruta = "precio" if any(x in pregunta_lower for x in INTENTOS_COMPRA) else "rag"
 
-    except Exception as e:
-        print(f"❌ Error en Chat: {e}")
+        vector_cache = None
+        if CHAT_CACHE_ENABLED:
+            # Sólo para la caché: el RAG embebe la pregunta tal cual, con o sin caché
+            vector_cache = obtener_motor().embed(normalizar_consulta(pregunta))
+            cacheada = cache_chat.buscar(ruta, vector_cache)
+            if cacheada is not None:
+                return {"respuesta": cacheada}
+            epoca = cache_chat.epoca()
+
+        inicio = time.perf_counter()
+        if ruta == "precio":
+            respuesta, ids = _responder_precio(db, pregunta_lower)
+        else:
+            respuesta, ids = RAGService(db=db).responder(pregunta)
+
+        if CHAT_CACHE_ENABLED:
+            cache_chat.guardar(ruta, vector_cache, respuesta, ids, (time.perf_counter() - inicio) * 1000, epoca)
+        return {"respuesta": respuesta}
+
+    except Exception:
+        logger.exception("Error en chat")
         return {"respuesta": "Lo siento, mis circuitos están en mantenimiento."}
 
 
-@ai_router.post("/ingestar-pdf")
+@ai_router.post("/ingestar-pdf", status_code=202)
 async def subir_manual(
     producto_id: str = Form(...),
     file: UploadFile = File(...),
+    db: Session = Depends(get_db),
     admin=Depends(get_current_employee)
 ):
-    """Admin sube PDF -> Se vectoriza"""
+    """Admin sube PDF -> job de vectorización (progreso en /ingestas/{job_id} y /ws)"""
     try:
-        rag = RAGService()
-        resultado = await rag.ingestar_pdf(producto_id, file)
-        return resultado
+        producto_uuid = uuid.UUID(producto_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado")
+    # Errores de BD no se disfrazan de 404: que lleguen como 500
+    existe = await run_in_threadpool(
+        lambda: db.query(ProductoModel.id).filter(ProductoModel.id == producto_uuid).first()
+    )
+    if not existe:
+        raise HTTPException(status_code=404, detail=f"Producto {producto_id} no encontrado")
+
+    try:
+        job_id = await encolar_ingesta(producto_id, file)
+    except ColaIngestaLlena as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"job_id": job_id, "estado": "EN_COLA"}
+
+
+@ai_router.get("/ingestas/{job_id}")
+def consultar_ingesta(job_id: str, admin=Depends(get_employee_claims)):
+    """Estado y progreso de un job de ingesta de manual"""
+    estado = estado_job(job_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Job de ingesta no encontrado o expirado")
+    return estado
 
 
 @ai_router.post("/agente-compras/{producto_id}")
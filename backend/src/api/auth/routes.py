@@ -1,47 +1,63 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from src.infrastructure.database import get_db
 from src.infrastructure.models import UsuarioModel, ClienteModel
-from src.core.security import verify_password, create_access_token, get_password_hash
+from src.core.security import create_access_token
+from src.core.password_executor import ServicioSaturado, hashear_password, verificar_password
+from src.services.login_limiter import ip_cliente, limpiar_intentos, registrar_intento
 from .schemas import LoginSchema, TokenSchema, RegisterClienteSchema
 
 auth_router = APIRouter(prefix="/auth", tags=["Seguridad & Acceso"])
+logger = logging.getLogger(__name__)
+
+# Las rutas de auth son async: bcrypt corre en el executor de contraseñas y se
+# espera con await; sólo las consultas cortas a la BD pasan por el threadpool.
+
+async def _verificar_o_503(plain: str, hashed: str) -> bool:
+    try:
+        return await verificar_password(plain, hashed)
+    except ServicioSaturado as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
 
 @auth_router.post("/login/control", response_model=TokenSchema)
-def login_empleado(credentials: LoginSchema, db: Session = Depends(get_db)):
+async def login_empleado(credentials: LoginSchema, request: Request, db: Session = Depends(get_db)):
     """
     Acceso exclusivo para Staff. 
     NOTA: Espera JSON Body: {"email": "...", "password": "..."}
     """
-    print(f"INTENTO LOGIN CONTROL")
-    print(f"📨 Recibido Email: '{credentials.email}'")
-    print(f"Recibido Pass: '{credentials.password}' (Longitud: {len(credentials.password)})")
+    ip = ip_cliente(request)
+    await registrar_intento("control", ip, credentials.email)
 
-    user = db.query(UsuarioModel).filter(UsuarioModel.email == credentials.email).first()
+    user = await run_in_threadpool(
+        lambda: db.query(UsuarioModel).filter(UsuarioModel.email == credentials.email).first()
+    )
     
     if not user:
-        print(f"FALLO: Usuario '{credentials.email}' NO existe en BD.")
+        logger.info("Login control fallido", extra={"motivo": "email_inexistente", "ip": ip})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales de empleado incorrectas (Email no encontrado)"
         )
     
-    es_valido = verify_password(credentials.password, user.password_hash)
+    es_valido = await _verificar_o_503(credentials.password, user.password_hash)
     
     if not es_valido:
-        print(f"FALLO: Password incorrecta para '{credentials.email}'.")
-        print(f"   Hash DB: {user.password_hash[:10]}...")
+        logger.info("Login control fallido", extra={"motivo": "password", "usuario_id": user.id, "ip": ip})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciales de empleado incorrectas (Password erróneo)"
         )
     
     if not user.activo:
-        print(f"FALLO: Usuario inactivo.")
+        logger.info("Login control fallido", extra={"motivo": "inactivo", "usuario_id": user.id, "ip": ip})
         raise HTTPException(status_code=403, detail="Usuario desactivado por Admin")
 
+    await limpiar_intentos("control", credentials.email)
     rol_token = str(user.rol).upper() if user.rol else "EMPLEADO"
-    print(f"LOGIN OK. Generando token con ROL: {rol_token}")
+    logger.info("Login control correcto", extra={"usuario_id": user.id, "rol": rol_token})
 
     token = create_access_token(
         subject=str(user.id),  
@@ -56,21 +72,25 @@ def login_empleado(credentials: LoginSchema, db: Session = Depends(get_db)):
     }
 
 @auth_router.post("/login/market", response_model=TokenSchema)
-def login_cliente(credentials: LoginSchema, db: Session = Depends(get_db)):
+async def login_cliente(credentials: LoginSchema, request: Request, db: Session = Depends(get_db)):
     """Acceso público para Compradores"""
-    print(f"\n🛒 INTENTO LOGIN MARKET: {credentials.email}")
+    ip = ip_cliente(request)
+    await registrar_intento("market", ip, credentials.email)
     
-    client = db.query(ClienteModel).filter(ClienteModel.email == credentials.email).first()
+    client = await run_in_threadpool(
+        lambda: db.query(ClienteModel).filter(ClienteModel.email == credentials.email).first()
+    )
     
     if not client:
-        print("Cliente no encontrado.")
+        logger.info("Login market fallido", extra={"motivo": "email_inexistente", "ip": ip})
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-    if not client.password_hash or not verify_password(credentials.password, client.password_hash):
-         print("Password cliente incorrecta.")
-         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+    if not client.password_hash or not await _verificar_o_503(credentials.password, client.password_hash):
+        logger.info("Login market fallido", extra={"motivo": "password", "cliente_id": client.id, "ip": ip})
+        raise HTTPException(status_code=401, detail="Credenciales incorrectas")
 
-    print("LOGIN MARKET OK")
+    logger.info("Login market correcto", extra={"cliente_id": client.id})
+    await limpiar_intentos("market", credentials.email)
     token = create_access_token(subject=str(client.id), user_type="client", role="CUSTOMER")
     
     return {
@@ -80,23 +100,34 @@ def login_cliente(credentials: LoginSchema, db: Session = Depends(get_db)):
     }
 
 @auth_router.post("/register/market")
-def registrar_cliente(data: RegisterClienteSchema, db: Session = Depends(get_db)):
-    if db.query(ClienteModel).filter(ClienteModel.email == data.email).first():
-        raise HTTPException(status_code=400, detail="El correo ya está registrado")
-    
-    if db.query(ClienteModel).filter(ClienteModel.ruc_dni == data.ruc_dni).first():
-        raise HTTPException(status_code=400, detail="El RUC/DNI ya está registrado")
+async def registrar_cliente(data: RegisterClienteSchema, request: Request, db: Session = Depends(get_db)):
+    await registrar_intento("registro", ip_cliente(request))
+
+    def _validar_unicos():
+        if db.query(ClienteModel.id).filter(ClienteModel.email == data.email).first():
+            raise HTTPException(status_code=400, detail="El correo ya está registrado")
+        if db.query(ClienteModel.id).filter(ClienteModel.ruc_dni == data.ruc_dni).first():
+            raise HTTPException(status_code=400, detail="El RUC/DNI ya está registrado")
+
+    await run_in_threadpool(_validar_unicos)
+
+    try:
+        password_hash = await hashear_password(data.password)
+    except ServicioSaturado as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
 
     new_client = ClienteModel(
         ruc_dni=data.ruc_dni,
         razon_social=data.razon_social,
         email=data.email,
         telefono_whatsapp=data.telefono,
-        password_hash=get_password_hash(data.password)
+        password_hash=password_hash
     )
-    
-    db.add(new_client)
-    db.commit()
-    db.refresh(new_client)
+
+    def _guardar():
+        db.add(new_client)
+        db.commit()
+
+    await run_in_threadpool(_guardar)
     
     return {"msg": "Cuenta creada exitosamente. Ahora inicie sesión."}
\ No newline at end of file
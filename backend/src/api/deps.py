@@ -1,75 +1,84 @@
-import sys
-from fastapi import Depends, HTTPException, status
+import logging
+import uuid
+from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 from src.infrastructure.database import get_db
-from src.infrastructure.models import UsuarioModel, ClienteModel
 from src.core.security import SECRET_KEY, ALGORITHM
+from src.services.principal_cache import CLIENTE, EMPLEADO, Principal, cache_principals
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login/control")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Decodifica el token base"""
+logger = logging.getLogger(__name__)
+
+ROLES_EMPLEADO = ["ADMIN", "EMPLEADO", "SUPERVISOR", "ALMACENERO"]
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Decodifica el token base (sólo firma y claims, sin BD)"""
     try:
-        print("\n" + "="*40)
-        print(" DEPS: Decodificando Token...")
-        
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        user_type: str = payload.get("type") 
+        user_type: str = payload.get("type")
         user_role: str = payload.get("role")
 
-        print(f"PAYLOAD: ID={user_id} | TIPO={user_type} | ROL_TOKEN={user_role}")
-        
         if user_id is None or user_type is None:
-            print("ERROR: Token incompleto (falta sub o type)")
+            logger.debug("Token incompleto (falta sub o type)", extra={"muestreo": 0.05})
             raise HTTPException(status_code=401, detail="Token inválido")
-            
-        return {"id": user_id, "type": user_type, "role": user_role}
-        
-    except JWTError as e:
-        print(f" ERROR JWT: {str(e)}")
+
+        return {"id": uuid.UUID(user_id), "type": user_type, "role": user_role}
+
+    except (JWTError, ValueError) as e:
+        logger.debug("JWT inválido: %s", e, extra={"muestreo": 0.05})
         raise HTTPException(status_code=401, detail="No se pudieron validar las credenciales")
 
-def get_current_employee(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    """GUARDIA: Solo deja pasar si el token es de tipo EMPLEADO y existe en BD"""
-    
-    print(f"GUARDIA EMPLEADO: Verificando usuario {current_user['id']}...")
+def _exigir_tipo(current_user: dict, tipo: str, detalle: str):
+    if current_user["type"] != tipo:
+        logger.debug("Tipo de token rechazado", extra={"tipo": current_user["type"], "esperado": tipo, "muestreo": 0.05})
+        raise HTTPException(status_code=403, detail=detalle)
+
+def _exigir_rol_empleado(rol):
+    rol_usuario = str(rol).upper() if rol else "SIN_ROL"
+    if rol_usuario not in ROLES_EMPLEADO:
+        logger.info("Rol sin permisos de empleado", extra={"rol": rol_usuario})
+        raise HTTPException(status_code=403, detail="No tienes permisos suficientes")
+
+def get_current_employee(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> Principal:
+    """GUARDIA: Solo deja pasar si el token es de tipo EMPLEADO, existe en BD y está activo (vía caché de principals)"""
+    _exigir_tipo(current_user, EMPLEADO, "Acceso denegado: Se requiere cuenta de empleado")
 
-    if current_user["type"] != "employee":
-        print(f" RECHAZADO: El token dice type='{current_user['type']}', se esperaba 'employee'")
-        raise HTTPException(status_code=403, detail="Acceso denegado: Se requiere cuenta de empleado")
-    
-    user = db.query(UsuarioModel).get(current_user["id"])
+    user = cache_principals.obtener(EMPLEADO, current_user["id"], db)
     if not user:
-        print(f"RECHAZADO: El ID {current_user['id']} no existe en la tabla 'usuarios'")
+        logger.info("Token de empleado sin usuario en BD", extra={"usuario_id": current_user["id"]})
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-    
-    print(f" USUARIO ENCONTRADO: Email={user.email} | ROL_DB={user.rol}")
-    
-    roles_permitidos = ["ADMIN", "EMPLEADO", "SUPERVISOR", "ALMACENERO"]
-    
-    rol_usuario = str(user.rol).upper() if user.rol else "SIN_ROL"
-
-    if rol_usuario not in roles_permitidos:
-        print(f"❌ PROHIBIDO: El rol '{rol_usuario}' no está en la lista permitida {roles_permitidos}")
-        raise HTTPException(status_code=403, detail="No tienes permisos suficientes")
 
-    print("ACCESO CONCEDIDO")
-    print("="*40 + "\n")
+    if not user.activo:
+        raise HTTPException(status_code=403, detail="Usuario inactivo")
+
+    _exigir_rol_empleado(user.rol)
     return user
 
-def get_current_client(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
-    """GUARDIA: Solo deja pasar si el token es de tipo CLIENTE"""
-    
-    if current_user["type"] != "client":
-        print(f"RECHAZADO CLIENTE: Token type='{current_user['type']}'")
-        raise HTTPException(status_code=403, detail="Acceso denegado: Se requiere cuenta de cliente")
-    
-    client = db.query(ClienteModel).get(current_user["id"])
+def get_current_client(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)) -> Principal:
+    """GUARDIA: Solo deja pasar si el token es de tipo CLIENTE y existe en BD (vía caché de principals)"""
+    _exigir_tipo(current_user, CLIENTE, "Acceso denegado: Se requiere cuenta de cliente")
+
+    client = cache_principals.obtener(CLIENTE, current_user["id"], db)
     if not client:
-        print(f" RECHAZADO: Cliente ID {current_user['id']} no encontrado en BD")
+        logger.info("Token de cliente sin cliente en BD", extra={"cliente_id": current_user["id"]})
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
-    
-    return client
\ No newline at end of file
+
+    return client
+
+def get_employee_claims(current_user: dict = Depends(get_current_user)) -> Principal:
+    """
+    GUARDIA sólo con claims: confía en el rol firmado del token, sin BD ni caché.
+    Para lecturas que no necesitan ver una baja o cambio de rol al instante.
+    """
+    _exigir_tipo(current_user, EMPLEADO, "Acceso denegado: Se requiere cuenta de empleado")
+    _exigir_rol_empleado(current_user["role"])
+    return Principal(current_user["id"], EMPLEADO, current_user["role"], True)
+
+def get_client_claims(current_user: dict = Depends(get_current_user)) -> Principal:
+    """GUARDIA sólo con claims para clientes (sin BD ni caché)."""
+    _exigir_tipo(current_user, CLIENTE, "Acceso denegado: Se requiere cuenta de cliente")
+    return Principal(current_user["id"], CLIENTE, current_user["role"], True)
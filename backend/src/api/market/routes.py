@@ -1,83 +1,216 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+import base64
+import hashlib
+import json
+import uuid
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from src.infrastructure.database import get_db
-from src.infrastructure.models import VentaModel, ClienteModel, DetalleVentaModel
-from src.api.deps import get_current_client
-from src.services.ai_catalog import AISearchService, DynamicPricingService
-from src.infrastructure.adapters.queue_adapter import QueueAdapter
-from .schemas import ProductoCardSchema
+from src.infrastructure.database import get_db, SessionLocal
+from src.infrastructure.models import VentaModel, ClienteModel, DetalleVentaModel, ProductoModel
+from src.infrastructure.read_models import ProductoCard
+from src.api.deps import get_current_client, get_client_claims
+from src.services.ai_catalog import (
+    HYBRID_MAX_PROFUNDIDAD, AISearchService, DynamicPricingService, profundidad_inicial,
+)
+from src.services.catalog_cache import cache_catalogo
+from src.services.catalog_cache import normalizar_consulta
+from src.services.autocomplete import AUTOCOMPLETE_K, sugerir
+from src.services.checkout import (
+    CarritoInvalido, ProductosNoEncontrados, StockInsuficiente, consolidar_carrito, procesar_checkout,
+)
+from src.services.idempotency import LARGO_MAX_CLAVE, ClaveReutilizada
+from .schemas import ProductoCardSchema, CatalogoPaginaSchema, SugerenciaSchema
 
 market_router = APIRouter(prefix="/market", tags=["Marketplace Público"])
 
+def _a_card_schema(p) -> ProductoCardSchema:
+    precio_smart = DynamicPricingService.calcular_precio_final(p)
+    return ProductoCardSchema(
+        id=p.id,
+        nombre=p.nombre,
+        sku=p.sku,
+        descripcion=p.descripcion,
+        imagen_url=p.imagen_url,
+        precio_lista=float(p.precio_base),
+        precio_venta=precio_smart,
+        es_oferta_ia=(precio_smart != float(p.precio_base)),
+        stock_disponible=p.stock
+    )
+
+def _huella_consulta(q: Optional[str]) -> str:
+    return hashlib.sha1(normalizar_consulta(q).encode("utf-8")).hexdigest()[:12]
+
+def _codificar_cursor(datos: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, q: Optional[str]) -> dict:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(datos, dict):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if datos.get("q") != _huella_consulta(q):
+        raise HTTPException(status_code=400, detail="El cursor pertenece a otra búsqueda")
+    try:
+        datos["id"] = str(uuid.UUID(datos["id"]))
+        if q:
+            datos["score"] = float(datos["score"])
+            datos["p"] = int(datos["p"])
+            if not 1 <= datos["p"] <= HYBRID_MAX_PROFUNDIDAD:
+                raise ValueError("profundidad fuera de rango")
+        elif not isinstance(datos["nombre"], str):
+            raise ValueError("nombre")
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return datos
+
 @market_router.get("/productos", response_model=List[ProductoCardSchema])
 def catalogo_inteligente(
     q: str = Query(None),
+    limit: int = Query(10, ge=1, le=50),
     db: Session = Depends(get_db)
 ):
+    clave = cache_catalogo.clave(q, limit)
+    cacheado = cache_catalogo.obtener(clave)
+    if cacheado is not None:
+        return Response(content=cacheado, media_type="application/json")
+
+    epoca = cache_catalogo.epoca()
     ai_service = AISearchService(db)
-    productos = ai_service.buscar_productos_inteligentes(query=q)
-    
-    resultado = []
-    for p in productos:
-        precio_smart = DynamicPricingService.calcular_precio_final(p)
-        
-        dto = ProductoCardSchema(
-            id=p.id,
-            nombre=p.nombre,
-            sku=p.sku,
-            descripcion=p.descripcion,
-            imagen_url=p.imagen_url,
-            precio_lista=float(p.precio_base),
-            precio_venta=precio_smart,
-            es_oferta_ia=(precio_smart != float(p.precio_base)),
-            stock_disponible=p.stock
-        )
-        resultado.append(dto)
-        
-    return resultado
+    productos = ai_service.buscar_productos_inteligentes(query=q, limit=limit)
+    resultado = [_a_card_schema(p) for p in productos]
 
-@market_router.post("/checkout")
-def procesar_compra(
-    carrito: List[dict],
-    cliente=Depends(get_current_client),
+    payload = json.dumps(jsonable_encoder(resultado))
+    cache_catalogo.guardar(clave, payload, [p.id for p in productos], es_listado=not q, epoca=epoca)
+    return Response(content=payload, media_type="application/json")
+
+@market_router.get("/autocomplete", response_model=List[SugerenciaSchema])
+def autocompletar(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=80),
+    limit: int = Query(8, ge=1, le=AUTOCOMPLETE_K),
+):
+    """Sugerencias por prefijo (nombres, SKUs y categorías) servidas desde memoria, sin BD."""
+    response.headers["Cache-Control"] = "public, max-age=30"
+    return [
+        SugerenciaSchema(texto=s.texto, tipo=s.tipo, producto_id=s.producto_id, sku=s.sku)
+        for s in sugerir(q, limit)
+    ]
+
+@market_router.get("/catalogo", response_model=CatalogoPaginaSchema)
+def catalogo_paginado(
+    q: str = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = Query(None, description="next_cursor de la página anterior"),
     db: Session = Depends(get_db)
 ):
-    if not carrito:
-        raise HTTPException(status_code=400, detail="Carrito vacío")
+    """
+    Catálogo completo con paginación keyset: sin `q` ordena por (nombre, id);
+    con `q` por (score híbrido, id).
+    """
+    clave = cache_catalogo.clave(q, limit, extra=f"pagina:{cursor or ''}")
+    cacheado = cache_catalogo.obtener(clave)
+    if cacheado is not None:
+        return Response(content=cacheado, media_type="application/json")
 
-    total_venta = sum(float(item['precio']) * int(item['cantidad']) for item in carrito)
+    previo = _decodificar_cursor(cursor, q) if cursor else None
+    epoca = cache_catalogo.epoca()
+    ai_service = AISearchService(db)
 
-    nueva_venta = VentaModel(
-        cliente_id=cliente.id,
-        total=total_venta,
-        estado="PENDIENTE_FACTURACION"
-    )
-    db.add(nueva_venta)
-    db.commit()
-    db.refresh(nueva_venta)
-    
-    for item in carrito:
-        detalle = DetalleVentaModel(
-            venta_id=nueva_venta.id,
-            producto_id=item['id'],
-            cantidad=int(item['cantidad']),
-            precio_unitario=float(item['precio']),
-            subtotal=float(item['precio']) * int(item['cantidad'])
+    if not q:
+        despues = (previo["nombre"], previo["id"]) if previo else None
+        productos = ai_service.listar_disponibles(limit, despues=despues)
+        siguiente = (
+            {"q": _huella_consulta(q), "nombre": productos[-1].nombre, "id": str(productos[-1].id)}
+            if len(productos) == limit else None
         )
-        db.add(detalle)
-    db.commit()
+    else:
+        despues = (previo["score"], previo["id"]) if previo else None
+        # Conjunto de candidatos fijo para toda la paginación de esta búsqueda
+        profundidad = previo["p"] if previo else profundidad_inicial(limit)
+        filas = ai_service.buscar_hibrido(q, limit, despues=despues, profundidad=profundidad)
+        productos = [card for card, _ in filas]
+        siguiente = (
+            {"q": _huella_consulta(q), "score": filas[-1][1], "id": str(productos[-1].id), "p": profundidad}
+            if len(filas) == limit else None
+        )
+
+    pagina = CatalogoPaginaSchema(
+        items=[_a_card_schema(p) for p in productos],
+        next_cursor=_codificar_cursor(siguiente) if siguiente else None,
+    )
+    payload = json.dumps(jsonable_encoder(pagina))
+    cache_catalogo.guardar(clave, payload, [p.id for p in productos], es_listado=not q, epoca=epoca)
+    return Response(content=payload, media_type="application/json")
+
+@market_router.get("/catalogo/export.ndjson")
+def exportar_catalogo(cliente=Depends(get_client_claims)):
+    """
+    Exportación B2B de todo el catálogo en NDJSON (una tarjeta por línea).
+    Cursor del lado servidor (yield_per): memoria constante con 100k+ SKUs.
+    """
+    def generar():
+        # Sesión propia: la de Depends(get_db) se cierra antes de terminar el stream
+        db = SessionLocal()
+        try:
+            stmt = (
+                ProductoCard.select()
+                .order_by(ProductoModel.id)
+                .execution_options(yield_per=1000)
+            )
+            for fila in db.execute(stmt):
+                yield _a_card_schema(ProductoCard(*fila)).model_dump_json() + "\n"
+        finally:
+            db.close()
 
+    return StreamingResponse(
+        generar(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="catalogo.ndjson"'},
+    )
+
+@market_router.post("/checkout")
+def procesar_compra(
+    carrito: List[dict],
+    response: Response,
+    cliente=Depends(get_current_client),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, max_length=LARGO_MAX_CLAVE),
+):
+    """
+    Una transacción: precios del servidor (se ignora el `precio` del carrito),
+    reserva de stock atómica y detalles en bloque. Ver services/checkout.py.
+    Con `Idempotency-Key` los reintentos devuelven la venta original.
+    """
     try:
-        cola = QueueAdapter()
-        cola.encolar_factura(str(nueva_venta.id))
-    except Exception as e:
-        print(f"Redis Error: {e}")
+        items = consolidar_carrito(carrito)
+        resultado = procesar_checkout(db, cliente.id, items, idempotency_key)
+    except CarritoInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProductosNoEncontrados as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except StockInsuficiente as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ClaveReutilizada as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except OperationalError:
+        # lock_timeout: demasiados checkouts sobre los mismos SKUs a la vez
+        raise HTTPException(status_code=503, detail="Alta demanda en estos productos. Reintente.",
+                            headers={"Retry-After": "1"})
+
+    # La factura sale por el outbox (misma transacción que la venta): no se encola aquí
+    if resultado.repetido:
+        response.headers["Idempotent-Replayed"] = "true"
     
     return {
         "msg": "Compra exitosa. Facturando...",
-        "venta_id": str(nueva_venta.id),
+        "venta_id": str(resultado.venta_id),
         "status": "PROCESANDO",
-        "total": total_venta
+        "total": float(resultado.total)
     }
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
 class ProductoCardSchema(BaseModel):
@@ -16,4 +16,14 @@ class ProductoCardSchema(BaseModel):
     stock_disponible: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class CatalogoPaginaSchema(BaseModel):
+    items: List[ProductoCardSchema]
+    next_cursor: Optional[str] = None
+
+class SugerenciaSchema(BaseModel):
+    texto: str
+    tipo: str
+    producto_id: Optional[UUID] = None
+    sku: Optional[str] = None
@@ -1,15 +1,21 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
+from starlette.concurrency import run_in_threadpool
+import logging
 import os
 import json
 
 from src.infrastructure.database import get_db
 from src.infrastructure.models import ClienteModel, VentaModel
+from src.services.idempotency import guardar_respuesta, hash_peticion, reclamar
+
+logger = logging.getLogger(__name__)
 
 webhook_router = APIRouter(prefix="/webhooks", tags=["Integraciones Externas"])
 
 VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "nexus_token_secreto_123")
+AMBITO_WHATSAPP = "whatsapp"
 
 @webhook_router.get("/whatsapp")
 async def verificar_webhook(
@@ -21,7 +27,7 @@ async def verificar_webhook(
     Meta llama a este endpoint para confirmar que el servidor es nuestro.
     """
     if mode == "subscribe" and token == VERIFY_TOKEN:
-        print("Webhook de WhatsApp Verificado Exitosamente.")
+        logger.info("Webhook de WhatsApp verificado")
         return int(challenge) 
     
     raise HTTPException(status_code=403, detail="Token de verificación inválido")
@@ -44,26 +50,36 @@ async def recibir_mensaje(request: Request, db: Session = Depends(get_db)):
             telefono_bruto = mensaje_info['from'] 
             texto_mensaje = mensaje_info['text']['body'].strip().upper()
                         
-            print(f"[WHATSAPP] Mensaje de {telefono_bruto}: {texto_mensaje}")
+            logger.debug("Mensaje de WhatsApp recibido", extra={"telefono": telefono_bruto, "texto": texto_mensaje})
             
             if "CONFIRMAR" in texto_mensaje or "ACEPTO" in texto_mensaje:
-                await procesar_confirmacion(telefono_bruto, db)
+                # reclamar puede esperar el lock de un duplicado (hasta IDEMPOTENCIA_ESPERA_MS): fuera del event loop
+                await run_in_threadpool(procesar_confirmacion, telefono_bruto, db, mensaje_info.get('id'))
                 
     except KeyError:
         pass
-    except Exception as e:
-        print(f"Error procesando webhook: {e}")
+    except Exception:
+        logger.exception("Error procesando webhook")
 
     return {"status": "ok"}
 
-async def procesar_confirmacion(telefono: str, db: Session):
+def procesar_confirmacion(telefono: str, db: Session, mensaje_id: str = None):
     """
     Busca al cliente por teléfono y confirma su última venta pendiente.
+    Meta reintenta los webhooks: el id del mensaje (wamid) se usa como clave de
+    idempotencia para que un reintento no confirme otra venta.
     """
+    if mensaje_id:
+        if reclamar(db, AMBITO_WHATSAPP, mensaje_id, hash_peticion(telefono)) is not None:
+            db.rollback()
+            logger.info("Mensaje de WhatsApp repetido, se ignora", extra={"mensaje_id": mensaje_id})
+            return
+
     cliente = db.query(ClienteModel).filter(ClienteModel.telefono_whatsapp == telefono).first()
     
     if not cliente:
-        print(f"Teléfono {telefono} no registrado en nuestra BD.")
+        db.commit()
+        logger.info("Teléfono de WhatsApp no registrado", extra={"telefono": telefono})
         return
 
     venta = db.query(VentaModel).filter(
@@ -73,8 +89,11 @@ async def procesar_confirmacion(telefono: str, db: Session):
     
     if venta:
         venta.estado = "CONFIRMADO_POR_WHATSAPP"
+        if mensaje_id:
+            guardar_respuesta(db, AMBITO_WHATSAPP, mensaje_id, {"venta_id": str(venta.id)})
         db.commit()
-        print(f"✅ Venta {venta.id} actualizada a CONFIRMADO (Vía WhatsApp).")
+        logger.info("Venta confirmada vía WhatsApp", extra={"venta_id": venta.id})
         
     else:
-        print("ℹ️ El cliente no tiene ventas pendientes por confirmar.")
\ No newline at end of file
+        db.commit()
+        logger.info("El cliente no tiene ventas pendientes por confirmar", extra={"cliente_id": cliente.id})
\ No newline at end of file
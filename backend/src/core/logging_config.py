@@ -0,0 +1,136 @@
+"""
+Logging estructurado (JSON por línea) sin E/S en el hilo de la petición.
+
+Los loggers sólo encolan el registro (`QueueHandler` sobre una SimpleQueue);
+un `QueueListener` en su propio hilo formatea y escribe en stdout. Cada
+registro lleva el `request_id` de la petición en curso (contextvar que fija
+el middleware de main.py) y los campos pasados con `extra=`.
+
+Configuración por entorno:
+    LOG_NIVEL            nivel raíz (INFO)
+    LOG_NIVELES          niveles por módulo: "src.api.deps=DEBUG,src.services=WARNING"
+    LOG_FORMATO          json | texto (texto: legible en desarrollo)
+    LOG_MUESTREO_DEBUG   fracción de registros DEBUG que se escriben (1.0)
+
+Un registro puede fijar su propia tasa con `extra={"muestreo": 0.01}` para
+eventos de mucho volumen (rechazos de token, hits de caché...).
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_NIVELES = os.getenv("LOG_NIVELES", "")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+LOG_MUESTREO_DEBUG = float(os.getenv("LOG_MUESTREO_DEBUG", "1.0"))
+
+request_id_actual: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord: todo lo demás viene de `extra=` y va al JSON
+_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "muestreo"}
+
+_listener: Optional[QueueListener] = None
+
+
+class FormateadorJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            datos["request_id"] = record.request_id
+        for clave, valor in vars(record).items():
+            if clave not in _ESTANDAR:
+                datos[clave] = valor
+        if record.exc_text:
+            datos["exc"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FormateadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.request_id = record.request_id or "-"
+        texto = super().format(record)
+        extras = {k: v for k, v in vars(record).items() if k not in _ESTANDAR}
+        return f"{texto} {extras}" if extras else texto
+
+
+class FiltroContexto(logging.Filter):
+    """Añade request_id y descarta por muestreo. Corre en el hilo que loguea."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        tasa = getattr(record, "muestreo", None)
+        if tasa is None and record.levelno <= logging.DEBUG:
+            tasa = LOG_MUESTREO_DEBUG
+        if tasa is not None and tasa < 1.0 and random.random() >= tasa:
+            return False
+        record.request_id = request_id_actual.get()
+        return True
+
+
+class _HandlerCola(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se resuelven el mensaje y la traza aquí (args y exc_info pueden no ser
+        # serializables ni seguir vivos cuando el listener lo formatee)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _niveles_por_modulo(texto: str) -> dict:
+    niveles = {}
+    for par in filter(None, (p.strip() for p in texto.split(","))):
+        modulo, _, nivel = par.partition("=")
+        niveles[modulo.strip()] = nivel.strip().upper()
+    return niveles
+
+
+def configurar_logging():
+    """Instala el handler de cola en el logger raíz. Idempotente."""
+    global _listener
+    if _listener is not None:
+        return
+
+    cola: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormateadorTexto() if LOG_FORMATO == "texto" else FormateadorJSON())
+
+    handler = _HandlerCola(cola)
+    handler.addFilter(FiltroContexto())
+
+    raiz = logging.getLogger()
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(handler)
+    raiz.setLevel(LOG_NIVEL)
+    for modulo, nivel in _niveles_por_modulo(LOG_NIVELES).items():
+        logging.getLogger(modulo).setLevel(nivel)
+
+    _listener = QueueListener(cola, salida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(detener_logging)
+
+
+def detener_logging():
+    """Vacía la cola y para el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
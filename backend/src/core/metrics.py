@@ -0,0 +1,52 @@
+"""
+Métricas en proceso (contadores, gauges e histogramas simples) expuestas en
+GET /metrics como JSON (sólo empleados). Cada worker de uvicorn reporta las suyas.
+"""
+import threading
+from typing import Dict, List
+
+_lock = threading.Lock()
+_contadores: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_histogramas: Dict[str, List[float]] = {}
+MAX_MUESTRAS = 2048
+
+
+def incrementar(nombre: str, valor: float = 1):
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + valor
+
+
+def fijar(nombre: str, valor: float):
+    with _lock:
+        _gauges[nombre] = valor
+
+
+def observar(nombre: str, valor: float):
+    """Guarda las últimas MAX_MUESTRAS observaciones (ventana deslizante)."""
+    with _lock:
+        muestras = _histogramas.setdefault(nombre, [])
+        muestras.append(valor)
+        if len(muestras) > MAX_MUESTRAS:
+            del muestras[:len(muestras) - MAX_MUESTRAS]
+
+
+def _resumen(muestras: List[float]) -> dict:
+    ordenadas = sorted(muestras)
+    n = len(ordenadas)
+    return {
+        "n": n,
+        "p50": ordenadas[n // 2],
+        "p95": ordenadas[min(n - 1, int(n * 0.95))],
+        "p99": ordenadas[min(n - 1, int(n * 0.99))],
+        "max": ordenadas[-1],
+    }
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "contadores": dict(_contadores),
+            "gauges": dict(_gauges),
+            "histogramas": {k: _resumen(v) for k, v in _histogramas.items() if v},
+        }
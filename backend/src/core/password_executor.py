@@ -0,0 +1,158 @@
+"""
+Executor dedicado para bcrypt (verificar / hashear contraseñas).
+
+bcrypt cuesta ~250 ms de CPU. En el threadpool por defecto de FastAPI una
+ráfaga de logins deja sin hilos al resto de rutas síncronas y compite por el
+GIL; aquí corre en un ProcessPoolExecutor propio (PASSWORD_WORKERS procesos)
+y las rutas de auth lo esperan con `await`, sin ocupar un hilo del threadpool.
+
+Como mucho PASSWORD_MAX_COLA operaciones en vuelo (ejecutando + en cola);
+por encima se rechaza al instante con `ServicioSaturado` (-> 503).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from src.core import metrics
+from src.core.security import get_password_hash, verify_password
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_MAX_COLA = int(os.getenv("PASSWORD_MAX_COLA", "32"))
+PASSWORD_TIMEOUT_S = float(os.getenv("PASSWORD_TIMEOUT_S", "10"))
+
+
+class ServicioSaturado(Exception):
+    pass
+
+
+# --- Proceso hijo: devuelve también el tiempo de CPU de bcrypt ----------------
+
+def _verificar(plain: str, hashed: str) -> Tuple[bool, float]:
+    inicio = time.perf_counter()
+    return verify_password(plain, hashed), (time.perf_counter() - inicio) * 1000
+
+
+def _hashear(plain: str) -> Tuple[str, float]:
+    inicio = time.perf_counter()
+    return get_password_hash(plain), (time.perf_counter() - inicio) * 1000
+
+
+def _calentar() -> int:
+    return os.getpid()
+
+
+# --- Proceso de la API -------------------------------------------------------
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_en_vuelo = 0
+
+
+def _obtener_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # 'spawn': no heredar hilos ni locks del proceso de uvicorn
+                _executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def _descartar_executor(roto: ProcessPoolExecutor):
+    """Tras un BrokenProcessPool (hijo muerto) el pool no sirve: el próximo envío crea otro."""
+    global _executor
+    with _lock:
+        if _executor is roto:
+            _executor = None
+            metrics.incrementar("password.pool_reiniciado")
+            logger.warning("Pool de contraseñas roto: se creará uno nuevo")
+    roto.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar(*args):
+    """(executor, futuro). Si el pool está roto se reemplaza y se reintenta una vez."""
+    ejecutor = _obtener_executor()
+    try:
+        return ejecutor, ejecutor.submit(*args)
+    except BrokenProcessPool:
+        _descartar_executor(ejecutor)
+        ejecutor = _obtener_executor()
+        return ejecutor, ejecutor.submit(*args)
+
+
+def _reservar():
+    global _en_vuelo
+    with _lock:
+        if _en_vuelo >= PASSWORD_MAX_COLA:
+            metrics.incrementar("password.rechazados")
+            raise ServicioSaturado("Servicio de autenticación saturado. Reintente en unos segundos.")
+        _en_vuelo += 1
+        metrics.fijar("password.en_cola", _en_vuelo)
+
+
+def _liberar():
+    global _en_vuelo
+    with _lock:
+        _en_vuelo -= 1
+        metrics.fijar("password.en_cola", _en_vuelo)
+
+
+async def _ejecutar(operacion: str, funcion, *args):
+    _reservar()
+    inicio = time.perf_counter()
+    try:
+        ejecutor, futuro = _enviar(funcion, *args)
+    except BaseException:
+        _liberar()
+        raise
+
+    def _al_terminar(f):
+        # El cupo se libera cuando el proceso suelta el trabajo, no cuando se deja de
+        # esperar: tras un timeout bcrypt sigue ocupando un proceso hasta acabar
+        _liberar()
+        if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+            _descartar_executor(ejecutor)
+
+    futuro.add_done_callback(_al_terminar)
+    try:
+        resultado, cpu_ms = await asyncio.wait_for(asyncio.wrap_future(futuro), PASSWORD_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        metrics.incrementar("password.timeouts")
+        raise ServicioSaturado("La verificación de credenciales tardó demasiado. Reintente.")
+    except BrokenProcessPool:
+        metrics.incrementar("password.fallidos")
+        raise ServicioSaturado("Servicio de autenticación reiniciándose. Reintente en unos segundos.")
+    metrics.observar(f"password.{operacion}_cpu_ms", cpu_ms)
+    metrics.observar(f"password.{operacion}_total_ms", (time.perf_counter() - inicio) * 1000)
+    return resultado
+
+
+async def verificar_password(plain: str, hashed: str) -> bool:
+    return await _ejecutar("verificar", _verificar, plain, hashed)
+
+
+async def hashear_password(plain: str) -> str:
+    return await _ejecutar("hashear", _hashear, plain)
+
+
+def iniciar_pool_passwords():
+    """Arranca los procesos al inicio: el primer login no paga el spawn."""
+    executor = _obtener_executor()
+    for _ in range(PASSWORD_WORKERS):
+        executor.submit(_calentar)
+
+
+def detener_pool_passwords():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
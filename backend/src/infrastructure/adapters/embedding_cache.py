@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class EmbeddingDiskCache:
+    """
+    Caché persistente direccionada por contenido: sha256(modelo + texto) -> vector float32.
+    SQLite en modo WAL, una conexión por hilo. Sobrevive a reinicios del contenedor
+    si `EMBEDDING_CACHE_PATH` apunta a un volumen.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._local = threading.local()
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " clave BLOB PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, claves: List[bytes]) -> Dict[bytes, np.ndarray]:
+        encontrados: Dict[bytes, np.ndarray] = {}
+        conn = self._conn()
+        # SQLite limita el número de parámetros por sentencia
+        for inicio in range(0, len(claves), 500):
+            bloque = claves[inicio:inicio + 500]
+            marcas = ",".join("?" * len(bloque))
+            filas = conn.execute(
+                f"SELECT clave, vector FROM embeddings WHERE dim = ? AND clave IN ({marcas})",
+                [self.dim, *bloque],
+            )
+            for clave, blob in filas:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                vector.setflags(write=False)
+                encontrados[clave] = vector
+        return encontrados
+
+    def put_many(self, items: Iterable[Tuple[bytes, np.ndarray]]):
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (clave, dim, vector) VALUES (?, ?, ?)",
+            [(clave, self.dim, np.asarray(v, dtype=np.float32).tobytes()) for clave, v in items],
+        )
+        conn.commit()
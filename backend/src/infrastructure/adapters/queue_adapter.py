@@ -1,26 +1,390 @@
-import redis
+"""
+Cola de facturas SUNAT en Redis, con dos backends (COLA_BACKEND):
+
+- "stream" (por defecto): Redis Streams con grupo de consumidores. XADD para
+  encolar, XREADGROUP para repartir entre N workers y XACK al terminar. Lo que
+  un worker caído deja sin confirmar lo recupera otro con XAUTOCLAIM cuando
+  lleva COLA_RECLAMO_MS sin actividad: entrega al menos una vez. El stream se
+  recorta sólo por debajo de lo ya confirmado (XTRIM MINID, ver
+  `recortar_confirmados`): un pendiente nunca se pierde por el recorte.
+- "lista": la lista original con RPUSH / BLPOP (sin confirmación; una caída a
+  mitad de factura pierde la tarea). Se mantiene para volver atrás.
+
+Los fallos transitorios no vuelven directo a la cola: `programar_reintento`
+los deja en un sorted set (score = instante de vencimiento) con backoff
+exponencial y jitter, y `promover_vencidos` (llamado por los workers) los
+devuelve a la cola por lotes con un script Lua atómico.
+
+Construirlo es barato: los clientes usan los pools de conexiones del proceso
+(adapters/redis_client.py).
+"""
 import json
+import logging
 import os
+import random
+import socket
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import redis
+
+from src.core import metrics
+from src.infrastructure.adapters.redis_client import obtener_redis, obtener_redis_async, obtener_redis_bloqueante
+
+logger = logging.getLogger(__name__)
+
+COLA_BACKEND = os.getenv("COLA_BACKEND", "stream").lower()
+# Valores por RPUSH dentro del pipeline: comandos acotados, un solo viaje de red
+COLA_RPUSH_LOTE = int(os.getenv("COLA_RPUSH_LOTE", "1000"))
+COLA_RECLAMO_MS = int(os.getenv("COLA_RECLAMO_MS", "60000"))
+COLA_BLOQUEO_MS = int(os.getenv("COLA_BLOQUEO_MS", "5000"))
+# Un mensaje entregado más veces que esto sin confirmar se considera veneno
+COLA_MAX_ENTREGAS = int(os.getenv("COLA_MAX_ENTREGAS", "10"))
+# Reintentos: espera = min(MAX, BASE * 2^(intento-1)), con jitter entre la mitad y el total
+COLA_BACKOFF_BASE_S = float(os.getenv("COLA_BACKOFF_BASE_S", "5"))
+COLA_BACKOFF_MAX_S = float(os.getenv("COLA_BACKOFF_MAX_S", "600"))
+COLA_PROMOCION_LOTE = int(os.getenv("COLA_PROMOCION_LOTE", "500"))
+COLA_CONSUMIDOR = os.getenv("COLA_CONSUMIDOR") or f"{socket.gethostname()}-{os.getpid()}"
+
+QUEUE_NAME = "sunat_invoices_queue"
+STREAM_NAME = "sunat_invoices_stream"
+GRUPO = "sunat_workers"
+RETRY_ZSET = "sunat_invoices_retry"
+
+# KEYS: zset de reintentos, destino. ARGV: ahora, límite, backend.
+# Atómico: dos workers promoviendo a la vez no duplican tareas.
+_LUA_PROMOVER = """
+local vencidos = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, crudo in ipairs(vencidos) do
+    redis.call('ZREM', KEYS[1], crudo)
+    if ARGV[3] == 'stream' then
+        local tarea = cjson.decode(crudo)
+        local campos = {'venta_id', tarea['venta_id'], 'attempts', tostring(tarea['attempts'])}
+        if tarea['historial'] then
+            table.insert(campos, 'historial')
+            table.insert(campos, cjson.encode(tarea['historial']))
+        end
+        redis.call('XADD', KEYS[2], '*', unpack(campos))
+    else
+        redis.call('RPUSH', KEYS[2], crudo)
+    end
+end
+return #vencidos
+"""
+
+
+class Tarea(NamedTuple):
+    venta_id: str
+    attempts: int
+    # id del mensaje en el stream (None con el backend "lista")
+    mensaje_id: Optional[str] = None
+    # Fallos anteriores: ({"intento", "error", "fecha"}, ...), viaja con la tarea
+    historial: tuple = ()
+
+
+def _tarea(venta_id, attempts: int = 0, historial=()) -> str:
+    tarea = {"venta_id": str(venta_id), "attempts": attempts}
+    if historial:
+        tarea["historial"] = list(historial)
+    return json.dumps(tarea)
+
+
+def _campos(venta_id, attempts: int = 0, historial=()) -> dict:
+    campos = {"venta_id": str(venta_id), "attempts": attempts}
+    if historial:
+        campos["historial"] = json.dumps(list(historial))
+    return campos
+
+
+def _id_stream(mensaje_id: str) -> tuple:
+    milisegundos, _, secuencia = mensaje_id.partition("-")
+    return int(milisegundos), int(secuencia or 0)
+
+
+def espera_reintento(attempts: int) -> float:
+    """Segundos hasta el reintento número `attempts` (1, 2, ...)."""
+    tope = min(COLA_BACKOFF_MAX_S, COLA_BACKOFF_BASE_S * 2 ** max(attempts - 1, 0))
+    # Jitter: tras una caída de SUNAT los reintentos no vuelven todos en el mismo segundo
+    return random.uniform(tope / 2, tope)
+
 
 class QueueAdapter:
-    def __init__(self):
-        self.client = redis.Redis(
-            host=os.getenv("REDIS_HOST", "redis"),
-            port=6379,
-            db=0,
-            decode_responses=True
-        )
-        self.QUEUE_NAME = "sunat_invoices_queue"
+    QUEUE_NAME = QUEUE_NAME
+
+    def __init__(self, backend: str = COLA_BACKEND, stream: str = STREAM_NAME, grupo: str = GRUPO,
+                 reintentos: str = RETRY_ZSET, al_descartar: Optional[Callable[[Tarea, str], None]] = None):
+        """
+        `al_descartar(tarea, motivo)` se llama antes de descartar un mensaje
+        veneno (p.ej. para guardarlo en la dead letter); si falla, el mensaje
+        no se confirma y se vuelve a intentar en el siguiente reclamo. También
+        recibe los pendientes borrados del stream, con `venta_id` None.
+        """
+        if backend not in ("stream", "lista"):
+            raise ValueError(f"COLA_BACKEND desconocido: {backend}")
+        self.backend = backend
+        self.stream = stream
+        self.grupo = grupo
+        self.reintentos = reintentos
+        self.al_descartar = al_descartar
+        self.client = obtener_redis()
+        self._promover = self.client.register_script(_LUA_PROMOVER)
+        self._grupo_creado = False
+        self._ultimo_reclamo = 0.0
+
+    # --- Producer ------------------------------------------------------------
+
+    def _encolar_en(self, pipe, venta_id, attempts: int = 0, historial=()):
+        if self.backend == "stream":
+            pipe.xadd(self.stream, _campos(venta_id, attempts, historial))
+        else:
+            pipe.rpush(self.QUEUE_NAME, _tarea(venta_id, attempts, historial))
 
-    def encolar_factura(self, venta_id: str):
+    def encolar_factura(self, venta_id: str, attempts: int = 0):
         """Producer: Agrega una tarea a la cola"""
-        payload = json.dumps({"venta_id": str(venta_id), "attempts": 0})
-        self.client.rpush(self.QUEUE_NAME, payload)
-        print(f"📥 [REDIS] Factura {venta_id} encolada para procesamiento.")
+        inicio = time.perf_counter()
+        self._encolar_en(self.client, venta_id, attempts)
+        metrics.observar("cola.encolar_ms", (time.perf_counter() - inicio) * 1000)
+        logger.debug("Factura encolada para procesamiento", extra={"venta_id": str(venta_id)})
+
+    def _llenar_pipeline(self, pipe, venta_ids: List) -> None:
+        if self.backend == "stream":
+            for venta_id in venta_ids:
+                self._encolar_en(pipe, venta_id)
+        else:
+            tareas = [_tarea(venta_id) for venta_id in venta_ids]
+            for i in range(0, len(tareas), COLA_RPUSH_LOTE):
+                pipe.rpush(self.QUEUE_NAME, *tareas[i:i + COLA_RPUSH_LOTE])
+
+    def encolar_facturas(self, venta_ids) -> int:
+        """Producer por lotes: todas las tareas en un pipeline (un viaje de red). Devuelve cuántas."""
+        venta_ids = list(venta_ids)
+        if not venta_ids:
+            return 0
+        inicio = time.perf_counter()
+        pipe = self.client.pipeline(transaction=False)
+        self._llenar_pipeline(pipe, venta_ids)
+        pipe.execute()
+        metrics.observar("cola.encolar_lote_ms", (time.perf_counter() - inicio) * 1000)
+        metrics.incrementar("cola.encoladas", len(venta_ids))
+        logger.debug("Facturas encoladas para procesamiento", extra={"cantidad": len(venta_ids)})
+        return len(venta_ids)
+
+    async def encolar_facturas_async(self, venta_ids) -> int:
+        """Como `encolar_facturas`, desde el event loop sin bloquearlo."""
+        venta_ids = list(venta_ids)
+        if not venta_ids:
+            return 0
+        async with obtener_redis_async().pipeline(transaction=False) as pipe:
+            self._llenar_pipeline(pipe, venta_ids)
+            await pipe.execute()
+        metrics.incrementar("cola.encoladas", len(venta_ids))
+        return len(venta_ids)
+
+    # --- Reintentos diferidos -------------------------------------------------
+
+    def programar_reintento(self, venta_id: str, attempts: int, historial=()) -> float:
+        """Deja la tarea en el sorted set de reintentos con backoff. Devuelve la espera en segundos."""
+        espera = espera_reintento(attempts)
+        self.client.zadd(self.reintentos, {_tarea(venta_id, attempts, historial): time.time() + espera})
+        metrics.incrementar("cola.reintentos_programados")
+        return espera
+
+    def promover_vencidos(self, limite: int = COLA_PROMOCION_LOTE) -> int:
+        """Mueve a la cola los reintentos ya vencidos (hasta `limite` por llamada). Devuelve cuántos."""
+        destino = self.stream if self.backend == "stream" else self.QUEUE_NAME
+        movidas = self._promover(
+            keys=[self.reintentos, destino],
+            args=[time.time(), limite, self.backend],
+        )
+        if movidas:
+            metrics.incrementar("cola.reintentos_promovidos", movidas)
+            logger.debug("Reintentos vencidos devueltos a la cola", extra={"cantidad": movidas})
+        return movidas
+
+    # --- Consumer ------------------------------------------------------------
 
     def obtener_tarea(self):
-        """Consumer: Saca una tarea de la cola (Bloqueante)"""
-        tarea = self.client.blpop(self.QUEUE_NAME, timeout=5)
+        """Consumer (backend lista): Saca una tarea de la cola (Bloqueante)"""
+        tarea = obtener_redis_bloqueante().blpop(self.QUEUE_NAME, timeout=COLA_BLOQUEO_MS // 1000 or 1)
         if tarea:
             return json.loads(tarea[1])
-        return None
\ No newline at end of file
+        return None
+
+    def asegurar_grupo(self):
+        """Crea el stream y el grupo si no existen (idempotente)."""
+        if self._grupo_creado:
+            return
+        try:
+            # id "0": el grupo nuevo también ve lo encolado antes de crearlo
+            self.client.xgroup_create(self.stream, self.grupo, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._grupo_creado = True
+
+    def leer_tareas(self, consumidor: str = COLA_CONSUMIDOR, cantidad: int = 10,
+                    bloqueo_ms: int = COLA_BLOQUEO_MS) -> List[Tarea]:
+        """
+        Siguiente lote para este consumidor. Primero recupera (XAUTOCLAIM) lo que
+        otros dejaron colgado; si no hay, espera mensajes nuevos (XREADGROUP).
+        Cada tarea debe confirmarse con `confirmar` tras procesarla.
+        """
+        if self.backend == "lista":
+            tarea = self.obtener_tarea()
+            if not tarea:
+                return []
+            return [Tarea(tarea["venta_id"], tarea["attempts"], None, tuple(tarea.get("historial") or ()))]
+
+        self.asegurar_grupo()
+        ahora = time.monotonic()
+        if ahora - self._ultimo_reclamo > COLA_RECLAMO_MS / 2000:
+            self._ultimo_reclamo = ahora
+            try:
+                self.recortar_confirmados()
+            except redis.RedisError:
+                logger.warning("No se pudo recortar el stream", exc_info=True)
+            reclamadas = self._reclamar(consumidor, cantidad)
+            if reclamadas:
+                return reclamadas
+
+        respuesta = obtener_redis_bloqueante().xreadgroup(
+            self.grupo, consumidor, {self.stream: ">"}, count=cantidad, block=bloqueo_ms,
+        )
+        if not respuesta:
+            return []
+        return [self._a_tarea(mensaje_id, campos) for mensaje_id, campos in respuesta[0][1]]
+
+    def recortar_confirmados(self) -> int:
+        """
+        XTRIM MINID: borra del stream sólo lo que todos los grupos ya confirmaron,
+        es decir, lo anterior al pendiente más antiguo (o al último entregado si
+        no hay pendientes). Lo no entregado y lo pendiente se conserva siempre.
+        """
+        minimo = None
+        for grupo in self.client.xinfo_groups(self.stream):
+            corte = grupo["last-delivered-id"]
+            if grupo["pending"]:
+                corte = self.client.xpending(self.stream, grupo["name"])["min"]
+            if minimo is None or _id_stream(corte) < _id_stream(minimo):
+                minimo = corte
+        if minimo is None or _id_stream(minimo) == (0, 0):
+            return 0
+        borrados = self.client.xtrim(self.stream, minid=minimo, approximate=True)
+        if borrados:
+            metrics.incrementar("cola.recortadas", borrados)
+        return borrados
+
+    def _descartar_recortado(self, mensaje_id: str, entregas: int) -> bool:
+        """Pendiente cuyo contenido ya no está en el stream: se registra como descartado. False si falla."""
+        motivo = "Borrado del stream sin haberse confirmado"
+        logger.error("Mensaje pendiente perdido: %s", motivo, extra={"mensaje_id": mensaje_id})
+        metrics.incrementar("cola.perdidas")
+        if self.al_descartar is not None:
+            try:
+                self.al_descartar(Tarea(None, entregas, mensaje_id), motivo)
+            except Exception:
+                logger.exception("No se pudo registrar el mensaje perdido", extra={"mensaje_id": mensaje_id})
+                return False
+        return True
+
+    def _reclamar(self, consumidor: str, cantidad: int) -> List[Tarea]:
+        _, mensajes, *resto = self.client.xautoclaim(
+            self.stream, self.grupo, consumidor, min_idle_time=COLA_RECLAMO_MS, start_id="0-0", count=cantidad,
+        )
+        # Redis 7 quita del PEL los ids ya borrados del stream y los devuelve aparte
+        for mensaje_id in (resto[0] if resto else None) or ():
+            self._descartar_recortado(mensaje_id, 0)
+        if not mensajes:
+            return []
+        metrics.incrementar("cola.reclamadas", len(mensajes))
+
+        # XAUTOCLAIM no dice cuántas veces se entregó cada uno: se mira en el PEL
+        entregas = {
+            p["message_id"]: p["times_delivered"]
+            for p in self.client.xpending_range(self.stream, self.grupo, min=mensajes[0][0], max=mensajes[-1][0],
+                                                count=len(mensajes), consumername=consumidor)
+        }
+        tareas = []
+        for mensaje_id, campos in mensajes:
+            if campos is None:
+                # Redis 6.2: el id sigue en el PEL pero su contenido se borró del stream
+                if self._descartar_recortado(mensaje_id, entregas.get(mensaje_id, 0)):
+                    self.client.xack(self.stream, self.grupo, mensaje_id)
+                continue
+            if entregas.get(mensaje_id, 0) > COLA_MAX_ENTREGAS:
+                motivo = f"Entregado {entregas[mensaje_id]} veces sin confirmar"
+                logger.error("Mensaje veneno descartado: %s", motivo,
+                             extra={"mensaje_id": mensaje_id, "venta_id": campos.get("venta_id")})
+                if self.al_descartar is not None:
+                    try:
+                        self.al_descartar(self._a_tarea(mensaje_id, campos), motivo)
+                    except Exception:
+                        logger.exception("No se pudo registrar el mensaje veneno", extra={"mensaje_id": mensaje_id})
+                        continue
+                metrics.incrementar("cola.veneno")
+                self.client.xack(self.stream, self.grupo, mensaje_id)
+                continue
+            tareas.append(self._a_tarea(mensaje_id, campos))
+        logger.info("Tareas colgadas recuperadas", extra={"cantidad": len(tareas), "consumidor": consumidor})
+        return tareas
+
+    @staticmethod
+    def _a_tarea(mensaje_id: str, campos: dict) -> Tarea:
+        historial = tuple(json.loads(campos["historial"])) if campos.get("historial") else ()
+        return Tarea(campos["venta_id"], int(campos.get("attempts", 0)), mensaje_id, historial)
+
+    def confirmar(self, tarea: Tarea):
+        """XACK: la tarea terminó (bien, o re-encolada como reintento). No-op con el backend lista."""
+        if tarea.mensaje_id is not None:
+            self.client.xack(self.stream, self.grupo, tarea.mensaje_id)
+
+    # --- Monitor -------------------------------------------------------------
+
+    def estado_pendientes(self) -> dict:
+        """Resumen del PEL y del lag del grupo (GET /admin/facturacion/cola)."""
+        reintentos = self.client.zcard(self.reintentos)
+        metrics.fijar("cola.reintentos_en_espera", reintentos)
+        if self.backend == "lista":
+            return {"backend": "lista", "en_cola": self.client.llen(self.QUEUE_NAME),
+                    "reintentos_en_espera": reintentos}
+
+        self.asegurar_grupo()
+        resumen = self.client.xpending(self.stream, self.grupo)
+        grupo = next((g for g in self.client.xinfo_groups(self.stream) if g["name"] == self.grupo), {})
+        mas_antiguo_ms = None
+        if resumen["pending"]:
+            mas_antiguo = self.client.xpending_range(self.stream, self.grupo, min="-", max="+", count=1)
+            mas_antiguo_ms = mas_antiguo[0]["time_since_delivered"] if mas_antiguo else None
+
+        estado = {
+            "backend": "stream",
+            "largo_stream": self.client.xlen(self.stream),
+            "pendientes": resumen["pending"],
+            "sin_entregar": grupo.get("lag"),
+            "pendiente_mas_antiguo_ms": mas_antiguo_ms,
+            "por_consumidor": {c["name"]: int(c["pending"]) for c in resumen.get("consumers") or []},
+            "reintentos_en_espera": reintentos,
+        }
+        metrics.fijar("cola.pendientes", estado["pendientes"])
+        if estado["sin_entregar"] is not None:
+            metrics.fijar("cola.sin_entregar", estado["sin_entregar"])
+        return estado
+
+    def migrar_lista_legada(self) -> int:
+        """Pasa al stream las tareas que quedaron en la lista del backend anterior."""
+        if self.backend != "stream":
+            return 0
+        movidas = 0
+        while True:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.lrange(self.QUEUE_NAME, 0, COLA_RPUSH_LOTE - 1)
+            pipe.ltrim(self.QUEUE_NAME, COLA_RPUSH_LOTE, -1)
+            lote, _ = pipe.execute()
+            if not lote:
+                return movidas
+            pipe = self.client.pipeline(transaction=False)
+            for crudo in lote:
+                tarea = json.loads(crudo)
+                self._encolar_en(pipe, tarea["venta_id"], tarea.get("attempts", 0), tarea.get("historial") or ())
+            pipe.execute()
+            movidas += len(lote)
@@ -0,0 +1,115 @@
+"""
+Pools de conexiones Redis compartidos por el proceso.
+
+- `obtener_redis()` / `obtener_redis_async()`: comandos cortos (caches,
+  contadores, colas). socket_timeout de REDIS_TIMEOUT_S.
+- `obtener_redis_bloqueante()`: BLPOP / XREADGROUP con espera. Pool aparte
+  sin socket_timeout corto, para que una espera larga no se confunda con un
+  Redis colgado ni ocupe conexiones del pool general.
+
+Todos los clientes de un pool comparten sus conexiones: crear un
+`redis.Redis(connection_pool=...)` es barato y no abre sockets. Los pools son
+bloqueantes: con las REDIS_MAX_CONEXIONES ocupadas se espera hasta
+REDIS_TIMEOUT_S a que se libere una en vez de fallar al instante.
+"""
+import os
+import threading
+import time
+
+import redis
+import redis.asyncio as redis_async
+
+from src.core import metrics
+
+REDIS_MAX_CONEXIONES = int(os.getenv("REDIS_MAX_CONEXIONES", "50"))
+REDIS_TIMEOUT_S = float(os.getenv("REDIS_TIMEOUT_S", "2"))
+REDIS_HEALTH_CHECK_S = int(os.getenv("REDIS_HEALTH_CHECK_S", "30"))
+
+_pool = None
+_pool_bloqueante = None
+_pool_async = None
+_lock = threading.Lock()
+
+
+def _parametros(socket_timeout=REDIS_TIMEOUT_S):
+    return dict(
+        host=os.getenv("REDIS_HOST", "redis"),
+        port=6379,
+        db=0,
+        decode_responses=True,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=REDIS_TIMEOUT_S,
+        socket_keepalive=True,
+        # PING antes de reutilizar una conexión ociosa más de N s (detecta cortes del servidor)
+        health_check_interval=REDIS_HEALTH_CHECK_S,
+        max_connections=REDIS_MAX_CONEXIONES,
+    )
+
+
+def obtener_pool() -> redis.BlockingConnectionPool:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = redis.BlockingConnectionPool(timeout=REDIS_TIMEOUT_S, **_parametros())
+    return _pool
+
+
+def obtener_redis() -> redis.Redis:
+    """Cliente Redis sobre el pool compartido del proceso."""
+    return redis.Redis(connection_pool=obtener_pool())
+
+
+def obtener_redis_bloqueante() -> redis.Redis:
+    """Cliente para comandos bloqueantes (consumidores de colas)."""
+    global _pool_bloqueante
+    if _pool_bloqueante is None:
+        with _lock:
+            if _pool_bloqueante is None:
+                _pool_bloqueante = redis.BlockingConnectionPool(
+                    timeout=REDIS_TIMEOUT_S, **_parametros(socket_timeout=None)
+                )
+    return redis.Redis(connection_pool=_pool_bloqueante)
+
+
+def obtener_redis_async() -> redis_async.Redis:
+    """Cliente asyncio para el event loop de la API (pub/sub, limitador de logins...)."""
+    global _pool_async
+    if _pool_async is None:
+        _pool_async = redis_async.BlockingConnectionPool(timeout=REDIS_TIMEOUT_S, **_parametros())
+    return redis_async.Redis(connection_pool=_pool_async)
+
+
+def _estado_pool(nombre: str, pool):
+    if pool is None:
+        return
+    # Atributos internos de redis-py: si cambian, se reporta 0 en vez de fallar
+    if hasattr(pool, "_connections"):
+        # BlockingConnectionPool síncrono: `_connections` son las creadas y la cola
+        # `pool` guarda las libres (los None son huecos aún sin conexión)
+        creadas = len(pool._connections)
+        libres = sum(1 for conexion in list(getattr(pool.pool, "queue", ())) if conexion is not None)
+    else:
+        libres = len(getattr(pool, "_available_connections", ()))
+        creadas = libres + len(getattr(pool, "_in_use_connections", ()))
+    metrics.fijar(f"redis.{nombre}.creadas", creadas)
+    metrics.fijar(f"redis.{nombre}.libres", libres)
+    metrics.fijar(f"redis.{nombre}.en_uso", max(creadas - libres, 0))
+    metrics.fijar(f"redis.{nombre}.max", pool.max_connections)
+
+
+def publicar_metricas():
+    """Gauges de los pools y un PING cronometrado (salud y latencia). Lo llama una tarea de fondo de la API."""
+    _estado_pool("pool", _pool)
+    _estado_pool("pool_bloqueante", _pool_bloqueante)
+    _estado_pool("pool_async", _pool_async)
+
+    inicio = time.perf_counter()
+    try:
+        obtener_redis().ping()
+    except Exception:
+        metrics.fijar("redis.disponible", 0)
+        metrics.incrementar("redis.ping_fallidos")
+        return
+    metrics.fijar("redis.disponible", 1)
+    metrics.observar("redis.ping_ms", (time.perf_counter() - inicio) * 1000)
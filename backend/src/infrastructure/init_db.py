@@ -1,22 +1,28 @@
 import sys
 import os
+import argparse
 
 sys.path.append('/app')
 
 from sqlalchemy import text
 from src.infrastructure.database import engine, Base
+from src.infrastructure.vector_index import METODOS_VALIDOS, VECTOR_INDEX_METHOD, crear_indice_vectorial
 
 from src.infrastructure.models import (
     UsuarioModel,
     ClienteModel,
     ProductoModel,
+    ManualChunkModel,
     VentaModel,
     DetalleVentaModel,
     RutaVendedorModel,
-    AuditLog
+    AuditLog,
+    IdempotencyKeyModel,
+    OutboxModel,
+    FacturaFallidaModel
 )
 
-def init_db():
+def init_db(indice_vectorial: str = VECTOR_INDEX_METHOD):
     print("🔄 Inicializando Base de Datos Nexus...")
     try:
         with engine.connect() as conn:
@@ -26,9 +32,22 @@ def init_db():
         
         Base.metadata.create_all(bind=engine)
         print("Tablas creadas exitosamente.")
+
+        with engine.begin() as conn:
+            crear_indice_vectorial(conn, metodo=indice_vectorial)
+            crear_indice_vectorial(conn, tabla="manual_chunks", metodo=indice_vectorial)
+        print(f" Índice vectorial de productos y manuales: {indice_vectorial}")
         
     except Exception as e:
         print(f"Error creando tablas: {e}")
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Inicializa el esquema de Nexus")
+    parser.add_argument(
+        "--indice-vectorial",
+        choices=METODOS_VALIDOS,
+        default=VECTOR_INDEX_METHOD,
+        help="Índice ANN sobre productos y manual_chunks (default: VECTOR_INDEX_METHOD)",
+    )
+    args = parser.parse_args()
+    init_db(args.indice_vectorial)
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""Índice ANN (HNSW / IVFFlat) sobre productos.embedding_vector
+
+El esquema base lo sigue creando init_db (create_all); esta revisión sólo añade
+el índice vectorial elegido por VECTOR_INDEX_METHOD.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+from src.infrastructure.vector_index import (
+    VECTOR_INDEX_METHOD,
+    crear_indice_vectorial,
+    eliminar_indices_vectoriales,
+)
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    crear_indice_vectorial(op.get_bind(), metodo=VECTOR_INDEX_METHOD)
+
+
+def downgrade():
+    eliminar_indices_vectoriales(op.get_bind())
@@ -0,0 +1,25 @@
+"""Columna tsvector (español) + índice GIN para la búsqueda híbrida
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "ALTER TABLE productos ADD COLUMN IF NOT EXISTS busqueda_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_productos_busqueda_tsv ON productos USING gin (busqueda_tsv)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_productos_busqueda_tsv")
+    op.execute("ALTER TABLE productos DROP COLUMN IF EXISTS busqueda_tsv")
@@ -0,0 +1,20 @@
+"""Índice (nombre, id) para la paginación keyset del catálogo
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_productos_nombre_id", "productos", ["nombre", "id"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_productos_nombre_id", table_name="productos", if_exists=True)
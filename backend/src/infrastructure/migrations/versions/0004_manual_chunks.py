@@ -0,0 +1,47 @@
+"""Tabla manual_chunks (fragmentos de manuales con su vector) e índice ANN
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+
+from src.infrastructure.vector_index import (
+    VECTOR_INDEX_METHOD,
+    crear_indice_vectorial,
+    eliminar_indices_vectoriales,
+)
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # En bases recién creadas init_db (create_all) ya la creó
+    if not sa.inspect(bind).has_table("manual_chunks"):
+        op.create_table(
+            "manual_chunks",
+            sa.Column("id", PG_UUID(as_uuid=True), primary_key=True),
+            sa.Column("producto_id", PG_UUID(as_uuid=True),
+                      sa.ForeignKey("productos.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("pagina", sa.Integer(), nullable=False),
+            sa.Column("orden", sa.Integer(), nullable=False),
+            sa.Column("contenido", sa.Text(), nullable=False),
+            sa.Column("tokens", sa.Integer()),
+            sa.Column("content_hash", sa.String(64), nullable=False),
+            sa.Column("embedding_vector", Vector(1536)),
+            sa.Column("creado", sa.DateTime()),
+            sa.UniqueConstraint("producto_id", "content_hash", name="uq_manual_chunks_producto_hash"),
+        )
+    crear_indice_vectorial(bind, tabla="manual_chunks", metodo=VECTOR_INDEX_METHOD)
+
+
+def downgrade():
+    eliminar_indices_vectoriales(op.get_bind(), tabla="manual_chunks")
+    op.drop_table("manual_chunks")
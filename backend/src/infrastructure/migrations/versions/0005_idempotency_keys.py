@@ -0,0 +1,37 @@
+"""Tabla idempotency_keys (Idempotency-Key de checkout y webhooks)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En bases recién creadas init_db (create_all) ya la creó
+    if sa.inspect(op.get_bind()).has_table("idempotency_keys"):
+        return
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("ambito", sa.String(32), primary_key=True),
+        sa.Column("propietario", sa.String(64), primary_key=True),
+        sa.Column("clave", sa.String(255), primary_key=True),
+        sa.Column("hash_peticion", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer()),
+        sa.Column("respuesta", JSONB()),
+        sa.Column("creado", sa.DateTime()),
+        sa.Column("expira", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_idempotency_keys_expira", "idempotency_keys", ["expira"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_expira", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,34 @@
+"""Tabla outbox (mensajes a Redis escritos en la transacción de la venta)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En bases recién creadas init_db (create_all) ya la creó
+    if sa.inspect(op.get_bind()).has_table("outbox"):
+        return
+    op.create_table(
+        "outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("tipo", sa.String(64), nullable=False),
+        sa.Column("payload", JSONB(), nullable=False),
+        sa.Column("creado", sa.DateTime()),
+        sa.Column("enviado", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_outbox_pendientes", "outbox", ["id"], postgresql_where=sa.text("enviado IS NULL"))
+
+
+def downgrade():
+    op.drop_index("ix_outbox_pendientes", table_name="outbox")
+    op.drop_table("outbox")
@@ -0,0 +1,41 @@
+"""Tabla facturas_fallidas (dead letter de la facturación SUNAT)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En bases recién creadas init_db (create_all) ya la creó
+    if sa.inspect(op.get_bind()).has_table("facturas_fallidas"):
+        return
+    op.create_table(
+        "facturas_fallidas",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("venta_id", UUID(as_uuid=True), nullable=False),
+        sa.Column("motivo", sa.String(32), nullable=False),
+        sa.Column("ultimo_error", sa.Text()),
+        sa.Column("intentos", sa.Integer()),
+        sa.Column("historial", JSONB(), nullable=False),
+        sa.Column("payload", JSONB(), nullable=False),
+        sa.Column("creado", sa.DateTime()),
+        sa.Column("reprocesado", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_facturas_fallidas_venta_id", "facturas_fallidas", ["venta_id"])
+    op.create_index("ix_facturas_fallidas_pendientes", "facturas_fallidas", ["creado"],
+                    postgresql_where=sa.text("reprocesado IS NULL"))
+
+
+def downgrade():
+    op.drop_index("ix_facturas_fallidas_pendientes", table_name="facturas_fallidas")
+    op.drop_index("ix_facturas_fallidas_venta_id", table_name="facturas_fallidas")
+    op.drop_table("facturas_fallidas")
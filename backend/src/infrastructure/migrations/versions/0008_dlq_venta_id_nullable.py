@@ -0,0 +1,25 @@
+"""facturas_fallidas.venta_id admite NULL (mensajes veneno con id ilegible)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El id crudo queda en payload; en bases nuevas create_all ya la creó así (no-op)
+    op.alter_column("facturas_fallidas", "venta_id", existing_type=UUID(as_uuid=True), nullable=True)
+
+
+def downgrade():
+    # Sin venta no hay nada que reprocesar: esas filas no caben en el esquema anterior
+    op.execute(sa.text("DELETE FROM facturas_fallidas WHERE venta_id IS NULL"))
+    op.alter_column("facturas_fallidas", "venta_id", existing_type=UUID(as_uuid=True), nullable=False)
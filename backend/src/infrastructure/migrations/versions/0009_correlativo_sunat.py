@@ -0,0 +1,53 @@
+"""Serie y correlativo SUNAT de las ventas (una secuencia por tipo de comprobante)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+import os
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+SERIE_FACTURA = os.getenv("SUNAT_SERIE_FACTURA", "F001")
+SERIE_BOLETA = os.getenv("SUNAT_SERIE_BOLETA", "B001")
+
+# Ventas ya existentes: se numeran por fecha, cada tipo con su serie, y la secuencia sigue desde ahí
+_NUMERAR = """
+UPDATE ventas v SET serie = :serie, correlativo = n.correlativo
+FROM (
+    SELECT v.id, row_number() OVER (ORDER BY v.fecha, v.id) AS correlativo
+    FROM ventas v LEFT JOIN clientes_web c ON c.id = v.cliente_id
+    WHERE v.correlativo IS NULL AND coalesce(length(c.ruc_dni), 0) {comparacion} 11
+) n
+WHERE v.id = n.id
+"""
+_AJUSTAR = "SELECT setval(:secuencia, coalesce((SELECT max(correlativo) FROM ventas WHERE serie = :serie), 0) + 1, false)"
+
+
+def upgrade():
+    op.execute("ALTER TABLE ventas ADD COLUMN IF NOT EXISTS serie varchar(4)")
+    op.execute("ALTER TABLE ventas ADD COLUMN IF NOT EXISTS correlativo integer")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS ventas_correlativo_factura MAXVALUE 99999999")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS ventas_correlativo_boleta MAXVALUE 99999999")
+
+    conn = op.get_bind()
+    for comparacion, serie, secuencia in (("=", SERIE_FACTURA, "ventas_correlativo_factura"),
+                                          ("<>", SERIE_BOLETA, "ventas_correlativo_boleta")):
+        conn.execute(sa.text(_NUMERAR.format(comparacion=comparacion)), {"serie": serie})
+        conn.execute(sa.text(_AJUSTAR), {"secuencia": secuencia, "serie": serie})
+
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_ventas_serie_correlativo ON ventas (serie, correlativo)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS uq_ventas_serie_correlativo")
+    op.execute("ALTER TABLE ventas DROP COLUMN IF EXISTS correlativo")
+    op.execute("ALTER TABLE ventas DROP COLUMN IF EXISTS serie")
+    op.execute("DROP SEQUENCE IF EXISTS ventas_correlativo_boleta")
+    op.execute("DROP SEQUENCE IF EXISTS ventas_correlativo_factura")
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Numeric, Integer, Text
-from sqlalchemy.dialects.postgresql import UUID as PG_UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Numeric, Integer, BigInteger, Text, Computed, Index, Sequence, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, TSVECTOR, JSONB
+from sqlalchemy.orm import relationship, deferred
 from pgvector.sqlalchemy import Vector
 import uuid
 from datetime import datetime
@@ -45,13 +45,50 @@ class ProductoModel(Base):
     nombre = Column(String, index=True)
     descripcion = Column(Text)
     
-    embedding_vector = Column(Vector(1536)) 
+    # ~6 KB por fila: sólo se carga si se pide explícitamente (undefer / columna proyectada)
+    embedding_vector = deferred(Column(Vector(1536)))
     
     precio_base = Column(Numeric(10, 2))
     precio_dinamico = Column(Numeric(10, 2))
     stock = Column(Integer, default=0)
     imagen_url = Column(String, nullable=True)
 
+    # Documento de búsqueda full-text (español), lo mantiene Postgres
+    busqueda_tsv = deferred(Column(
+        TSVECTOR,
+        Computed("to_tsvector('spanish', coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))", persisted=True)
+    ))
+
+    __table_args__ = (
+        Index("ix_productos_busqueda_tsv", "busqueda_tsv", postgresql_using="gin"),
+        Index("ix_productos_nombre_id", "nombre", "id"),
+    )
+
+class ManualChunkModel(Base):
+    """Fragmentos de manuales técnicos (RAG): un vector por fragmento."""
+    __tablename__ = "manual_chunks"
+
+    id = Column(PG_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    producto_id = Column(PG_UUID(as_uuid=True), ForeignKey("productos.id", ondelete="CASCADE"), nullable=False)
+    pagina = Column(Integer, nullable=False)
+    orden = Column(Integer, nullable=False)
+    contenido = Column(Text, nullable=False)
+    tokens = Column(Integer)
+    # sha256 del contenido: al re-ingestar sólo se reemplazan los fragmentos que cambiaron
+    content_hash = Column(String(64), nullable=False)
+    embedding_vector = deferred(Column(Vector(1536)))
+    creado = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("producto_id", "content_hash", name="uq_manual_chunks_producto_hash"),
+    )
+
+# Correlativo SUNAT por tipo de comprobante (la serie sale de SUNAT_SERIE_FACTURA / _BOLETA).
+# nextval no se deshace con un rollback: un checkout fallido deja un hueco en la numeración
+CORRELATIVO_FACTURA = Sequence("ventas_correlativo_factura", maxvalue=99999999, metadata=Base.metadata)
+CORRELATIVO_BOLETA = Sequence("ventas_correlativo_boleta", maxvalue=99999999, metadata=Base.metadata)
+
+
 class VentaModel(Base):
     __tablename__ = "ventas"
     
@@ -69,6 +106,15 @@ class VentaModel(Base):
     xml_generado = Column(Text, nullable=True)
     cdr_sunat = Column(Text, nullable=True)
     hash_firma = Column(String, nullable=True)
+    # Numeración del comprobante (F001-00000042); la asigna UBLGenerator.numeracion al crear la venta
+    serie = Column(String(4), nullable=True)
+    correlativo = Column(Integer, nullable=True)
+
+    detalles = relationship("DetalleVentaModel", back_populates="venta", order_by="DetalleVentaModel.id")
+
+    __table_args__ = (
+        Index("uq_ventas_serie_correlativo", "serie", "correlativo", unique=True),
+    )
 
 class DetalleVentaModel(Base):
     __tablename__ = "detalle_ventas"
@@ -81,6 +127,9 @@ class DetalleVentaModel(Base):
     precio_unitario = Column(Numeric(10, 2))
     subtotal = Column(Numeric(10, 2))
 
+    venta = relationship("VentaModel", back_populates="detalles")
+    producto = relationship("ProductoModel")
+
 
 class RutaVendedorModel(Base):
     __tablename__ = "rutas_vendedores"
@@ -99,4 +148,57 @@ class AuditLog(Base):
     usuario_id = Column(PG_UUID(as_uuid=True), nullable=True)
     accion = Column(String)
     detalles = Column(Text, nullable=True)
-    fecha = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    fecha = Column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKeyModel(Base):
+    """Primera respuesta de una operación con Idempotency-Key (se repite ante reintentos)."""
+    __tablename__ = "idempotency_keys"
+
+    # ambito: "checkout", "whatsapp"...; propietario: cliente que manda la clave ("" si es externo)
+    ambito = Column(String(32), primary_key=True)
+    propietario = Column(String(64), primary_key=True)
+    clave = Column(String(255), primary_key=True)
+    # sha256 del cuerpo: la misma clave con otra petición es un error del cliente
+    hash_peticion = Column(String(64), nullable=False)
+    status_code = Column(Integer)
+    respuesta = Column(JSONB)
+    creado = Column(DateTime, default=datetime.utcnow)
+    expira = Column(DateTime, nullable=False, index=True)
+
+
+class OutboxModel(Base):
+    """Mensajes a publicar en Redis, escritos en la misma transacción que el cambio que los origina."""
+    __tablename__ = "outbox"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    tipo = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    creado = Column(DateTime, default=datetime.utcnow)
+    enviado = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # El relay sólo recorre lo pendiente: índice parcial, no crece con el histórico
+        Index("ix_outbox_pendientes", "id", postgresql_where=text("enviado IS NULL")),
+    )
+
+
+class FacturaFallidaModel(Base):
+    """Dead letter de la facturación SUNAT: tareas que agotaron reintentos o se volvieron veneno."""
+    __tablename__ = "facturas_fallidas"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # NULL si el mensaje traía un id ilegible (el crudo queda en payload)
+    venta_id = Column(PG_UUID(as_uuid=True), nullable=True, index=True)
+    motivo = Column(String(32), nullable=False)  # "max_intentos" | "veneno" | "rechazo_sunat"
+    ultimo_error = Column(Text)
+    intentos = Column(Integer, default=0)
+    # [{"intento", "error", "fecha"}, ...] de los fallos anteriores
+    historial = Column(JSONB, nullable=False, default=list)
+    payload = Column(JSONB, nullable=False)
+    creado = Column(DateTime, default=datetime.utcnow)
+    reprocesado = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_facturas_fallidas_pendientes", "creado", postgresql_where=text("reprocesado IS NULL")),
+    )
@@ -0,0 +1,78 @@
+"""
+Modelos de lectura para los endpoints calientes.
+
+Objetos con `__slots__` construidos desde consultas proyectadas (sólo las
+columnas que la vista necesita): sin identity map, sin `embedding_vector`
+(~6 KB por fila) y con la descripción recortada para las tarjetas.
+"""
+from sqlalchemy import func, select
+
+from src.infrastructure.models import ProductoModel
+
+LARGO_DESCRIPCION_CARD = 280
+
+
+class ProductoCard:
+    """Lo que pinta una tarjeta del Market (ProductoCardSchema)."""
+    __slots__ = ("id", "sku", "nombre", "descripcion", "imagen_url", "precio_base", "stock")
+
+    COLUMNAS = (
+        ProductoModel.id,
+        ProductoModel.sku,
+        ProductoModel.nombre,
+        func.coalesce(func.left(ProductoModel.descripcion, LARGO_DESCRIPCION_CARD), "").label("descripcion"),
+        ProductoModel.imagen_url,
+        ProductoModel.precio_base,
+        ProductoModel.stock,
+    )
+
+    def __init__(self, id, sku, nombre, descripcion, imagen_url, precio_base, stock):
+        self.id = id
+        self.sku = sku
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.imagen_url = imagen_url
+        self.precio_base = precio_base
+        self.stock = stock
+
+    @classmethod
+    def select(cls):
+        return select(*cls.COLUMNAS)
+
+    @classmethod
+    def desde_filas(cls, filas):
+        return [cls(*fila) for fila in filas]
+
+
+class ProductoResumen:
+    """Precio y stock vivos (router de precios del chat, agente de compras)."""
+    __slots__ = ("id", "sku", "nombre", "precio_base", "precio_dinamico", "stock")
+
+    COLUMNAS = (
+        ProductoModel.id,
+        ProductoModel.sku,
+        ProductoModel.nombre,
+        ProductoModel.precio_base,
+        ProductoModel.precio_dinamico,
+        ProductoModel.stock,
+    )
+
+    def __init__(self, id, sku, nombre, precio_base, precio_dinamico, stock):
+        self.id = id
+        self.sku = sku
+        self.nombre = nombre
+        self.precio_base = precio_base
+        self.precio_dinamico = precio_dinamico
+        self.stock = stock
+
+    @classmethod
+    def select(cls):
+        return select(*cls.COLUMNAS)
+
+    @classmethod
+    def desde_fila(cls, fila):
+        return cls(*fila) if fila is not None else None
+
+    @classmethod
+    def desde_filas(cls, filas):
+        return [cls(*fila) for fila in filas]
@@ -0,0 +1,111 @@
+"""
+Gestión de índices ANN de pgvector (HNSW / IVFFlat) y de los parámetros de
+búsqueda por clase de consulta. Los índices usan `vector_l2_ops` porque todas
+las búsquedas ordenan con `<->` (l2_distance).
+"""
+import math
+import os
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+METODOS_VALIDOS = ("hnsw", "ivfflat", "ninguno")
+
+VECTOR_INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "hnsw").lower()
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+# 0 = calcular a partir del nº de filas (filas / 1000, recomendación de pgvector)
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))
+
+# Topes de pgvector (ef_search <= 1000); probes acotado para no degenerar en escaneo completo
+HNSW_MAX_EF_SEARCH = 1000
+IVFFLAT_MAX_PROBES = int(os.getenv("IVFFLAT_MAX_PROBES", "200"))
+
+# Perillas recall/latencia por clase de consulta
+PARAMETROS_BUSQUEDA = {
+    "catalogo": {
+        "hnsw.ef_search": int(os.getenv("CATALOG_HNSW_EF_SEARCH", "40")),
+        "ivfflat.probes": int(os.getenv("CATALOG_IVFFLAT_PROBES", "10")),
+    },
+    "rag": {
+        "hnsw.ef_search": int(os.getenv("RAG_HNSW_EF_SEARCH", "100")),
+        "ivfflat.probes": int(os.getenv("RAG_IVFFLAT_PROBES", "20")),
+    },
+}
+
+
+def nombre_indice(tabla: str, columna: str, metodo: str) -> str:
+    return f"ix_{tabla}_{columna}_{metodo}"
+
+
+def _listas_ivfflat(conn: Connection, tabla: str) -> int:
+    if IVFFLAT_LISTS > 0:
+        return IVFFLAT_LISTS
+    filas = conn.execute(text(f"SELECT count(*) FROM {tabla}")).scalar() or 0
+    return max(1, min(filas // 1000, 4096))
+
+
+def crear_indice_vectorial(
+    conn: Connection,
+    tabla: str = "productos",
+    columna: str = "embedding_vector",
+    metodo: str = VECTOR_INDEX_METHOD,
+):
+    """
+    Deja exactamente un índice ANN (el del método pedido) sobre `tabla.columna`.
+    IVFFlat calcula sus centroides al crearse: conviene crearlo con datos cargados.
+    """
+    if metodo not in METODOS_VALIDOS:
+        raise ValueError(f"Método de índice vectorial desconocido: {metodo}")
+
+    for otro in ("hnsw", "ivfflat"):
+        if otro != metodo:
+            conn.execute(text(f"DROP INDEX IF EXISTS {nombre_indice(tabla, columna, otro)}"))
+
+    if metodo == "hnsw":
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {nombre_indice(tabla, columna, 'hnsw')} "
+            f"ON {tabla} USING hnsw ({columna} vector_l2_ops) "
+            f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+        ))
+    elif metodo == "ivfflat":
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {nombre_indice(tabla, columna, 'ivfflat')} "
+            f"ON {tabla} USING ivfflat ({columna} vector_l2_ops) "
+            f"WITH (lists = {_listas_ivfflat(conn, tabla)})"
+        ))
+
+
+def eliminar_indices_vectoriales(conn: Connection, tabla: str = "productos", columna: str = "embedding_vector"):
+    for metodo in ("hnsw", "ivfflat"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {nombre_indice(tabla, columna, metodo)}"))
+
+
+def configurar_busqueda_vectorial(db: Session, clase: str, ef_search: Optional[int] = None, probes: Optional[int] = None,
+                                  candidatos: Optional[int] = None):
+    """
+    Aplica `hnsw.ef_search` e `ivfflat.probes` de la clase ('catalogo' | 'rag')
+    sólo a la transacción en curso (set_config(..., is_local => true)).
+
+    Un escaneo HNSW devuelve como mucho ef_search filas: si la consulta pide
+    `candidatos` filas (LIMIT), ef_search sube hasta ese valor y probes en la
+    misma proporción, para que el LIMIT no quede recortado en silencio.
+    """
+    if VECTOR_INDEX_METHOD == "ninguno":
+        return
+
+    parametros = PARAMETROS_BUSQUEDA[clase]
+    ef_search = ef_search or parametros["hnsw.ef_search"]
+    probes = probes or parametros["ivfflat.probes"]
+    if candidatos and candidatos > ef_search:
+        probes = min(math.ceil(probes * candidatos / ef_search), IVFFLAT_MAX_PROBES)
+        ef_search = min(candidatos, HNSW_MAX_EF_SEARCH)
+    db.execute(
+        text(
+            "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+            "set_config('ivfflat.probes', :probes, true)"
+        ),
+        {"ef_search": str(ef_search), "probes": str(probes)},
+    )
@@ -1,13 +1,33 @@
-import sys
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import asyncio
+import logging
+import os
+import uuid
+from fastapi import Depends, FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
+from starlette.concurrency import run_in_threadpool
 
 from src.api.auth.routes import auth_router
 from src.api.market.routes import market_router
 from src.api.admin.routes import admin_router
 from src.api.ai.routes import ai_router
 from src.api.webhooks.routes import webhook_router
+from src.api.deps import get_employee_claims
+from src.services import catalog_events
+from src.services.catalog_index import iniciar_indice_catalogo
+from src.services.product_name_index import iniciar_indice_nombres
+from src.services.autocomplete import iniciar_autocompletado
+from src.core.password_executor import detener_pool_passwords, iniciar_pool_passwords
+from src.services.ingestion_jobs import detener_pool, reenviar_progreso
+from src.core import metrics
+from src.infrastructure.adapters import redis_client
+from src.core.logging_config import configurar_logging, request_id_actual
+
+configurar_logging()
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se refrescan los gauges de los pools Redis y el PING (fuera de GET /metrics)
+METRICAS_REDIS_S = float(os.getenv("METRICAS_REDIS_S", "15"))
 
 app = FastAPI(
     title="NEXUS AI ENTERPRISE v2.0",
@@ -51,6 +71,18 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+@app.middleware("http")
+async def asignar_request_id(request: Request, call_next):
+    """Correlaciona los logs de una petición; respeta el X-Request-ID del proxy si viene."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_actual.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_actual.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -63,31 +95,53 @@ async def websocket_endpoint(websocket: WebSocket):
 @app.on_event("startup")
 def startup_event():
     """
-    Imprime todas las rutas registradas al iniciar para detectar errores 404.
+    Registra las rutas registradas al iniciar para detectar errores 404.
     """
-    print("\n" + "="*60, file=sys.stderr)
-    print("INICIANDO NEXUS AI - MAPA DE RUTAS DETECTADO:", file=sys.stderr)
-    print("="*60, file=sys.stderr)
-    
-    rutas = []
+    rutas = [route.path for route in app.routes if hasattr(route, "path")]
     for route in app.routes:
-        if hasattr(route, "path"):
-            rutas.append(route.path)
-            if "/api/" in route.path:
-                print(f"📍 {route.methods} \t {route.path}", file=sys.stderr)
-            
-    print("-" * 60, file=sys.stderr)
+        if hasattr(route, "path") and "/api/" in route.path:
+            logger.debug("Ruta activa", extra={"metodos": sorted(route.methods or ()), "ruta": route.path})
 
     target = "/api/admin/dashboard"
     if target in rutas:
-        print(f" ÉXITO: La ruta crítica '{target}' está ACTIVA.", file=sys.stderr)
+        logger.info("NEXUS AI iniciado", extra={"rutas_api": sum("/api/" in r for r in rutas)})
     else:
-        print(f" ERROR CRÍTICO: La ruta '{target}' NO EXISTE.", file=sys.stderr)
-        print("   POSIBLES CAUSAS:", file=sys.stderr)
-        print("   1. En 'src/api/admin/routes.py' falta el 'prefix=\"/admin\"'.", file=sys.stderr)
-        print("   2. El router de Admin no se está importando correctamente.", file=sys.stderr)
-    
-    print("="*60 + "\n", file=sys.stderr)
+        logger.error("La ruta crítica %s NO EXISTE: revisar el prefix=\"/admin\" de "
+                     "src/api/admin/routes.py y que el router se importe", target)
+
+@app.on_event("startup")
+def cargar_indices_en_memoria():
+    iniciar_indice_catalogo()
+    iniciar_indice_nombres()
+    iniciar_autocompletado()
+    iniciar_pool_passwords()
+    # Cambios de otros workers: se aplican en segundo plano, fuera de las peticiones
+    catalog_events.iniciar_sincronizador()
+
+@app.on_event("startup")
+async def iniciar_progreso_ingestas():
+    """Reenvía a /ws el progreso que publican los jobs de ingesta de manuales."""
+    app.state.tarea_progreso = asyncio.create_task(reenviar_progreso(manager.broadcast))
+
+async def _publicar_metricas_redis():
+    while True:
+        try:
+            await run_in_threadpool(redis_client.publicar_metricas)
+        except Exception:
+            logger.exception("No se pudieron publicar las métricas de Redis")
+        await asyncio.sleep(METRICAS_REDIS_S)
+
+@app.on_event("startup")
+async def iniciar_metricas_redis():
+    app.state.tarea_metricas = asyncio.create_task(_publicar_metricas_redis())
+
+@app.on_event("shutdown")
+async def detener_ingestas():
+    app.state.tarea_progreso.cancel()
+    app.state.tarea_metricas.cancel()
+    detener_pool()
+    detener_pool_passwords()
+    catalog_events.detener_sincronizador()
 
 app.include_router(auth_router, prefix="/api")    
 app.include_router(admin_router, prefix="/api")  
@@ -104,11 +158,7 @@ def health_check():
         "docs": "http://localhost:8000/docs"
     }
 
-@app.on_event("startup")
-def print_routes():
-    print("\n" + "="*50)
-    print(" LISTA DE RUTAS ACTIVAS:")
-    for route in app.routes:
-        if hasattr(route, "path") and "/api/" in route.path:
-            print(f" {route.path}")
-    print("="*50 + "\n")
\ No newline at end of file
+@app.get("/metrics")
+def obtener_metricas(empleado=Depends(get_employee_claims)):
+    """Contadores y latencias del worker que atiende la petición (sólo empleados; sin tocar Redis)."""
+    return metrics.snapshot()
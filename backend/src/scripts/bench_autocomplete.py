@@ -0,0 +1,77 @@
+"""
+Latencia del autocompletado (/market/autocomplete) sin HTTP: construcción del
+índice y p50/p99 de `sugerir` para prefijos aleatorios de 1..n caracteres.
+
+    python src/scripts/bench_autocomplete.py                 # productos de la BD
+    python src/scripts/bench_autocomplete.py --sinteticos 100000
+"""
+import sys
+import os
+import argparse
+import random
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.services.autocomplete import AutocompleteIndex, construir_snapshot, normalizar
+
+PALABRAS = ["Casco", "Guantes", "Taladro", "Llave", "Motor", "Cable", "Bomba", "Filtro",
+            "Aceite", "Disco", "Sierra", "Martillo", "Tornillo", "Válvula", "Tubería"]
+MARCAS = ["Industrial", "3M", "Bosch", "Makita", "Profesional", "Minero", "Eléctrico", "Hidráulico"]
+CATEGORIAS = ["Limpieza", "Seguridad", "Maquinaria", "Herramientas", "Químicos"]
+
+
+def indice_sintetico(cantidad: int) -> AutocompleteIndex:
+    filas = [
+        (uuid.uuid4(), f"{random.choice(PALABRAS)} {random.choice(MARCAS)} {i}", f"SKU-{i:07d}",
+         f"Categoría: {random.choice(CATEGORIAS)}. Producto sintético.")
+        for i in range(cantidad)
+    ]
+    ventas = {str(f[0]): random.randint(1, 100) for f in random.sample(filas, min(cantidad, cantidad // 20 + 1))}
+    indice = AutocompleteIndex()
+    inicio = time.perf_counter()
+    indice.publicar(construir_snapshot(filas, ventas))
+    print(f"🏗️  Índice sintético de {cantidad} productos en {time.perf_counter() - inicio:.2f} s")
+    return indice
+
+
+def indice_bd() -> AutocompleteIndex:
+    from src.infrastructure.database import SessionLocal
+    indice = AutocompleteIndex()
+    db = SessionLocal()
+    try:
+        indice.cargar(db)
+    finally:
+        db.close()
+    return indice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia del autocompletado por prefijos")
+    parser.add_argument("--sinteticos", type=int, default=0, help="Generar N productos en memoria en vez de leer la BD")
+    parser.add_argument("--consultas", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=8)
+    args = parser.parse_args()
+
+    indice = indice_sintetico(args.sinteticos) if args.sinteticos else indice_bd()
+    fuentes = [normalizar(p) for p in PALABRAS + MARCAS + CATEGORIAS] + ["sku-0", "sku-00012"]
+    prefijos = []
+    for _ in range(args.consultas):
+        palabra = random.choice(fuentes)
+        prefijos.append(palabra[:random.randint(1, len(palabra))])
+
+    latencias = []
+    for prefijo in prefijos:
+        inicio = time.perf_counter()
+        indice.sugerir(prefijo, args.limit)
+        latencias.append((time.perf_counter() - inicio) * 1e6)
+
+    latencias.sort()
+    n = len(latencias)
+    print(f"⏱️  {n} consultas | p50 {latencias[n // 2]:.1f} µs | p99 {latencias[int(n * 0.99)]:.1f} µs | "
+          f"max {latencias[-1]:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark del camino de lectura del catálogo: entidad ORM completa (antes)
+contra columnas de tarjeta proyectadas a `ProductoCard` (después).
+
+    python src/scripts/bench_catalog_read.py --sembrar 100000 --limit 50 --repeticiones 200
+
+Los bytes se miden en el servidor con pg_column_size sobre las filas que
+devuelve cada consulta (lo que viaja por el socket, sin overhead de protocolo).
+"""
+import sys
+import os
+import argparse
+import random
+import statistics
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import undefer
+
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import ProductoModel
+from src.infrastructure.read_models import ProductoCard
+from src.services.embeddings import embed_many
+
+
+def sembrar(db, cantidad: int, lote: int = 2000):
+    print(f"📦 Insertando {cantidad} productos sintéticos...")
+    for inicio in range(0, cantidad, lote):
+        n = min(lote, cantidad - inicio)
+        nombres = [f"Producto Bench {inicio + i}" for i in range(n)]
+        descripciones = [f"Descripción técnica extensa del producto {inicio + i}. " * 8 for i in range(n)]
+        vectores = embed_many(f"{a} {b}" for a, b in zip(nombres, descripciones))
+        db.execute(insert(ProductoModel), [
+            {
+                "sku": f"BENCH-{inicio + i:07d}",
+                "nombre": nombres[i],
+                "descripcion": descripciones[i],
+                "precio_base": round(random.uniform(10, 500), 2),
+                "precio_dinamico": None,
+                "stock": random.randint(0, 200),
+                "embedding_vector": vectores[i],
+            }
+            for i in range(n)
+        ])
+        db.commit()
+
+
+def medir(db, consulta, materializar, repeticiones: int):
+    latencias = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        materializar(db.execute(consulta))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        db.expunge_all()
+    return latencias
+
+
+def bytes_por_consulta(db, consulta) -> int:
+    filas = consulta.subquery("filas")
+    return db.execute(select(func.sum(func.pg_column_size(text("filas.*")))).select_from(filas)).scalar() or 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ORM completo vs proyección de tarjeta")
+    parser.add_argument("--sembrar", type=int, default=0, help="Productos sintéticos a insertar antes de medir")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    if args.sembrar:
+        sembrar(db, args.sembrar)
+    total = db.query(func.count(ProductoModel.id)).scalar()
+    print(f"📊 {total} productos | limit={args.limit} | {args.repeticiones} repeticiones")
+
+    antes = (
+        select(ProductoModel)
+        .options(undefer(ProductoModel.embedding_vector))
+        .where(ProductoModel.stock > 0)
+        .limit(args.limit)
+    )
+    despues = ProductoCard.select().where(ProductoModel.stock > 0).limit(args.limit)
+
+    # Columnas que viajaban antes (la fila completa salvo busqueda_tsv, que es posterior)
+    columnas_antes = [c for c in ProductoModel.__table__.c if c.name != "busqueda_tsv"]
+    antes_bytes = select(*columnas_antes).where(ProductoModel.stock > 0).limit(args.limit)
+
+    casos = [
+        ("ORM completo (antes)", antes, antes_bytes, lambda r: r.scalars().all()),
+        ("ProductoCard (después)", despues, despues, ProductoCard.desde_filas),
+    ]
+    for nombre, consulta, consulta_bytes, materializar in casos:
+        medir(db, consulta, materializar, 5)  # calentamiento
+        latencias = medir(db, consulta, materializar, args.repeticiones)
+        kb = bytes_por_consulta(db, consulta_bytes) / 1024
+        print(f"{nombre:<24} {kb:9.1f} KB/respuesta | p50 {statistics.median(latencias):7.2f} ms | "
+              f"p95 {sorted(latencias)[int(len(latencias) * 0.95) - 1]:7.2f} ms")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
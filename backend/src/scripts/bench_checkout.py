@@ -0,0 +1,139 @@
+"""
+Checkouts concurrentes sobre pocos SKUs "calientes": comprueba que no se
+vende más stock del que hay y mide el throughput de `procesar_checkout`.
+
+    python src/scripts/bench_checkout.py --skus 3 --stock 100 --compras 500 --hilos 32
+
+Cada compra lleva 1..--lineas productos calientes con 1..--max-cantidad
+unidades. Al final se cuadra, por SKU: stock inicial - stock final ==
+unidades en detalle_ventas, y stock final >= 0. Los datos del benchmark se
+borran salvo con --conservar.
+"""
+import sys
+import os
+import argparse
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import ClienteModel, DetalleVentaModel, ProductoModel, VentaModel
+from src.services.checkout import ProductosNoEncontrados, StockInsuficiente, procesar_checkout
+
+
+def preparar(db, skus: int, stock: int):
+    cliente_id = uuid.uuid4()
+    db.execute(insert(ClienteModel).values(
+        id=cliente_id, ruc_dni=f"BENCH{cliente_id.hex[:12]}", razon_social="Cliente Bench Checkout",
+        email=f"bench-{cliente_id.hex[:12]}@nexus.local",
+    ))
+    productos = [uuid.uuid4() for _ in range(skus)]
+    db.execute(insert(ProductoModel), [
+        {"id": pid, "sku": f"BENCH-CHK-{pid.hex[:10]}", "nombre": f"Producto Caliente {i}",
+         "descripcion": "Producto del benchmark de checkout", "precio_base": round(random.uniform(10, 500), 2),
+         "stock": stock}
+        for i, pid in enumerate(productos)
+    ])
+    db.commit()
+    return cliente_id, productos
+
+
+def comprar(cliente_id, productos, lineas: int, max_cantidad: int):
+    items = {pid: random.randint(1, max_cantidad) for pid in random.sample(productos, random.randint(1, lineas))}
+    db = SessionLocal()
+    inicio = time.perf_counter()
+    try:
+        procesar_checkout(db, cliente_id, items)
+        resultado = "ok"
+    except StockInsuficiente:
+        resultado = "sin_stock"
+    except OperationalError:
+        resultado = "lock_timeout"
+    except ProductosNoEncontrados:
+        resultado = "error"
+    finally:
+        db.close()
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+def cuadrar(db, cliente_id, productos, stock_inicial: int) -> bool:
+    vendidos = dict(db.execute(
+        select(DetalleVentaModel.producto_id, func.sum(DetalleVentaModel.cantidad))
+        .join(VentaModel, VentaModel.id == DetalleVentaModel.venta_id)
+        .where(VentaModel.cliente_id == cliente_id)
+        .group_by(DetalleVentaModel.producto_id)
+    ).all())
+    finales = dict(db.execute(select(ProductoModel.id, ProductoModel.stock).where(ProductoModel.id.in_(productos))).all())
+
+    correcto = True
+    for pid in productos:
+        vendido = int(vendidos.get(pid, 0))
+        final = finales[pid]
+        ok = final >= 0 and stock_inicial - final == vendido
+        correcto &= ok
+        print(f"   {'✅' if ok else '❌'} {pid}: vendidos {vendido}, stock final {final}")
+    return correcto
+
+
+def limpiar(db, cliente_id, productos):
+    ventas = select(VentaModel.id).where(VentaModel.cliente_id == cliente_id)
+    db.execute(delete(DetalleVentaModel).where(DetalleVentaModel.venta_id.in_(ventas)))
+    db.execute(delete(VentaModel).where(VentaModel.cliente_id == cliente_id))
+    db.execute(delete(ProductoModel).where(ProductoModel.id.in_(productos)))
+    db.execute(delete(ClienteModel).where(ClienteModel.id == cliente_id))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de checkouts concurrentes (sin sobreventa)")
+    parser.add_argument("--skus", type=int, default=3, help="Productos calientes")
+    parser.add_argument("--stock", type=int, default=100, help="Stock inicial de cada producto")
+    parser.add_argument("--compras", type=int, default=500, help="Checkouts a lanzar")
+    parser.add_argument("--hilos", type=int, default=32, help="Checkouts en paralelo")
+    parser.add_argument("--lineas", type=int, default=2, help="Máximo de productos por compra")
+    parser.add_argument("--max-cantidad", type=int, default=3, help="Máximo de unidades por línea")
+    parser.add_argument("--conservar", action="store_true", help="No borrar los datos del benchmark")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        cliente_id, productos = preparar(db, args.skus, args.stock)
+        print(f"🔥 {args.compras} checkouts con {args.hilos} hilos sobre {args.skus} SKUs "
+              f"(stock {args.stock} c/u)...")
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+            resultados = list(pool.map(
+                lambda _: comprar(cliente_id, productos, min(args.lineas, args.skus), args.max_cantidad),
+                range(args.compras),
+            ))
+        duracion = time.perf_counter() - inicio
+
+        conteo = {}
+        for resultado, _ in resultados:
+            conteo[resultado] = conteo.get(resultado, 0) + 1
+        latencias = sorted(ms for _, ms in resultados)
+        print(f"⏱️  {duracion:.2f} s -> {args.compras / duracion:.0f} checkouts/s | {conteo}")
+        print(f"   latencia p50 {statistics.median(latencias):.1f} ms | "
+              f"p99 {latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]:.1f} ms")
+
+        print("📦 Cuadre de stock:")
+        correcto = cuadrar(db, cliente_id, productos, args.stock)
+        print("✅ Sin sobreventa." if correcto else "❌ El stock no cuadra: hay sobreventa o ventas perdidas.")
+    finally:
+        if not args.conservar and "cliente_id" in locals():
+            limpiar(db, cliente_id, productos)
+        db.close()
+
+    sys.exit(0 if correcto else 1)
+
+
+if __name__ == "__main__":
+    main()
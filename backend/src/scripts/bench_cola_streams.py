@@ -0,0 +1,86 @@
+"""
+Escalado de la cola SUNAT sobre Redis Streams: mismo lote de tareas
+consumido por 1, 2, 4... réplicas (procesos) del mismo grupo, con un trabajo
+simulado por tarea. Con trabajo dominado por E/S (SUNAT) el throughput debe
+crecer casi lineal con las réplicas.
+
+    python src/scripts/bench_cola_streams.py --tareas 2000 --trabajo-ms 20 --replicas 1,2,4,8
+
+Usa un stream propio por corrida (se borra al terminar) y comprueba que
+todas las tareas se confirmaron al menos una vez.
+"""
+import sys
+import os
+import argparse
+import multiprocessing
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from src.infrastructure.adapters.redis_client import obtener_redis
+
+
+def consumir(stream: str, grupo: str, consumidor: str, trabajo_ms: float, procesadas):
+    cola = QueueAdapter(backend="stream", stream=stream, grupo=grupo)
+    vacias = 0
+    while vacias < 2:
+        tareas = cola.leer_tareas(consumidor, cantidad=1, bloqueo_ms=500)
+        if not tareas:
+            vacias += 1
+            continue
+        vacias = 0
+        for tarea in tareas:
+            time.sleep(trabajo_ms / 1000)
+            cola.confirmar(tarea)
+            with procesadas.get_lock():
+                procesadas.value += 1
+
+
+def correr(tareas: int, replicas: int, trabajo_ms: float) -> float:
+    stream, grupo = f"bench:sunat:{uuid.uuid4().hex[:8]}", "bench"
+    cola = QueueAdapter(backend="stream", stream=stream, grupo=grupo)
+    cola.asegurar_grupo()
+    cola.encolar_facturas(uuid.uuid4() for _ in range(tareas))
+
+    ctx = multiprocessing.get_context("spawn")
+    procesadas = ctx.Value("i", 0)
+    procesos = [
+        ctx.Process(target=consumir, args=(stream, grupo, f"bench-{i}", trabajo_ms, procesadas))
+        for i in range(replicas)
+    ]
+    inicio = time.perf_counter()
+    for p in procesos:
+        p.start()
+    while procesadas.value < tareas and any(p.is_alive() for p in procesos):
+        time.sleep(0.01)
+    duracion = time.perf_counter() - inicio
+    for p in procesos:
+        p.join()
+
+    pendientes = cola.estado_pendientes()["pendientes"]
+    obtener_redis().delete(stream)
+    if procesadas.value < tareas or pendientes:
+        print(f"   ❌ {replicas} réplicas: procesadas {procesadas.value}/{tareas}, pendientes {pendientes}")
+    return tareas / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput de la cola SUNAT (Streams) por número de réplicas")
+    parser.add_argument("--tareas", type=int, default=2000)
+    parser.add_argument("--trabajo-ms", type=float, default=20, help="Trabajo simulado por tarea")
+    parser.add_argument("--replicas", default="1,2,4,8", help="Lista de réplicas a probar")
+    args = parser.parse_args()
+
+    base = None
+    print(f"📨 {args.tareas} tareas, {args.trabajo_ms} ms de trabajo c/u")
+    for replicas in (int(r) for r in args.replicas.split(",")):
+        throughput = correr(args.tareas, replicas, args.trabajo_ms)
+        base = base or throughput / replicas
+        print(f"   {replicas:>2} réplicas: {throughput:8.0f} tareas/s | "
+              f"eficiencia {throughput / (base * replicas):.0%} del escalado lineal")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark offline del micro-batching de embeddings.
+Simula N clientes concurrentes contra el FakeEmbeddingProvider (latencia
+configurable) y compara lotes de 1 texto contra micro-lotes.
+
+    python src/scripts/bench_embeddings.py --clientes 32 --pedidos 50 --latencia-ms 40
+"""
+import sys
+import os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.services.embedding_providers import FakeEmbeddingProvider
+from src.services.embeddings import (
+    EmbeddingEngine,
+    MicroBatcher,
+    PresupuestoTokens,
+    EMBEDDING_MAX_TOKENS_TEXTO,
+    EMBEDDING_MAX_TOKENS_LOTE,
+)
+
+
+def correr(max_batch: int, espera_ms: float, args) -> dict:
+    provider = FakeEmbeddingProvider(args.latencia_ms, args.latencia_texto_ms)
+    presupuesto = PresupuestoTokens(EMBEDDING_MAX_TOKENS_TEXTO, EMBEDDING_MAX_TOKENS_LOTE)
+    batcher = MicroBatcher(provider, presupuesto, max_batch=max_batch,
+                           max_espera_ms=espera_ms, concurrencia=args.concurrencia)
+    # Sin caché LRU ni disco: se mide sólo el camino al proveedor
+    motor = EmbeddingEngine(provider, cache_disco=None, batcher=batcher, capacidad_lru=0)
+
+    def cliente(n: int):
+        for i in range(args.pedidos):
+            motor.embed(f"cliente {n} consulta {i} casco de seguridad dieléctrico")
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clientes) as pool:
+        list(pool.map(cliente, range(args.clientes)))
+    duracion = time.perf_counter() - inicio
+
+    total = args.clientes * args.pedidos
+    return {
+        "textos": total,
+        "segundos": duracion,
+        "textos_s": total / duracion,
+        "llamadas_api": provider.llamadas,
+        "textos_por_llamada": batcher.textos_enviados / max(batcher.lotes_enviados, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de micro-batching de embeddings")
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--pedidos", type=int, default=20)
+    parser.add_argument("--latencia-ms", type=float, default=40.0)
+    parser.add_argument("--latencia-texto-ms", type=float, default=0.2)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--espera-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"⚙️  {args.clientes} clientes x {args.pedidos} pedidos | latencia API {args.latencia_ms} ms")
+    for nombre, max_batch, espera in [
+        ("sin lotes", 1, 0.0),
+        (f"micro-lotes ({args.max_batch}, {args.espera_ms} ms)", args.max_batch, args.espera_ms),
+    ]:
+        r = correr(max_batch, espera, args)
+        print(
+            f"{nombre:<28} {r['textos_s']:>9.1f} textos/s | {r['segundos']:.2f} s | "
+            f"{r['llamadas_api']} llamadas API | {r['textos_por_llamada']:.1f} textos/llamada"
+        )
+
+
+if __name__ == "__main__":
+    main()
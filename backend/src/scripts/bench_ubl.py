@@ -0,0 +1,77 @@
+"""
+Throughput del generador UBL 2.1 (services/sunat/ubl_generator.py) con
+ventas de 1 y de 500 líneas, en memoria (no toca la BD).
+
+    python src/scripts/bench_ubl.py --facturas 2000 --lineas 1,500
+
+Antes de medir valida que el XML esté bien formado y que los totales
+cuadren con la suma de las líneas.
+"""
+import sys
+import os
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from xml.etree import ElementTree
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.infrastructure.models import ClienteModel, DetalleVentaModel, ProductoModel, VentaModel
+from src.services.sunat.ubl_generator import SUNAT_SERIE_FACTURA, UBLGenerator
+
+_NS = {"cbc": "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+       "cac": "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"}
+
+
+def venta_de_prueba(lineas: int) -> VentaModel:
+    cliente = ClienteModel(id=uuid.uuid4(), ruc_dni="20123456789", razon_social="Ferretería Pérez & Hijos <SAC>")
+    detalles = []
+    for i in range(lineas):
+        precio = Decimal(random.randint(100, 50000)) / 100
+        cantidad = random.randint(1, 20)
+        producto = ProductoModel(id=uuid.uuid4(), sku=f"SKU-{i:05d}", nombre=f"Producto de prueba {i} \"premium\"")
+        detalles.append(DetalleVentaModel(id=uuid.uuid4(), cantidad=cantidad, precio_unitario=precio,
+                                          subtotal=precio * cantidad, producto=producto))
+    return VentaModel(id=uuid.uuid4(), fecha=datetime.utcnow(), cliente=cliente, detalles=detalles,
+                      serie=SUNAT_SERIE_FACTURA, correlativo=random.randint(1, 99999999),
+                      total=sum(d.subtotal for d in detalles))
+
+
+def validar(venta: VentaModel):
+    raiz = ElementTree.fromstring(UBLGenerator.generar_xml_factura(venta).encode("utf-8"))
+    lineas = raiz.findall("cac:InvoiceLine", _NS)
+    assert len(lineas) == len(venta.detalles), "número de líneas"
+    base = sum(Decimal(l.find("cbc:LineExtensionAmount", _NS).text) for l in lineas)
+    pagable = Decimal(raiz.find("cac:LegalMonetaryTotal/cbc:PayableAmount", _NS).text)
+    assert base == Decimal(raiz.find("cac:LegalMonetaryTotal/cbc:LineExtensionAmount", _NS).text), "base imponible"
+    assert pagable == venta.total, f"total {pagable} != {venta.total}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del generador UBL 2.1")
+    parser.add_argument("--facturas", type=int, default=2000, help="Facturas por medición (se divide entre las líneas)")
+    parser.add_argument("--lineas", default="1,500", help="Líneas por factura a probar")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    for lineas in (int(n) for n in args.lineas.split(",")):
+        # Mismo volumen de líneas aprox. en cada medición: menos facturas cuanto más largas
+        cantidad = max(10, args.facturas // max(1, lineas // 10))
+        ventas = [venta_de_prueba(lineas) for _ in range(cantidad)]
+        validar(ventas[0])
+
+        mejor = float("inf")
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            xmls = UBLGenerator.generar_lote(ventas)
+            mejor = min(mejor, time.perf_counter() - inicio)
+        tamano = sum(len(x) for x in xmls) / len(xmls)
+        print(f"🧾 {lineas:>4} líneas: {cantidad / mejor:9.0f} facturas/s | {cantidad * lineas / mejor:9.0f} líneas/s "
+              f"| {mejor / cantidad * 1000:7.3f} ms/factura | {tamano / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Inspección y reproceso de la dead letter de facturación SUNAT.
+
+    python src/scripts/dlq.py resumen
+    python src/scripts/dlq.py listar --error "503" --desde 2026-10-18 --limite 20 --historial
+    python src/scripts/dlq.py reprocesar --error "no responde" --desde 2026-10-18T08:00 --tasa 20
+    python src/scripts/dlq.py reprocesar --motivo veneno --simular
+
+`reprocesar` devuelve las facturas a la cola por lotes a --tasa facturas/s
+como máximo, para no saturar a SUNAT justo cuando se recupera. Se puede
+cortar con Ctrl+C: lo ya encolado queda marcado como reprocesado y lo demás
+sigue en la dead letter.
+"""
+import sys
+import os
+import argparse
+import math
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from sqlalchemy import func, select
+
+from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import FacturaFallidaModel
+from src.services import dlq
+
+
+def _filtro(args) -> dlq.Filtro:
+    return dlq.Filtro(
+        error=args.error,
+        motivo=args.motivo,
+        desde=args.desde,
+        hasta=args.hasta,
+        incluir_reprocesadas=getattr(args, "todas", False),
+    )
+
+
+def _tasa(valor: str) -> float:
+    tasa = float(valor)
+    if not 0 < tasa < math.inf:
+        raise argparse.ArgumentTypeError(f"debe ser un número mayor que 0: {valor}")
+    return tasa
+
+
+def _contar(db, filtro: dlq.Filtro) -> int:
+    return db.scalar(filtro.aplicar(select(func.count()).select_from(FacturaFallidaModel)))
+
+
+def cmd_resumen(db, args):
+    filas = dlq.resumen(db, _filtro(args))
+    if not filas:
+        print("✅ Dead letter vacía para ese filtro")
+        return
+    print(f"{'cantidad':>8}  {'motivo':<13} {'primera':<16} {'última':<16} error")
+    for motivo, error, cantidad, primera, ultima in filas:
+        print(f"{cantidad:>8}  {motivo:<13} {primera:%Y-%m-%d %H:%M} {ultima:%Y-%m-%d %H:%M} {(error or '')[:80]}")
+    print(f"📦 Total: {sum(f[2] for f in filas)}")
+
+
+def cmd_listar(db, args):
+    filas = dlq.listar(db, _filtro(args), limite=args.limite)
+    if not filas:
+        print("✅ Dead letter vacía para ese filtro")
+        return
+    for fila in filas:
+        estado = f"reprocesada {fila.reprocesado:%Y-%m-%d %H:%M}" if fila.reprocesado else "pendiente"
+        venta = fila.venta_id or f"ilegible {(fila.payload or {}).get('venta_id')!r}"
+        print(f"#{fila.id} {fila.creado:%Y-%m-%d %H:%M:%S} venta {venta} | {fila.motivo} | "
+              f"{fila.intentos} intentos | {estado}")
+        print(f"    ❌ {fila.ultimo_error}")
+        if args.historial:
+            for entrada in fila.historial or []:
+                print(f"       {entrada.get('fecha')} intento {entrada.get('intento')}: {entrada.get('error')}")
+    print(f"📦 Mostradas {len(filas)} de {_contar(db, _filtro(args))}")
+
+
+def cmd_reprocesar(db, args):
+    filtro = _filtro(args)._replace(solo_reprocesables=True)
+    total = _contar(db, filtro)
+    if args.maximo:
+        total = min(total, args.maximo)
+    if not total:
+        print("✅ Nada que reprocesar para ese filtro")
+        return
+    if args.simular:
+        print(f"🔎 Se reprocesarían {total} facturas a {args.tasa}/s (~{total / args.tasa:.0f} s)")
+        return
+
+    cola = QueueAdapter()
+    lote = max(1, min(args.lote, int(args.tasa)))
+    hechas, inicio = 0, time.perf_counter()
+    print(f"🔁 Reprocesando {total} facturas a {args.tasa}/s en lotes de {lote}")
+    try:
+        while hechas < total:
+            movidas = dlq.reprocesar_lote(db, cola, filtro, min(lote, total - hechas))
+            if not movidas:
+                break
+            hechas += movidas
+            # Límite de ritmo: el lote n no sale antes de n * lote / tasa segundos
+            adelanto = hechas / args.tasa - (time.perf_counter() - inicio)
+            if adelanto > 0:
+                time.sleep(adelanto)
+            print(f"   {hechas}/{total} encoladas", end="\r", flush=True)
+    except KeyboardInterrupt:
+        print("\n⏹️  Interrumpido")
+    duracion = time.perf_counter() - inicio
+    print(f"\n✅ {hechas} facturas devueltas a la cola en {duracion:.1f} s ({hechas / max(duracion, 1e-9):.1f}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dead letter de facturación SUNAT")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def con_filtros(p):
+        p.add_argument("--error", help="Texto contenido en el último error")
+        p.add_argument("--motivo", choices=[dlq.MOTIVO_MAX_INTENTOS, dlq.MOTIVO_VENENO, dlq.MOTIVO_RECHAZO])
+        p.add_argument("--desde", type=datetime.fromisoformat, help="Fecha/hora ISO (UTC), inclusive")
+        p.add_argument("--hasta", type=datetime.fromisoformat, help="Fecha/hora ISO (UTC), exclusive")
+        return p
+
+    p = con_filtros(sub.add_parser("resumen", help="Conteo por motivo y error"))
+    p.add_argument("--todas", action="store_true", help="Incluir las ya reprocesadas")
+    p.set_defaults(func=cmd_resumen)
+
+    p = con_filtros(sub.add_parser("listar", help="Últimas facturas fallidas"))
+    p.add_argument("--todas", action="store_true", help="Incluir las ya reprocesadas")
+    p.add_argument("--limite", type=int, default=50)
+    p.add_argument("--historial", action="store_true", help="Mostrar el historial de fallos")
+    p.set_defaults(func=cmd_listar)
+
+    p = con_filtros(sub.add_parser("reprocesar", help="Devolver a la cola con límite de ritmo"))
+    p.add_argument("--tasa", type=_tasa, default=20, help="Facturas por segundo como máximo")
+    p.add_argument("--lote", type=int, default=100, help="Facturas por transacción")
+    p.add_argument("--maximo", type=int, help="Reprocesar como mucho N")
+    p.add_argument("--simular", action="store_true", help="Sólo contar, no encolar")
+    p.set_defaults(func=cmd_reprocesar)
+
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,14 +10,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 from src.infrastructure.database import SessionLocal, engine, Base
 from src.infrastructure.models import UsuarioModel, ClienteModel, ProductoModel, VentaModel, DetalleVentaModel
 from src.core.security import get_password_hash
-from src.services.ai_catalog import AISearchService
+from src.services.embeddings import embed
+from src.services.sunat.ubl_generator import UBLGenerator
 
 fake = Faker(['es_ES', 'es_MX'])
 
 def massive_seed():
     print("🚀 INICIANDO CARGA MASIVA DE DATOS (NEXUS ENTERPRISE)...")
     db = SessionLocal()
-    ai_service = AISearchService(db)
 
     print("👤 Generando Staff...")
     roles = ['ADMIN', 'VENDEDOR', 'ALMACEN']
@@ -66,7 +66,7 @@ def massive_seed():
         nombre = f"{noun} Industrial {adj} {fake.color_name()}"
         desc = fake.paragraph(nb_sentences=3)
         
-        vector = ai_service._generar_embedding_simulado(desc)
+        vector = embed(desc)
         
         precio = round(random.uniform(10.0, 500.0), 2)
         
@@ -97,7 +97,8 @@ def massive_seed():
             cliente_id=cliente.id,
             vendedor_id=vendedor.id,
             estado=random.choice(estados),
-            total=0 
+            total=0,
+            **UBLGenerator.numeracion(cliente.id)
         )
         db.add(venta)
         db.flush()
@@ -0,0 +1,77 @@
+"""
+Servidor SUNAT simulado para medir el worker en local: latencia configurable
+(con jitter) y una tasa de fallos que responde 503.
+
+    python src/scripts/mock_sunat.py --latencia-ms 2000 --tasa-fallos 0.05 --puerto 8090
+    SUNAT_URL=http://localhost:8090/sunat/facturas SUNAT_CONCURRENCIA=50 python src/workers/sunat_worker.py
+
+Cada --reporte-s segundos imprime las peticiones atendidas por segundo.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+def crear_app(latencia_ms: float, jitter: float, tasa_fallos: float, reporte_s: float) -> FastAPI:
+    app = FastAPI(title="SUNAT simulado")
+    contador = {"aceptadas": 0, "fallidas": 0}
+
+    @app.post("/sunat/facturas")
+    async def recibir_factura(request: Request, x_venta_id: str = Header("")):
+        xml = await request.body()
+        espera = latencia_ms * (1 + random.uniform(-jitter, jitter)) / 1000
+        await asyncio.sleep(max(espera, 0))
+        if random.random() < tasa_fallos:
+            contador["fallidas"] += 1
+            return JSONResponse(status_code=503, content={"detail": "Servicio no disponible"})
+        contador["aceptadas"] += 1
+        return {
+            "cdr": f"CDR-{x_venta_id}-ACEPTADO",
+            "hash_firma": hashlib.sha256(xml).hexdigest()[:28],
+        }
+
+    async def reportar():
+        anterior = dict(contador)
+        while True:
+            await asyncio.sleep(reporte_s)
+            aceptadas = contador["aceptadas"] - anterior["aceptadas"]
+            fallidas = contador["fallidas"] - anterior["fallidas"]
+            anterior = dict(contador)
+            if aceptadas or fallidas:
+                print(f"📊 {time.strftime('%H:%M:%S')} {(aceptadas + fallidas) / reporte_s:7.1f} req/s "
+                      f"| ✅ {aceptadas} ❌ {fallidas} | total aceptadas {contador['aceptadas']}")
+
+    @app.on_event("startup")
+    async def iniciar_reporte():
+        asyncio.create_task(reportar())
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor SUNAT simulado para benchmarks del worker")
+    parser.add_argument("--latencia-ms", type=float, default=2000, help="Latencia media por envío")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variación relativa de la latencia (0.2 = ±20%%)")
+    parser.add_argument("--tasa-fallos", type=float, default=0.05, help="Fracción de envíos que responden 503")
+    parser.add_argument("--puerto", type=int, default=8090)
+    parser.add_argument("--reporte-s", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"🧾 SUNAT simulado en :{args.puerto} | latencia {args.latencia_ms} ms ±{args.jitter:.0%} "
+          f"| fallos {args.tasa_fallos:.0%}")
+    app = crear_app(args.latencia_ms, args.jitter, args.tasa_fallos, args.reporte_s)
+    uvicorn.run(app, host="0.0.0.0", port=args.puerto, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,12 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
 from src.infrastructure.database import SessionLocal, engine, Base
 from src.infrastructure.models import ProductoModel
-from src.services.ai_catalog import AISearchService
+from src.services.embeddings import embed_many
 import random
 
 def seed_products():
     print("Sembrando Catálogo Industrial...")
     db = SessionLocal()
-    ai_service = AISearchService(db)
     
     productos_dummy = [
         ("Desengrasante Motor X", "Químico fuerte para grasa mecánica", 45.00),
@@ -25,8 +24,9 @@ def seed_products():
         ("Alcohol Isopropílico", "Limpieza de circuitos electrónicos 1L", 22.00)
     ]
 
-    for nombre, desc, precio in productos_dummy:
-        vector = ai_service._generar_embedding_simulado(desc)
+    vectores = embed_many(desc for _, desc, _ in productos_dummy)
+
+    for (nombre, desc, precio), vector in zip(productos_dummy, vectores):
         
         prod = ProductoModel(
             nombre=nombre,
@@ -1,6 +1,5 @@
 import sys
 import os
-import hashlib
 import random
 from datetime import datetime, timedelta
 
@@ -9,15 +8,8 @@ sys.path.append('/app')
 from src.infrastructure.database import SessionLocal, engine, Base
 from src.infrastructure.models import ProductoModel, ClienteModel, VentaModel, DetalleVentaModel, UsuarioModel
 from src.core.security import get_password_hash
-
-def get_deterministic_vector(text: str):
-    """
-    Genera un vector único y consistente basado en el texto.
-    Así evitamos vectores idénticos para productos distintos.
-    """
-    seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest(), 16) % 10**8
-    random.seed(seed)
-    return [random.uniform(-0.1, 0.1) for _ in range(1536)]
+from src.services.embeddings import embed_many
+from src.services.sunat.ubl_generator import UBLGenerator
 
 def seed_real_data():
     print("LIMPIANDO BASE DE DATOS...")
@@ -45,10 +37,10 @@ def seed_real_data():
         {"nombre": "Cinta de Señalización Peligro 500m", "sku": "SIG-001", "precio": 45.00, "stock": 30, "desc": "Cinta amarilla/negra de alta visibilidad para delimitar zonas."}
     ]
 
+    vectores = embed_many(f"{p['nombre']} {p['desc']}" for p in productos_data)
+
     prod_objs = []
-    for p in productos_data:
-        texto_ia = f"{p['nombre']} {p['desc']}"
-        vector = get_deterministic_vector(texto_ia)
+    for p, vector in zip(productos_data, vectores):
         
         img_text = p['nombre'].split()[0]
         img = f"https://via.placeholder.com/400x300/0f2027/ffffff?text={img_text}"
@@ -74,7 +66,9 @@ def seed_real_data():
         qty = random.randint(1, 5)
         total = float(prod.precio_base) * qty
         
-        venta = VentaModel(fecha=fecha, cliente_id=random.choice(clientes).id, total=total, estado="FACTURADO_SUNAT")
+        cliente_id = random.choice(clientes).id
+        venta = VentaModel(fecha=fecha, cliente_id=cliente_id, total=total, estado="FACTURADO_SUNAT",
+                           **UBLGenerator.numeracion(cliente_id))
         db.add(venta)
         db.flush()
         
@@ -0,0 +1,89 @@
+"""
+Reporte recall@k vs latencia del índice ANN de productos.
+Se ejecuta contra una base ya sembrada (massive_seeder / seed_real):
+
+    python src/scripts/vector_recall_report.py --k 10 --consultas 100 --valores 10,20,40,80,160
+
+Para cada valor de `hnsw.ef_search` (o `ivfflat.probes`) compara el top-k del
+índice contra el top-k exacto (scan secuencial forzado).
+"""
+import sys
+import os
+import argparse
+import statistics
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from sqlalchemy import select, text
+
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import ProductoModel
+from src.infrastructure.vector_index import VECTOR_INDEX_METHOD, configurar_busqueda_vectorial
+from src.services.embeddings import embed_many
+
+
+def top_k(db, vector, k: int):
+    stmt = select(ProductoModel.id).order_by(
+        ProductoModel.embedding_vector.l2_distance(vector)
+    ).limit(k)
+    inicio = time.perf_counter()
+    ids = db.execute(stmt).scalars().all()
+    return ids, (time.perf_counter() - inicio) * 1000
+
+
+def percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latencia del índice vectorial")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--valores", default="10,20,40,80,160",
+                        help="ef_search (HNSW) o probes (IVFFlat) a evaluar")
+    args = parser.parse_args()
+    valores = [int(v) for v in args.valores.split(",")]
+
+    db = SessionLocal()
+    nombres = db.execute(
+        select(ProductoModel.nombre).order_by(text("random()")).limit(args.consultas)
+    ).scalars().all()
+    if not nombres:
+        print("La tabla productos está vacía: ejecuta primero un seeder.")
+        return
+    consultas = embed_many(f"{n} consulta" for n in nombres)
+
+    print(f"📊 Índice: {VECTOR_INDEX_METHOD} | k={args.k} | {len(consultas)} consultas")
+
+    exactos, lat_exacta = [], []
+    for vector in consultas:
+        db.execute(text("SET LOCAL enable_indexscan = off"))
+        ids, ms = top_k(db, vector, args.k)
+        db.rollback()
+        exactos.append(set(ids))
+        lat_exacta.append(ms)
+    print(f"{'exacto':<14} recall@{args.k}=1.000 | p50 {statistics.median(lat_exacta):7.2f} ms | "
+          f"p95 {percentil(lat_exacta, 0.95):7.2f} ms")
+
+    parametro = "probes" if VECTOR_INDEX_METHOD == "ivfflat" else "ef_search"
+    for valor in valores:
+        recalls, latencias = [], []
+        for vector, exacto in zip(consultas, exactos):
+            if parametro == "probes":
+                configurar_busqueda_vectorial(db, "catalogo", probes=valor)
+            else:
+                configurar_busqueda_vectorial(db, "catalogo", ef_search=valor)
+            ids, ms = top_k(db, vector, args.k)
+            db.rollback()
+            recalls.append(len(exacto.intersection(ids)) / max(len(exacto), 1))
+            latencias.append(ms)
+        print(f"{parametro + '=' + str(valor):<14} recall@{args.k}={statistics.mean(recalls):.3f} | "
+              f"p50 {statistics.median(latencias):7.2f} ms | p95 {percentil(latencias, 0.95):7.2f} ms")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
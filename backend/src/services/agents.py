@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from src.infrastructure.models import ProductoModel
+from src.infrastructure.read_models import ProductoResumen
 from .pdf_generator import PDFGenerator
 import random
 
@@ -14,7 +15,9 @@ class PurchasingAgent:
         2. Compara con Stock.
         3. Si falta, compra.
         """
-        producto = self.db.query(ProductoModel).get(producto_id)
+        producto = ProductoResumen.desde_fila(self.db.execute(
+            ProductoResumen.select().where(ProductoModel.id == producto_id)
+        ).first())
         if not producto: return {"status": "error", "msg": "Producto no encontrado"}
         
         demanda_proyectada = random.randint(20, 100) 
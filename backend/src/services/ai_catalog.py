@@ -1,55 +1,142 @@
-import hashlib
-import random
-from typing import List
+import os
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import select, or_
+from sqlalchemy import select, func, literal, literal_column, cast, bindparam, Float, tuple_, or_, and_
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from src.infrastructure.models import ProductoModel
+from src.infrastructure.read_models import ProductoCard
+from src.infrastructure.vector_index import configurar_busqueda_vectorial
+from src.services.embeddings import EmbeddingEngine, obtener_motor
+from src.services.catalog_index import indice_catalogo, indice_disponible
+
+# Reciprocal Rank Fusion: score = Σ peso / (k + rank)
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_PESO_VECTOR = float(os.getenv("HYBRID_PESO_VECTOR", "1.0"))
+HYBRID_PESO_TEXTO = float(os.getenv("HYBRID_PESO_TEXTO", "1.0"))
+HYBRID_CANDIDATOS = int(os.getenv("HYBRID_CANDIDATOS", "50"))
+# Tope de candidatos por fuente al paginar resultados de búsqueda
+HYBRID_MAX_PROFUNDIDAD = int(os.getenv("HYBRID_MAX_PROFUNDIDAD", "1000"))
+# Páginas que cubre el conjunto de candidatos fijado en la primera página
+HYBRID_PAGINAS = int(os.getenv("HYBRID_PAGINAS", "10"))
+
+
+def profundidad_inicial(limit: int) -> int:
+    """Candidatos por fuente para una búsqueda paginada; se fija en la 1ª página y viaja en el cursor."""
+    return min(max(limit * HYBRID_PAGINAS, HYBRID_CANDIDATOS), HYBRID_MAX_PROFUNDIDAD)
 
 class AISearchService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, embeddings: EmbeddingEngine = None):
         self.db = db
+        self.embeddings = embeddings or obtener_motor()
 
-    def _generar_embedding_simulado(self, texto: str) -> List[float]:
+    def buscar_productos_inteligentes(self, query: str, limit: int = 10):
         """
-        Debe usar LA MISMA lógica que el seeder para que coincidan.
+        Estrategia Híbrida en UNA sentencia SQL:
+        CTE vectorial (pgvector o ids del índice en memoria) + CTE full-text
+        (tsvector español, índice GIN), fusionados con Reciprocal Rank Fusion.
+        Devuelve `ProductoCard` (columnas de tarjeta, sin vector).
         """
-        seed = int(hashlib.sha256(texto.encode('utf-8')).hexdigest(), 16) % 10**8
-        random.seed(seed)
-        return [random.uniform(-0.1, 0.1) for _ in range(1536)]
+        if not query:
+            return self.listar_disponibles(limit)
+        return [card for card, _ in self.buscar_hibrido(query, limit)]
 
-    def buscar_productos_inteligentes(self, query: str, limit: int = 10):
+    def listar_disponibles(self, limit: int, despues: Optional[Tuple[str, str]] = None):
+        """Catálogo con stock ordenado por (nombre, id). `despues` = clave keyset del último servido."""
+        stmt = ProductoCard.select().where(ProductoModel.stock > 0)
+        if despues is not None:
+            stmt = stmt.where(tuple_(ProductoModel.nombre, ProductoModel.id) > tuple_(*despues))
+        stmt = stmt.order_by(ProductoModel.nombre, ProductoModel.id).limit(limit)
+        return ProductoCard.desde_filas(self.db.execute(stmt))
+
+    def buscar_hibrido(
+        self,
+        query: str,
+        limit: int,
+        despues: Optional[Tuple[float, str]] = None,
+        profundidad: Optional[int] = None,
+    ) -> List[Tuple[ProductoCard, float]]:
         """
-        Estrategia Híbrida: SQL + Vectorial
+        [(card, score)] ordenado por (score DESC, id). Para paginar se pasa el
+        (score, id) del último elemento servido y la MISMA `profundidad` en
+        todas las páginas: si creciera, un producto podría ganar score vectorial
+        en una página posterior y saltarse o repetirse. Al agotar los
+        candidatos la búsqueda termina.
         """
-        if not query:
-            return self.db.query(ProductoModel).filter(ProductoModel.stock > 0).limit(limit).all()
-
-        vector_query = self._generar_embedding_simulado(query)
-        stmt_vector = select(ProductoModel).order_by(
-            ProductoModel.embedding_vector.l2_distance(vector_query)
-        ).limit(limit)
-        resultados_vector = self.db.execute(stmt_vector).scalars().all()
-
-        stmt_sql = select(ProductoModel).filter(
-            or_(
-                ProductoModel.nombre.ilike(f"%{query}%"),
-                ProductoModel.descripcion.ilike(f"%{query}%")
-            )
-        ).limit(limit)
-        resultados_sql = self.db.execute(stmt_sql).scalars().all()
-
-        finales = list(resultados_sql)
-        ids_existentes = {p.id for p in finales}
-        
-        for p in resultados_vector:
-            if p.id not in ids_existentes:
-                finales.append(p)
-        
-        return finales[:limit]
+        candidatos = min(max(profundidad or limit, HYBRID_CANDIDATOS), HYBRID_MAX_PROFUNDIDAD)
+        vector_query = self.embeddings.embed(query)
+        if indice_disponible():
+            vec = self._cte_vectorial_local(vector_query, candidatos)
+        else:
+            # ef_search >= candidatos: si no, HNSW corta el LIMIT en silencio
+            configurar_busqueda_vectorial(self.db, "catalogo", candidatos=candidatos)
+            vec = self._cte_vectorial_pgvector(vector_query, candidatos)
+        txt = self._cte_texto(query, candidatos)
+
+        score = (
+            func.coalesce(literal(HYBRID_PESO_VECTOR, Float) / (HYBRID_RRF_K + vec.c.rk), 0.0)
+            + func.coalesce(literal(HYBRID_PESO_TEXTO, Float) / (HYBRID_RRF_K + txt.c.rk), 0.0)
+        )
+        fusion = (
+            select(func.coalesce(vec.c.id, txt.c.id).label("id"), cast(score, Float).label("score"))
+            .select_from(vec.join(txt, vec.c.id == txt.c.id, full=True))
+            .cte("fusion")
+        )
+        stmt = (
+            ProductoCard.select()
+            .add_columns(fusion.c.score)
+            .join(fusion, fusion.c.id == ProductoModel.id)
+        )
+        if despues is not None:
+            score_previo, id_previo = despues
+            stmt = stmt.where(or_(
+                fusion.c.score < score_previo,
+                and_(fusion.c.score == score_previo, ProductoModel.id > id_previo),
+            ))
+        stmt = stmt.order_by(fusion.c.score.desc(), ProductoModel.id).limit(limit)
+        return [(ProductoCard(*fila[:-1]), float(fila[-1])) for fila in self.db.execute(stmt)]
+
+    def _cte_vectorial_pgvector(self, vector_query, candidatos: int):
+        # El LIMIT va en la subconsulta para que el ORDER BY <-> use el índice ANN
+        distancia = ProductoModel.embedding_vector.l2_distance(vector_query).label("distancia")
+        cercanos = (
+            select(ProductoModel.id, distancia)
+            .order_by(distancia)
+            .limit(candidatos)
+            .subquery()
+        )
+        return select(
+            cercanos.c.id,
+            func.row_number().over(order_by=cercanos.c.distancia).label("rk"),
+        ).cte("vec")
+
+    def _cte_vectorial_local(self, vector_query, candidatos: int):
+        """Top-k del índice en memoria enviado como `unnest(uuid[]) WITH ORDINALITY`."""
+        ids = [producto_id for producto_id, _ in indice_catalogo.buscar(vector_query, candidatos)]
+        arreglo = cast(bindparam("ids_vectoriales", ids, type_=ARRAY(PG_UUID(as_uuid=True))), ARRAY(PG_UUID(as_uuid=True)))
+        filas = func.unnest(arreglo).table_valued("id", with_ordinality="rk")
+        return select(filas.c.id, filas.c.rk).cte("vec")
+
+    def _cte_texto(self, query: str, candidatos: int):
+        consulta_ts = func.websearch_to_tsquery(literal_column("'spanish'"), query)
+        relevancia = func.ts_rank_cd(ProductoModel.busqueda_tsv, consulta_ts).label("relevancia")
+        coincidencias = (
+            select(ProductoModel.id, relevancia)
+            .where(ProductoModel.busqueda_tsv.op("@@")(consulta_ts))
+            .order_by(relevancia.desc(), ProductoModel.id)
+            .limit(candidatos)
+            .subquery()
+        )
+        return select(
+            coincidencias.c.id,
+            func.row_number().over(
+                order_by=(coincidencias.c.relevancia.desc(), coincidencias.c.id)
+            ).label("rk"),
+        ).cte("txt")
 
 class DynamicPricingService:
     @staticmethod
-    def calcular_precio_final(producto: ProductoModel) -> float:
+    def calcular_precio_final(producto) -> float:
+        """Acepta cualquier objeto con `precio_base` y `stock` (ORM o modelo de lectura)."""
         precio_base = float(producto.precio_base)
         
         if producto.stock < 10:
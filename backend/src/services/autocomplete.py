@@ -0,0 +1,329 @@
+"""
+Autocompletado del Market sobre un arreglo ordenado de claves (bisect).
+
+Claves: nombre completo, cada sufijo que empieza en una palabra del nombre
+("casco de seguridad" -> "seguridad"), SKU y categoría ("Categoría: X." al
+inicio de la descripción), todas sin tildes y en minúsculas. Un prefijo es el
+rango [bisect_left(p), bisect_left(p + '\\uffff')) del arreglo.
+
+Peso = unidades vendidas (detalle_ventas). Para que ninguna consulta recorra
+rangos grandes, el top-k de cada prefijo cuyo rango supera
+AUTOCOMPLETE_RANGO_MAX se precalcula al construir; el resto se ordena al
+vuelo (como mucho AUTOCOMPLETE_RANGO_MAX entradas).
+
+El índice es un snapshot inmutable: las altas construyen uno nuevo
+(copy-on-write) y se publica con una sola asignación, sin bloquear lecturas.
+La popularidad se recalcula por completo cada AUTOCOMPLETE_REFRESCO_S.
+"""
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from src.core import metrics
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import DetalleVentaModel, ProductoModel
+from src.services import catalog_events
+from src.services.product_name_index import sin_tildes
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_K = int(os.getenv("AUTOCOMPLETE_K", "10"))
+AUTOCOMPLETE_RANGO_MAX = int(os.getenv("AUTOCOMPLETE_RANGO_MAX", "256"))
+AUTOCOMPLETE_REFRESCO_S = float(os.getenv("AUTOCOMPLETE_REFRESCO_S", "600"))
+
+_FIN = "\uffff"
+_CATEGORIA = re.compile(r"^\s*Categor[ií]a:\s*([^.]+)\.")
+
+
+class Sugerencia(NamedTuple):
+    texto: str
+    tipo: str                  # 'producto' | 'categoria'
+    producto_id: Optional[str]
+    sku: Optional[str]
+    peso: float
+
+
+def normalizar(texto: Optional[str]) -> str:
+    return " ".join(sin_tildes(texto or "").split())
+
+
+def categoria_de(descripcion: Optional[str]) -> Optional[str]:
+    coincidencia = _CATEGORIA.match(descripcion or "")
+    return coincidencia.group(1).strip() if coincidencia else None
+
+
+def _claves_producto(producto_id: str, nombre: Optional[str], sku: Optional[str], peso: float):
+    sugerencia = Sugerencia(nombre or sku or "", "producto", producto_id, sku, peso)
+    nombre_n = normalizar(nombre)
+    claves = set()
+    if nombre_n:
+        claves.add(nombre_n)
+        claves.update(nombre_n[m.start():] for m in re.finditer(r"(?<= )\S", nombre_n))
+    if sku:
+        claves.add(normalizar(sku))
+    return [(clave, sugerencia) for clave in claves]
+
+
+def _orden(s: Sugerencia):
+    return (s.peso, -len(s.texto))
+
+
+def _mejores(entradas: Iterable[Sugerencia], k: int) -> List[Sugerencia]:
+    """Top-k por peso sin repetir producto (varias claves llevan al mismo)."""
+    resultado, vistos = [], set()
+    for s in heapq.nlargest(k * 3, entradas, key=_orden):
+        marca = s.producto_id or s.texto
+        if marca in vistos:
+            continue
+        vistos.add(marca)
+        resultado.append(s)
+        if len(resultado) == k:
+            break
+    return resultado
+
+
+class _Snapshot(NamedTuple):
+    claves: List[str]
+    entradas: List[Sugerencia]
+    top: Dict[str, List[Sugerencia]]
+    por_producto: Dict[str, Tuple[List[str], float]]  # id -> (claves, peso)
+    creado: float
+
+
+def _rango(claves: List[str], prefijo: str, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+    hi = len(claves) if hi is None else hi
+    inicio = bisect_left(claves, prefijo, lo, hi)
+    return inicio, bisect_left(claves, prefijo + _FIN, inicio, hi)
+
+
+def _exactos(claves: List[str], clave: str) -> Tuple[int, int]:
+    return bisect_left(claves, clave), bisect_right(claves, clave)
+
+
+def _precalcular(claves: List[str], entradas: List[Sugerencia], k: int, rango_max: int) -> Dict[str, List[Sugerencia]]:
+    """Top-k de todos los prefijos con más de `rango_max` entradas (recorrido en profundidad)."""
+    top = {}
+    pendientes = [("", 0, len(claves))]
+    while pendientes:
+        prefijo, lo, hi = pendientes.pop()
+        n = len(prefijo) + 1
+        pos = lo
+        while pos < hi:
+            if len(claves[pos]) < n:
+                pos += 1
+                continue
+            hijo = claves[pos][:n]
+            inicio, fin = _rango(claves, hijo, pos, hi)
+            if fin - inicio > rango_max:
+                top[hijo] = _mejores(entradas[inicio:fin], k)
+                pendientes.append((hijo, inicio, fin))
+            pos = fin
+    return top
+
+
+def construir_snapshot(filas: Iterable[Tuple], ventas: Dict[str, float],
+                       k: int = AUTOCOMPLETE_K, rango_max: int = AUTOCOMPLETE_RANGO_MAX) -> _Snapshot:
+    """`filas`: (id, nombre, sku, inicio de descripción). `ventas`: id -> unidades."""
+    pares = []
+    categorias: Dict[str, float] = defaultdict(float)
+    nombres_categoria: Dict[str, str] = {}
+    por_producto: Dict[str, Tuple[List[str], float]] = {}
+    for producto_id, nombre, sku, descripcion in filas:
+        producto_id = str(producto_id)
+        peso = float(ventas.get(producto_id, 0))
+        propias = _claves_producto(producto_id, nombre, sku, peso)
+        pares.extend(propias)
+        por_producto[producto_id] = ([clave for clave, _ in propias], peso)
+        categoria = categoria_de(descripcion)
+        if categoria:
+            clave = normalizar(categoria)
+            nombres_categoria.setdefault(clave, categoria)
+            # +1 por producto: a igualdad de ventas, gana la categoría más surtida
+            categorias[clave] += peso + 1
+
+    for clave, peso in categorias.items():
+        pares.append((clave, Sugerencia(nombres_categoria[clave], "categoria", None, None, peso)))
+
+    pares.sort(key=lambda p: p[0])
+    claves = [clave for clave, _ in pares]
+    entradas = [s for _, s in pares]
+    return _Snapshot(claves, entradas, _precalcular(claves, entradas, k, rango_max), por_producto, time.monotonic())
+
+
+class AutocompleteIndex:
+    def __init__(self, k: int = AUTOCOMPLETE_K, rango_max: int = AUTOCOMPLETE_RANGO_MAX):
+        self.k = k
+        self.rango_max = rango_max
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock_escritura = threading.Lock()
+        self._refrescando = False
+
+    @property
+    def cargado(self) -> bool:
+        return self._snapshot is not None
+
+    def publicar(self, snapshot: _Snapshot):
+        self._snapshot = snapshot
+
+    def sugerir(self, q: str, limite: int) -> List[Sugerencia]:
+        snapshot = self._snapshot
+        prefijo = normalizar(q)
+        if snapshot is None or not prefijo:
+            return []
+        precalculado = snapshot.top.get(prefijo)
+        if precalculado is not None:
+            return precalculado[:limite]
+        inicio, fin = _rango(snapshot.claves, prefijo)
+        return _mejores(snapshot.entradas[inicio:fin], limite)
+
+    # --- Construcción y actualización ----------------------------------------
+
+    def cargar(self, db) -> int:
+        inicio = time.perf_counter()
+        ventas = {
+            str(producto_id): float(unidades or 0)
+            for producto_id, unidades in db.execute(
+                select(DetalleVentaModel.producto_id, func.sum(DetalleVentaModel.cantidad))
+                .group_by(DetalleVentaModel.producto_id)
+            )
+        }
+        filas = db.execute(
+            select(ProductoModel.id, ProductoModel.nombre, ProductoModel.sku,
+                   func.left(ProductoModel.descripcion, 80))
+            .execution_options(yield_per=5000)
+        )
+        with self._lock_escritura:
+            snapshot = construir_snapshot(filas, ventas, self.k, self.rango_max)
+            self.publicar(snapshot)
+        logger.info("Índice de autocompletado cargado", extra={
+            "claves": len(snapshot.claves), "prefijos": len(snapshot.top),
+            "segundos": round(time.perf_counter() - inicio, 2)})
+        return len(snapshot.claves)
+
+    def actualizar_productos(self, filas: Iterable[Tuple], eliminados: Iterable[str] = ()):
+        """Alta/cambio de productos sin reconstruir: copia del snapshot + recálculo de sus prefijos."""
+        with self._lock_escritura:
+            actual = self._snapshot
+            if actual is None:
+                return
+            claves, entradas = list(actual.claves), list(actual.entradas)
+            por_producto = dict(actual.por_producto)
+            afectadas = set()
+
+            def quitar(producto_id: str) -> float:
+                propias, peso = por_producto.pop(producto_id, ([], 0.0))
+                for clave in propias:
+                    inicio, fin = _exactos(claves, clave)
+                    for i in range(fin - 1, inicio - 1, -1):
+                        if entradas[i].producto_id == producto_id:
+                            del claves[i]
+                            del entradas[i]
+                    afectadas.add(clave)
+                return peso
+
+            for producto_id in eliminados:
+                quitar(str(producto_id))
+
+            for producto_id, nombre, sku, descripcion in filas:
+                producto_id = str(producto_id)
+                peso = quitar(producto_id)  # un producto renombrado conserva su popularidad
+                propias = _claves_producto(producto_id, nombre, sku, peso)
+                for clave, sugerencia in propias:
+                    posicion = bisect_left(claves, clave)
+                    claves.insert(posicion, clave)
+                    entradas.insert(posicion, sugerencia)
+                    afectadas.add(clave)
+                por_producto[producto_id] = ([clave for clave, _ in propias], peso)
+
+                categoria = categoria_de(descripcion)
+                if categoria:
+                    clave = normalizar(categoria)
+                    inicio, fin = _exactos(claves, clave)
+                    if not any(entradas[i].tipo == "categoria" for i in range(inicio, fin)):
+                        claves.insert(inicio, clave)
+                        entradas.insert(inicio, Sugerencia(categoria, "categoria", None, None, 1.0))
+                        afectadas.add(clave)
+
+            top = dict(actual.top)
+            for clave in afectadas:
+                for n in range(1, len(clave) + 1):
+                    prefijo = clave[:n]
+                    inicio, fin = _rango(claves, prefijo)
+                    if fin - inicio <= self.rango_max:
+                        top.pop(prefijo, None)
+                        break
+                    top[prefijo] = _mejores(entradas[inicio:fin], self.k)
+            self.publicar(_Snapshot(claves, entradas, top, por_producto, actual.creado))
+
+    def aplicar_cambios(self, cambio: catalog_events.CambioCatalogo):
+        """Listener de catalog_events: altas y cambios de nombre/SKU/descripción."""
+        if not self.cargado or not cambio.contenido:
+            return
+        db = SessionLocal()
+        try:
+            if cambio.ids is None:
+                self.cargar(db)
+                return
+            filas = db.execute(
+                select(ProductoModel.id, ProductoModel.nombre, ProductoModel.sku,
+                       func.left(ProductoModel.descripcion, 80))
+                .where(ProductoModel.id.in_(list(cambio.ids)))
+            ).all()
+            encontrados = {str(fila[0]) for fila in filas}
+            self.actualizar_productos(filas, eliminados=set(cambio.ids) - encontrados)
+        finally:
+            db.close()
+
+    def refrescar_si_viejo(self):
+        """Recalcula la popularidad en segundo plano si el snapshot tiene más de AUTOCOMPLETE_REFRESCO_S."""
+        snapshot = self._snapshot
+        if snapshot is None or self._refrescando or time.monotonic() - snapshot.creado < AUTOCOMPLETE_REFRESCO_S:
+            return
+        self._refrescando = True
+
+        def refrescar():
+            db = SessionLocal()
+            try:
+                self.cargar(db)
+            except Exception as e:
+                logger.warning("Refresco fallido: %s", e)
+            finally:
+                db.close()
+                self._refrescando = False
+
+        threading.Thread(target=refrescar, name="autocomplete-refresco", daemon=True).start()
+
+
+indice_autocompletado = AutocompleteIndex()
+
+
+def iniciar_autocompletado():
+    """Carga el índice al arrancar la API y lo suscribe a los cambios del catálogo."""
+    version = catalog_events.version_remota()
+    db = SessionLocal()
+    try:
+        indice_autocompletado.cargar(db)
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice: %s", e)
+        return
+    finally:
+        db.close()
+    catalog_events.marcar_sincronizado(version)
+    catalog_events.registrar_listener(indice_autocompletado.aplicar_cambios)
+
+
+def sugerir(q: str, limite: int) -> List[Sugerencia]:
+    inicio = time.perf_counter()
+    # Los cambios de otros workers los aplica el hilo de catalog_events, no cada tecla
+    indice_autocompletado.refrescar_si_viejo()
+    resultado = indice_autocompletado.sugerir(q, limite)
+    metrics.observar("autocomplete.latencia_us", (time.perf_counter() - inicio) * 1e6)
+    return resultado
@@ -0,0 +1,206 @@
+"""
+Caché de resultados del catálogo (/market/productos).
+
+Dos niveles: LRU en proceso y, opcionalmente (CATALOG_CACHE_REDIS=1), Redis
+compartido entre workers. Clave: consulta normalizada + limit. Valor: la lista
+de ProductoCardSchema ya serializada a JSON.
+
+Invalidación por eventos de `catalog_events`:
+- cambio de stock/precio: sólo las entradas que contienen esos productos, más
+  los listados sin consulta (el filtro stock > 0 puede cambiar su contenido);
+- alta de producto o cambio de texto/vector: todo (cualquier búsqueda puede cambiar).
+
+Los cambios hechos en otro worker llegan por el hilo de catalog_events: el LRU
+local puede servir un resultado viejo durante como mucho CATALOG_SYNC_INTERVAL_S.
+
+En Redis cada invalidación incrementa `:gen`. `epoca()` lo lee antes de
+calcular el resultado y `guardar` escribe con un script Lua que compara: si
+hubo una invalidación mientras se calculaba, el resultado (quizá viejo) no se
+guarda. Las etiquetas por producto y el set de listados expiran con las
+entradas; la invalidación total borra por SCAN del prefijo de entradas.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from src.core import metrics
+from src.infrastructure.adapters.redis_client import obtener_redis
+from src.services import catalog_events
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1024"))
+CATALOG_CACHE_TTL_S = float(os.getenv("CATALOG_CACHE_TTL_S", "60"))
+CATALOG_CACHE_REDIS = os.getenv("CATALOG_CACHE_REDIS", "0").lower() in ("1", "true", "si")
+CATALOG_CACHE_REDIS_TTL_S = int(os.getenv("CATALOG_CACHE_REDIS_TTL_S", "300"))
+
+PREFIJO_REDIS = "nexus:catalogo:cache"
+CLAVE_GEN = f"{PREFIJO_REDIS}:gen"
+CLAVE_LISTADOS = f"{PREFIJO_REDIS}:listados"
+
+# KEYS: gen, entrada, listados ('' si no es listado), etiquetas... ARGV: gen leída, payload, ttl
+_LUA_GUARDAR = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+local ttl = tonumber(ARGV[3])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ttl)
+if KEYS[3] ~= '' then
+    redis.call('SADD', KEYS[3], KEYS[2])
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+for i = 4, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[2])
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+return 1
+"""
+
+
+def normalizar_consulta(q: Optional[str]) -> str:
+    if not q:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", q).lower().split())
+
+
+class _Entrada:
+    __slots__ = ("expira", "payload", "ids", "es_listado")
+
+    def __init__(self, expira: float, payload: str, ids: frozenset, es_listado: bool):
+        self.expira = expira
+        self.payload = payload
+        self.ids = ids
+        self.es_listado = es_listado
+
+
+class CatalogResultCache:
+    def __init__(self, capacidad: int = CATALOG_CACHE_SIZE, ttl_s: float = CATALOG_CACHE_TTL_S,
+                 usar_redis: bool = CATALOG_CACHE_REDIS):
+        self.capacidad = capacidad
+        self.ttl_s = ttl_s
+        self.usar_redis = usar_redis
+        self._lock = threading.Lock()
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()
+        # Se incrementa en cada invalidación: evita guardar resultados calculados
+        # antes de un cambio que terminó mientras se calculaban.
+        self._epoca = 0
+
+    @staticmethod
+    def clave(q: Optional[str], limit: int, extra: str = "") -> str:
+        return f"{normalizar_consulta(q)}|{limit}|{extra}"
+
+    @staticmethod
+    def _clave_redis(clave: str) -> str:
+        return f"{PREFIJO_REDIS}:e:{hashlib.sha1(clave.encode('utf-8')).hexdigest()}"
+
+    def epoca(self) -> Tuple[int, Optional[str]]:
+        """(época local, generación en Redis). Leer ANTES de calcular el resultado a guardar."""
+        generacion = None
+        if self.usar_redis:
+            try:
+                generacion = obtener_redis().get(CLAVE_GEN) or "0"
+            except Exception as e:
+                logger.warning("Redis no disponible: %s", e)
+        return self._epoca, generacion
+
+    def obtener(self, clave: str) -> Optional[str]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada.expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    metrics.incrementar("catalog_cache.hit_local")
+                    return entrada.payload
+                del self._entradas[clave]
+
+        if self.usar_redis:
+            try:
+                payload = obtener_redis().get(self._clave_redis(clave))
+            except Exception as e:
+                logger.warning("Redis no disponible: %s", e)
+                payload = None
+            if payload is not None:
+                metrics.incrementar("catalog_cache.hit_redis")
+                return payload
+
+        metrics.incrementar("catalog_cache.miss")
+        return None
+
+    def guardar(self, clave: str, payload: str, ids: Iterable, es_listado: bool, epoca: Tuple[int, Optional[str]]):
+        ids = frozenset(str(i) for i in ids)
+        epoca_local, generacion = epoca
+        with self._lock:
+            if epoca_local != self._epoca:
+                metrics.incrementar("catalog_cache.descartado_por_cambio")
+                return
+            self._entradas[clave] = _Entrada(time.monotonic() + self.ttl_s, payload, ids, es_listado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                metrics.incrementar("catalog_cache.desalojo")
+            metrics.fijar("catalog_cache.entradas_local", len(self._entradas))
+
+        if self.usar_redis and generacion is not None:
+            claves = [CLAVE_GEN, self._clave_redis(clave), CLAVE_LISTADOS if es_listado else ""]
+            claves.extend(f"{PREFIJO_REDIS}:tag:{producto_id}" for producto_id in ids)
+            try:
+                guardado = obtener_redis().eval(_LUA_GUARDAR, len(claves), *claves,
+                                                generacion, payload, CATALOG_CACHE_REDIS_TTL_S)
+                if not guardado:
+                    metrics.incrementar("catalog_cache.descartado_por_cambio_redis")
+            except Exception as e:
+                logger.warning("No se pudo guardar en Redis: %s", e)
+
+    def invalidar(self, cambio: catalog_events.CambioCatalogo):
+        """Listener de catalog_events."""
+        total = cambio.ids is None or cambio.contenido
+        with self._lock:
+            self._epoca += 1
+            if total:
+                eliminadas = len(self._entradas)
+                self._entradas.clear()
+            else:
+                claves = [
+                    c for c, e in self._entradas.items()
+                    if e.es_listado or not e.ids.isdisjoint(cambio.ids)
+                ]
+                for c in claves:
+                    del self._entradas[c]
+                eliminadas = len(claves)
+            metrics.incrementar("catalog_cache.invalidaciones", eliminadas)
+            metrics.fijar("catalog_cache.entradas_local", len(self._entradas))
+
+        # El nivel Redis lo invalida sólo el proceso que hizo el cambio
+        if self.usar_redis and not cambio.remoto:
+            self._invalidar_redis(None if total else cambio.ids)
+
+    def _invalidar_redis(self, ids):
+        try:
+            r = obtener_redis()
+            # Primero la generación: lo que se esté calculando ahora ya no se guardará
+            r.incr(CLAVE_GEN)
+            if ids is None:
+                lote = []
+                for clave in r.scan_iter(match=f"{PREFIJO_REDIS}:e:*", count=1000):
+                    lote.append(clave)
+                    if len(lote) >= 500:
+                        r.unlink(*lote)
+                        lote = []
+                # `:claves` es el set del esquema anterior (sin TTL)
+                r.unlink(*lote, CLAVE_LISTADOS, f"{PREFIJO_REDIS}:claves")
+                return
+            etiquetas = [f"{PREFIJO_REDIS}:tag:{i}" for i in ids]
+            claves = r.sunion(*etiquetas, CLAVE_LISTADOS)
+            r.unlink(*claves, *etiquetas, CLAVE_LISTADOS)
+        except Exception as e:
+            logger.warning("No se pudo invalidar Redis: %s", e)
+
+
+cache_catalogo = CatalogResultCache()
+catalog_events.registrar_listener(cache_catalogo.invalidar)
@@ -0,0 +1,194 @@
+"""
+Notificación de cambios del catálogo entre procesos.
+
+Cada escritura de productos llama a `notificar_cambio_productos(ids)` tras el
+commit: los listeners del proceso se ejecutan enseguida y, para los demás
+workers de uvicorn, se incrementa un contador de versión en Redis y se anotan
+los ids en un log acotado (ZSET id -> versión). `sincronizar()` compara la
+versión local con la de Redis y reenvía a los listeners sólo los ids cambiados.
+Si el log ya no cubre la versión local (recortado), se pide recarga completa
+(`cambio.ids is None`).
+
+En la API la sincronización la hace un hilo de fondo (`iniciar_sincronizador`)
+cada SYNC_INTERVAL_S. Los cambios locales también se le pasan a ese hilo (se
+despierta al momento): una recarga completa de un índice nunca corre dentro de
+la petición de admin o de ingesta que hizo el cambio. Las peticiones no sincronizan: lo que escribe otro worker se ve
+aquí con un retraso de como mucho SYNC_INTERVAL_S (más lo que tarde el listener).
+"""
+import logging
+import os
+import queue
+import threading
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
+from src.infrastructure.adapters.redis_client import obtener_redis
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION = "nexus:catalogo:version"
+CLAVE_CAMBIOS = "nexus:catalogo:cambios"
+CLAVE_RECORTE = "nexus:catalogo:recortado_hasta"
+MAX_CAMBIOS = int(os.getenv("CATALOG_CHANGELOG_MAX", "10000"))
+SYNC_INTERVAL_S = float(os.getenv("CATALOG_SYNC_INTERVAL_S", "1.0"))
+CATALOGO_COMPLETO = "*"
+CONTENIDO = "+"
+
+_LUA_NOTIFICAR = """
+local v = redis.call('INCR', KEYS[1])
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[2], v, ARGV[i])
+end
+local exceso = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[1])
+if exceso > 0 then
+    local viejos = redis.call('ZRANGE', KEYS[2], 0, exceso - 1, 'WITHSCORES')
+    redis.call('SET', KEYS[3], viejos[#viejos])
+    redis.call('ZREMRANGEBYRANK', KEYS[2], 0, exceso - 1)
+end
+return v
+"""
+
+
+class CambioCatalogo(NamedTuple):
+    ids: Optional[Set[str]]  # None = cambió todo el catálogo
+    contenido: bool          # cambió texto/vector o hubo altas: puede alterar cualquier búsqueda
+    remoto: bool             # llegó por sincronizar() desde otro proceso
+
+
+Listener = Callable[[CambioCatalogo], None]
+
+_listeners: List[Listener] = []
+_version_local = 0
+_lock_sync = threading.Lock()
+_hilo_sync: Optional[threading.Thread] = None
+_parar_sync = threading.Event()
+_despertar_sync = threading.Event()
+_cambios_locales: "queue.SimpleQueue[CambioCatalogo]" = queue.SimpleQueue()
+
+
+def registrar_listener(listener: Listener):
+    _listeners.append(listener)
+
+
+def _despachar(cambio: CambioCatalogo):
+    for listener in list(_listeners):
+        try:
+            listener(cambio)
+        except Exception:
+            logger.exception("Error en listener %s", getattr(listener, "__name__", listener))
+
+
+def version_remota() -> int:
+    try:
+        return int(obtener_redis().get(CLAVE_VERSION) or 0)
+    except Exception as e:
+        logger.warning("Redis no disponible para leer versión: %s", e)
+        return 0
+
+
+def marcar_sincronizado(version: int):
+    """Fija la versión local (p.ej. tras una carga completa hecha desde la BD)."""
+    global _version_local
+    _version_local = max(_version_local, version)
+
+
+def notificar_cambio_productos(ids: Optional[Iterable] = None, contenido: bool = True):
+    """
+    Llamar DESPUÉS del commit. `ids=None` significa "cambió todo el catálogo"
+    (cargas masivas, seeders). `contenido=False` para cambios que sólo tocan
+    stock o precio.
+    """
+    miembros = {CATALOGO_COMPLETO} if ids is None else {str(i) for i in ids}
+    if not miembros:
+        return
+
+    cambio = CambioCatalogo(None if CATALOGO_COMPLETO in miembros else set(miembros), contenido, False)
+    if _hilo_sync is not None:
+        # Los listeners pueden recargar un índice entero: que lo haga el hilo, no esta petición
+        _cambios_locales.put(cambio)
+        _despertar_sync.set()
+    else:
+        _despachar(cambio)
+    if contenido:
+        miembros.add(CONTENIDO)
+
+    try:
+        r = obtener_redis()
+        r.eval(_LUA_NOTIFICAR, 3, CLAVE_VERSION, CLAVE_CAMBIOS, CLAVE_RECORTE, MAX_CAMBIOS, *miembros)
+    except Exception as e:
+        logger.warning("No se pudo publicar el cambio en Redis: %s", e)
+
+
+def sincronizar():
+    """Aplica los cambios hechos por otros procesos (lo llama el hilo de `iniciar_sincronizador`)."""
+    global _version_local
+
+    if not _lock_sync.acquire(blocking=False):
+        return
+    try:
+        r = obtener_redis()
+        version, recortado = r.mget(CLAVE_VERSION, CLAVE_RECORTE)
+        version = int(version or 0)
+        if version <= _version_local:
+            return
+
+        if float(recortado or 0) > _version_local:
+            cambio = CambioCatalogo(None, True, True)
+        else:
+            miembros = set(r.zrangebyscore(CLAVE_CAMBIOS, f"({_version_local}", "+inf"))
+            contenido = CONTENIDO in miembros
+            miembros.discard(CONTENIDO)
+            cambio = CambioCatalogo(None if CATALOGO_COMPLETO in miembros else miembros, contenido, True)
+
+        _version_local = version
+        if cambio.ids is None or cambio.ids:
+            _despachar(cambio)
+    except Exception as e:
+        logger.warning("Sincronización con Redis fallida: %s", e)
+    finally:
+        _lock_sync.release()
+
+
+def _aplicar_locales():
+    """Despacha los cambios locales encolados, fusionados en uno (una sola recarga si hay varias)."""
+    cambios = []
+    while True:
+        try:
+            cambios.append(_cambios_locales.get_nowait())
+        except queue.Empty:
+            break
+    if not cambios:
+        return
+    todo = any(c.ids is None for c in cambios)
+    _despachar(CambioCatalogo(
+        None if todo else set().union(*(c.ids for c in cambios)),
+        any(c.contenido for c in cambios),
+        False,
+    ))
+
+
+def _bucle_sincronizador():
+    while not _parar_sync.is_set():
+        _despertar_sync.wait(SYNC_INTERVAL_S)
+        _despertar_sync.clear()
+        _aplicar_locales()
+        sincronizar()
+
+
+def iniciar_sincronizador():
+    """Arranca el hilo que aplica los cambios de otros procesos (idempotente)."""
+    global _hilo_sync
+    if _hilo_sync is not None:
+        return
+    _parar_sync.clear()
+    _hilo_sync = threading.Thread(target=_bucle_sincronizador, name="catalogo-sync", daemon=True)
+    _hilo_sync.start()
+
+
+def detener_sincronizador():
+    global _hilo_sync
+    if _hilo_sync is None:
+        return
+    _parar_sync.set()
+    _despertar_sync.set()
+    _hilo_sync.join(timeout=SYNC_INTERVAL_S + 5)
+    _hilo_sync = None
@@ -0,0 +1,209 @@
+"""
+Índice vectorial en memoria del catálogo (opcional, CATALOG_INDEX_ENABLED=1).
+
+Matriz NumPy float32 (n x 1536) con normas precalculadas. La búsqueda es exacta
+por L2 (mismo orden que `<->` de pgvector) usando productos punto por bloques:
+    ||q - x||² = ||q||² - 2·q·x + ||x||²
+Se carga al arrancar desde productos.embedding_vector y se actualiza fila a fila
+con los eventos de `catalog_events`.
+
+Las bajas dejan una lápida (norma infinita, id None) en vez de mover filas:
+las búsquedas trabajan sin lock sobre una instantánea de (matriz, ids), y
+mover la última fila a un hueco haría que una búsqueda en curso devolviera el
+id equivocado. Cuando las lápidas pasan de CATALOG_INDEX_MAX_LAPIDAS (fracción)
+se compacta copiando a matrices nuevas.
+"""
+import logging
+import os
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import ProductoModel
+from src.services import catalog_events
+from src.services.embedding_providers import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+CATALOG_INDEX_ENABLED = os.getenv("CATALOG_INDEX_ENABLED", "0").lower() in ("1", "true", "si")
+CATALOG_INDEX_BLOQUE = int(os.getenv("CATALOG_INDEX_BLOQUE", "16384"))
+CATALOG_INDEX_MAX_LAPIDAS = float(os.getenv("CATALOG_INDEX_MAX_LAPIDAS", "0.2"))
+
+
+class CatalogVectorIndex:
+    def __init__(self, dim: int = EMBEDDING_DIM, bloque: int = CATALOG_INDEX_BLOQUE):
+        self.dim = dim
+        self.bloque = bloque
+        self.cargado = False
+        self._lock = threading.Lock()
+        self._matriz = np.empty((0, dim), dtype=np.float32)
+        self._normas = np.empty(0, dtype=np.float32)
+        self._ids: List = []
+        self._pos = {}
+        self._n = 0
+        self._lapidas = 0
+
+    def __len__(self):
+        return self._n - self._lapidas
+
+    def _asegurar_capacidad(self, n: int):
+        if n <= self._matriz.shape[0]:
+            return
+        capacidad = max(n, int(self._matriz.shape[0] * 1.5) + 1024)
+        matriz = np.empty((capacidad, self.dim), dtype=np.float32)
+        normas = np.empty(capacidad, dtype=np.float32)
+        matriz[:self._n] = self._matriz[:self._n]
+        normas[:self._n] = self._normas[:self._n]
+        # Las búsquedas en curso conservan su referencia a la matriz anterior
+        self._matriz, self._normas = matriz, normas
+
+    def cargar(self, db) -> int:
+        """Carga completa desde la BD (streaming por lotes, sin materializar ORM)."""
+        inicio = time.perf_counter()
+        stmt = (
+            select(ProductoModel.id, ProductoModel.embedding_vector)
+            .where(ProductoModel.embedding_vector.is_not(None))
+            .execution_options(yield_per=2000)
+        )
+        total = db.query(ProductoModel.id).filter(ProductoModel.embedding_vector.is_not(None)).count()
+        matriz = np.empty((total, self.dim), dtype=np.float32)
+        ids = []
+        for fila, (producto_id, vector) in enumerate(db.execute(stmt)):
+            if fila >= total:
+                break
+            matriz[fila] = vector
+            ids.append(producto_id)
+
+        n = len(ids)
+        normas = np.einsum("ij,ij->i", matriz[:n], matriz[:n])
+        with self._lock:
+            self._matriz, self._normas = matriz, normas.astype(np.float32)
+            self._ids = ids
+            self._pos = {str(i): fila for fila, i in enumerate(ids)}
+            self._n = n
+            self._lapidas = 0
+            self.cargado = True
+        logger.info("Índice vectorial cargado", extra={"vectores": n, "segundos": round(time.perf_counter() - inicio, 2)})
+        return n
+
+    def upsert(self, producto_id, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            clave = str(producto_id)
+            fila = self._pos.get(clave)
+            if fila is None:
+                self._asegurar_capacidad(self._n + 1)
+                fila = self._n
+                self._ids.append(producto_id)
+                self._pos[clave] = fila
+            self._matriz[fila] = vector
+            self._normas[fila] = float(vector @ vector)
+            if fila == self._n:
+                self._n += 1
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            fila = self._pos.pop(str(producto_id), None)
+            if fila is None:
+                return
+            self._normas[fila] = np.inf
+            ids = list(self._ids)  # copia: las búsquedas en curso usan la lista anterior
+            ids[fila] = None
+            self._ids = ids
+            self._lapidas += 1
+            if self._lapidas > max(1024, self._n * CATALOG_INDEX_MAX_LAPIDAS):
+                self._compactar()
+
+    def _compactar(self):
+        """Copia las filas vivas a matrices nuevas (con el lock tomado)."""
+        vivas = np.fromiter((i for i in range(self._n) if self._ids[i] is not None), dtype=np.int64)
+        self._matriz = self._matriz[vivas]
+        self._normas = self._normas[vivas]
+        self._ids = [self._ids[i] for i in vivas]
+        self._pos = {str(i): fila for fila, i in enumerate(self._ids)}
+        self._n = len(self._ids)
+        self._lapidas = 0
+
+    def buscar(self, vector, k: int) -> List[Tuple[object, float]]:
+        """Top-k exacto por distancia L2: [(producto_id, distancia), ...]."""
+        with self._lock:
+            matriz, normas, ids, n = self._matriz, self._normas, self._ids, self._n
+        if n == 0 or k <= 0:
+            return []
+
+        q = np.asarray(vector, dtype=np.float32)
+        qq = float(q @ q)
+        k = min(k, n)
+        mejores_d = np.empty(0, dtype=np.float32)
+        mejores_i = np.empty(0, dtype=np.int64)
+
+        for inicio in range(0, n, self.bloque):
+            fin = min(inicio + self.bloque, n)
+            d = normas[inicio:fin] - 2.0 * (matriz[inicio:fin] @ q)
+            kb = min(k, fin - inicio)
+            top = np.argpartition(d, kb - 1)[:kb]
+            mejores_d = np.concatenate([mejores_d, d[top]])
+            mejores_i = np.concatenate([mejores_i, top + inicio])
+            if len(mejores_d) > k:
+                sel = np.argpartition(mejores_d, k - 1)[:k]
+                mejores_d, mejores_i = mejores_d[sel], mejores_i[sel]
+
+        orden = np.argsort(mejores_d, kind="stable")
+        return [
+            (ids[mejores_i[j]], float(np.sqrt(max(mejores_d[j] + qq, 0.0))))
+            for j in orden
+            if ids[mejores_i[j]] is not None and np.isfinite(mejores_d[j])
+        ]
+
+    def aplicar_cambios(self, cambio: catalog_events.CambioCatalogo):
+        """Listener de catalog_events: recarga sólo las filas cambiadas."""
+        if not self.cargado or not cambio.contenido:
+            return
+        ids = cambio.ids
+        db = SessionLocal()
+        try:
+            if ids is None:
+                self.cargar(db)
+                return
+            filas = db.execute(
+                select(ProductoModel.id, ProductoModel.embedding_vector)
+                .where(ProductoModel.id.in_(list(ids)))
+            ).all()
+            vistos = set()
+            for producto_id, vector in filas:
+                vistos.add(str(producto_id))
+                if vector is None:
+                    self.eliminar(producto_id)
+                else:
+                    self.upsert(producto_id, vector)
+            for faltante in set(ids) - vistos:
+                self.eliminar(faltante)
+        finally:
+            db.close()
+
+
+indice_catalogo = CatalogVectorIndex()
+
+
+def iniciar_indice_catalogo():
+    """Carga el índice al arrancar la API (si está habilitado) y lo suscribe a los cambios."""
+    if not CATALOG_INDEX_ENABLED:
+        return
+    version = catalog_events.version_remota()
+    db = SessionLocal()
+    try:
+        indice_catalogo.cargar(db)
+    finally:
+        db.close()
+    # Cambios ocurridos durante la carga se reaplican en la próxima sincronización
+    catalog_events.marcar_sincronizado(version)
+    catalog_events.registrar_listener(indice_catalogo.aplicar_cambios)
+
+
+def indice_disponible() -> bool:
+    # Los cambios de otros workers los aplica el hilo de catalog_events, no la búsqueda
+    return CATALOG_INDEX_ENABLED and indice_catalogo.cargado
@@ -0,0 +1,126 @@
+"""
+Caché semántica de respuestas del chat (/ai/chat).
+
+Guarda (vector de la pregunta -> respuesta). Una pregunta nueva es hit si su
+similitud coseno con alguna guardada de la misma ruta ('precio' | 'rag')
+supera CHAT_CACHE_UMBRAL. Los vectores viven normalizados en una matriz NumPy
+(capacidad fija, desalojo del más antiguo), así la búsqueda es un solo
+producto matriz-vector.
+
+Invalidación por eventos de `catalog_events`, con la misma política que la
+caché del catálogo: un cambio de stock/precio borra las respuestas que citan
+esos productos; un cambio de contenido (alta, texto, manual) borra todo.
+Lo que cambia otro worker llega por el hilo de catalog_events: una respuesta
+vieja puede servirse durante como mucho CATALOG_SYNC_INTERVAL_S.
+"""
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+
+from src.core import metrics
+from src.services import catalog_events
+from src.services.embedding_providers import EMBEDDING_DIM
+
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "1").lower() in ("1", "true", "si")
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "2048"))
+CHAT_CACHE_TTL_S = float(os.getenv("CHAT_CACHE_TTL_S", "600"))
+CHAT_CACHE_UMBRAL = float(os.getenv("CHAT_CACHE_UMBRAL", "0.95"))
+
+
+class _Entrada:
+    __slots__ = ("ruta", "respuesta", "ids", "expira", "costo_ms")
+
+    def __init__(self, ruta: str, respuesta: str, ids: frozenset, expira: float, costo_ms: float):
+        self.ruta = ruta
+        self.respuesta = respuesta
+        self.ids = ids
+        self.expira = expira
+        self.costo_ms = costo_ms
+
+
+class SemanticAnswerCache:
+    def __init__(self, capacidad: int = CHAT_CACHE_SIZE, ttl_s: float = CHAT_CACHE_TTL_S,
+                 umbral: float = CHAT_CACHE_UMBRAL, dim: int = EMBEDDING_DIM):
+        self.capacidad = capacidad
+        self.ttl_s = ttl_s
+        self.umbral = umbral
+        self._lock = threading.Lock()
+        self._vectores = np.zeros((capacidad, dim), dtype=np.float32)
+        # Filas vacías o invalidadas quedan en cero: similitud 0, nunca son hit
+        self._entradas = [None] * capacidad
+        self._siguiente = 0
+        self._epoca = 0
+        self._hits = 0
+        self._consultas = 0
+
+    @staticmethod
+    def _normalizar(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norma = float(np.linalg.norm(v))
+        return v / norma if norma else v
+
+    def epoca(self) -> int:
+        return self._epoca
+
+    def _registrar(self, hit: bool):
+        self._consultas += 1
+        self._hits += hit
+        metrics.incrementar("chat_cache.hit" if hit else "chat_cache.miss")
+        metrics.fijar("chat_cache.hit_ratio", self._hits / self._consultas)
+
+    def buscar(self, ruta: str, vector) -> Optional[str]:
+        q = self._normalizar(vector)
+        ahora = time.monotonic()
+        with self._lock:
+            similitudes = self._vectores @ q
+            for fila in np.argsort(similitudes)[::-1][:8]:
+                if similitudes[fila] < self.umbral:
+                    break
+                entrada = self._entradas[fila]
+                if entrada is None or entrada.ruta != ruta:
+                    continue
+                if entrada.expira <= ahora:
+                    self._vaciar_fila(fila)
+                    continue
+                self._registrar(True)
+                metrics.observar("chat_cache.latencia_ahorrada_ms", entrada.costo_ms)
+                return entrada.respuesta
+            self._registrar(False)
+        return None
+
+    def guardar(self, ruta: str, vector, respuesta: str, ids: Iterable, costo_ms: float, epoca: int):
+        entrada = _Entrada(ruta, respuesta, frozenset(str(i) for i in ids),
+                           time.monotonic() + self.ttl_s, costo_ms)
+        q = self._normalizar(vector)
+        with self._lock:
+            if epoca != self._epoca:
+                metrics.incrementar("chat_cache.descartado_por_cambio")
+                return
+            fila = self._siguiente
+            self._siguiente = (fila + 1) % self.capacidad
+            self._vectores[fila] = q
+            self._entradas[fila] = entrada
+
+    def _vaciar_fila(self, fila: int):
+        self._vectores[fila] = 0.0
+        self._entradas[fila] = None
+
+    def invalidar(self, cambio: catalog_events.CambioCatalogo):
+        """Listener de catalog_events."""
+        with self._lock:
+            self._epoca += 1
+            eliminadas = 0
+            for fila, entrada in enumerate(self._entradas):
+                if entrada is None:
+                    continue
+                if cambio.ids is None or cambio.contenido or not entrada.ids.isdisjoint(cambio.ids):
+                    self._vaciar_fila(fila)
+                    eliminadas += 1
+            metrics.incrementar("chat_cache.invalidaciones", eliminadas)
+
+
+cache_chat = SemanticAnswerCache()
+catalog_events.registrar_listener(cache_chat.invalidar)
@@ -0,0 +1,209 @@
+"""
+Checkout transaccional: precios del servidor y reserva atómica de stock.
+
+Todo en una transacción y con un número fijo de sentencias por carrito:
+
+1. SELECT ... WHERE id IN (...) ORDER BY id FOR UPDATE: bloquea las filas
+   siempre en el mismo orden (dos checkouts con los mismos SKUs no se
+   interbloquean) y trae precio_base y stock para DynamicPricingService.
+2. UPDATE productos SET stock = stock - c.cantidad FROM (VALUES ...) c
+   WHERE ... AND stock >= c.cantidad RETURNING id: si vuelven menos filas que
+   líneas, alguien se llevó el stock y se hace rollback.
+3. INSERT de la venta (con su serie y correlativo SUNAT, de una secuencia),
+   un solo INSERT multi-fila de los detalles y el mensaje de facturación en la
+   tabla outbox (lo publica el relay).
+
+El precio que manda el cliente se ignora. Tras el commit se avisa a
+catalog_events con `contenido=False` (sólo cambió stock / precio dinámico).
+
+Con Idempotency-Key la clave se reclama en la misma transacción (ver
+services/idempotency.py): un reintento recibe la venta original y no crea otra.
+"""
+import logging
+import os
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import Integer, column, insert, text, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.orm import Session
+
+from src.core import metrics
+from src.infrastructure.models import DetalleVentaModel, ProductoModel, VentaModel
+from src.infrastructure.read_models import ProductoResumen
+from src.services.ai_catalog import DynamicPricingService
+from src.services.catalog_events import notificar_cambio_productos
+from src.services.idempotency import ClaveReutilizada, guardar_respuesta, hash_peticion, reclamar
+from src.services.outbox import TIPO_FACTURA_SUNAT, registrar
+from src.services.sunat.ubl_generator import UBLGenerator
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_MAX_LINEAS = int(os.getenv("CHECKOUT_MAX_LINEAS", "200"))
+CHECKOUT_MAX_CANTIDAD = int(os.getenv("CHECKOUT_MAX_CANTIDAD", "1000"))
+# Tope de espera por los bloqueos de fila: mejor un 503 rápido que colgar el worker
+CHECKOUT_LOCK_TIMEOUT_MS = int(os.getenv("CHECKOUT_LOCK_TIMEOUT_MS", "3000"))
+
+ESTADO_INICIAL = "PENDIENTE_FACTURACION"
+AMBITO_IDEMPOTENCIA = "checkout"
+
+
+class CarritoInvalido(ValueError):
+    pass
+
+
+class ProductosNoEncontrados(Exception):
+    def __init__(self, ids: Iterable):
+        self.ids = sorted(str(i) for i in ids)
+        super().__init__(f"Productos no encontrados: {', '.join(self.ids)}")
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, faltantes: List[dict]):
+        self.faltantes = faltantes
+        nombres = ", ".join(f["nombre"] for f in faltantes)
+        super().__init__(f"Stock insuficiente para: {nombres}")
+
+
+class LineaVenta(NamedTuple):
+    producto_id: uuid.UUID
+    cantidad: int
+    precio_unitario: Decimal
+    subtotal: Decimal
+
+
+class ResultadoCheckout(NamedTuple):
+    venta_id: uuid.UUID
+    total: Decimal
+    lineas: List[LineaVenta]
+    # True si es la respuesta guardada de un checkout anterior con la misma Idempotency-Key
+    repetido: bool = False
+
+
+def consolidar_carrito(carrito: List[dict]) -> Dict[uuid.UUID, int]:
+    """{producto_id: cantidad} sumando líneas repetidas. Sólo se leen `id` y `cantidad`."""
+    if not carrito:
+        raise CarritoInvalido("Carrito vacío")
+    items: Dict[uuid.UUID, int] = {}
+    for item in carrito:
+        try:
+            producto_id = uuid.UUID(str(item["id"]))
+            cantidad = int(item["cantidad"])
+        except (KeyError, TypeError, ValueError):
+            raise CarritoInvalido("Cada línea necesita 'id' (UUID) y 'cantidad' (entero)")
+        if cantidad <= 0:
+            raise CarritoInvalido("Las cantidades deben ser positivas")
+        items[producto_id] = items.get(producto_id, 0) + cantidad
+
+    if len(items) > CHECKOUT_MAX_LINEAS:
+        raise CarritoInvalido(f"Máximo {CHECKOUT_MAX_LINEAS} productos distintos por compra")
+    if any(c > CHECKOUT_MAX_CANTIDAD for c in items.values()):
+        raise CarritoInvalido(f"Máximo {CHECKOUT_MAX_CANTIDAD} unidades por producto")
+    return items
+
+
+def _bloquear_y_cotizar(db: Session, items: Dict[uuid.UUID, int]) -> List[LineaVenta]:
+    stmt = (
+        ProductoResumen.select()
+        .where(ProductoModel.id.in_(list(items)))
+        .order_by(ProductoModel.id)
+        .with_for_update(of=ProductoModel)
+    )
+    productos = ProductoResumen.desde_filas(db.execute(stmt))
+
+    faltan = set(items) - {p.id for p in productos}
+    if faltan:
+        raise ProductosNoEncontrados(faltan)
+
+    sin_stock = [
+        {"id": str(p.id), "nombre": p.nombre, "pedido": items[p.id], "disponible": p.stock or 0}
+        for p in productos if (p.stock or 0) < items[p.id]
+    ]
+    if sin_stock:
+        raise StockInsuficiente(sin_stock)
+
+    lineas = []
+    for p in productos:
+        # Precio con el stock previo a esta compra (el que vio el cliente en el catálogo)
+        precio = Decimal(str(DynamicPricingService.calcular_precio_final(p)))
+        lineas.append(LineaVenta(p.id, items[p.id], precio, precio * items[p.id]))
+    return lineas
+
+
+def _reservar_stock(db: Session, lineas: List[LineaVenta]):
+    carrito = values(
+        column("id", PG_UUID(as_uuid=True)), column("cantidad", Integer), name="carrito"
+    ).data([(l.producto_id, l.cantidad) for l in lineas])
+    stmt = (
+        update(ProductoModel)
+        .where(ProductoModel.id == carrito.c.id, ProductoModel.stock >= carrito.c.cantidad)
+        .values(stock=ProductoModel.stock - carrito.c.cantidad)
+        .returning(ProductoModel.id)
+    )
+    reservados = {fila[0] for fila in db.execute(stmt)}
+    if len(reservados) != len(lineas):
+        # No debería pasar con las filas bloqueadas; la condición es la red de seguridad
+        raise StockInsuficiente([
+            {"id": str(l.producto_id), "nombre": str(l.producto_id), "pedido": l.cantidad, "disponible": None}
+            for l in lineas if l.producto_id not in reservados
+        ])
+
+
+def procesar_checkout(db: Session, cliente_id, items: Dict[uuid.UUID, int],
+                      clave_idempotencia: Optional[str] = None) -> ResultadoCheckout:
+    """
+    Crea la venta y descuenta el stock en una transacción. Lanza
+    ProductosNoEncontrados / StockInsuficiente / ClaveReutilizada (con rollback
+    hecho) si no se puede.
+    """
+    propietario = str(cliente_id)
+    try:
+        if clave_idempotencia:
+            huella = hash_peticion({str(pid): cantidad for pid, cantidad in items.items()})
+            anterior = reclamar(db, AMBITO_IDEMPOTENCIA, clave_idempotencia, huella, propietario)
+            if anterior is not None:
+                db.rollback()
+                return ResultadoCheckout(uuid.UUID(anterior.cuerpo["venta_id"]), Decimal(anterior.cuerpo["total"]),
+                                         [], repetido=True)
+
+        db.execute(text(f"SET LOCAL lock_timeout = '{CHECKOUT_LOCK_TIMEOUT_MS}ms'"))
+        lineas = _bloquear_y_cotizar(db, items)
+        _reservar_stock(db, lineas)
+
+        venta_id = uuid.uuid4()
+        total = sum((l.subtotal for l in lineas), Decimal("0"))
+        db.execute(insert(VentaModel).values(
+            id=venta_id, cliente_id=cliente_id, fecha=datetime.utcnow(), total=total, estado=ESTADO_INICIAL,
+            **UBLGenerator.numeracion(cliente_id),
+        ))
+        db.execute(insert(DetalleVentaModel), [
+            {
+                "id": uuid.uuid4(),
+                "venta_id": venta_id,
+                "producto_id": l.producto_id,
+                "cantidad": l.cantidad,
+                "precio_unitario": l.precio_unitario,
+                "subtotal": l.subtotal,
+            }
+            for l in lineas
+        ])
+        registrar(db, TIPO_FACTURA_SUNAT, {"venta_id": str(venta_id)})
+        if clave_idempotencia:
+            guardar_respuesta(db, AMBITO_IDEMPOTENCIA, clave_idempotencia,
+                              {"venta_id": str(venta_id), "total": str(total)}, propietario=propietario)
+        db.commit()
+    except (StockInsuficiente, ProductosNoEncontrados, ClaveReutilizada):
+        db.rollback()
+        metrics.incrementar("checkout.rechazados")
+        raise
+    except Exception:
+        db.rollback()
+        metrics.incrementar("checkout.fallidos")
+        raise
+
+    metrics.incrementar("checkout.ok")
+    notificar_cambio_productos(items, contenido=False)
+    logger.info("Checkout confirmado", extra={"venta_id": venta_id, "lineas": len(lineas), "total": total})
+    return ResultadoCheckout(venta_id, total, lineas)
@@ -0,0 +1,120 @@
+"""
+Dead letter de la facturación SUNAT (tabla `facturas_fallidas`).
+
+El worker guarda aquí las tareas que agotaron MAX_INTENTOS, las que SUNAT
+rechazó de forma permanente y los mensajes veneno que descarta la cola, con
+el último error y el historial de fallos.
+Nada se pierde: `reprocesar_lote` las devuelve a la cola (intentos a 0)
+cuando SUNAT vuelve; el ritmo lo controla quien lo llama
+(scripts/dlq.py --tasa).
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from src.core import metrics
+from src.infrastructure.adapters.queue_adapter import QueueAdapter, Tarea
+from src.infrastructure.models import FacturaFallidaModel
+
+logger = logging.getLogger(__name__)
+
+MOTIVO_MAX_INTENTOS = "max_intentos"
+MOTIVO_VENENO = "veneno"
+MOTIVO_RECHAZO = "rechazo_sunat"
+
+
+class Filtro(NamedTuple):
+    error: Optional[str] = None  # texto contenido en el último error (sin distinguir mayúsculas)
+    motivo: Optional[str] = None
+    desde: Optional[datetime] = None
+    hasta: Optional[datetime] = None
+    incluir_reprocesadas: bool = False
+    # Sólo filas con venta: las de id ilegible no se pueden devolver a la cola
+    solo_reprocesables: bool = False
+
+    def aplicar(self, consulta):
+        if not self.incluir_reprocesadas:
+            consulta = consulta.where(FacturaFallidaModel.reprocesado.is_(None))
+        if self.solo_reprocesables:
+            consulta = consulta.where(FacturaFallidaModel.venta_id.is_not(None))
+        if self.error:
+            consulta = consulta.where(FacturaFallidaModel.ultimo_error.ilike(f"%{self.error}%"))
+        if self.motivo:
+            consulta = consulta.where(FacturaFallidaModel.motivo == self.motivo)
+        if self.desde:
+            consulta = consulta.where(FacturaFallidaModel.creado >= self.desde)
+        if self.hasta:
+            consulta = consulta.where(FacturaFallidaModel.creado < self.hasta)
+        return consulta
+
+
+def registrar(db: Session, tarea: Tarea, error: str, motivo: str):
+    """Añade la tarea a la dead letter en la transacción en curso. No hace commit."""
+    try:
+        venta_id = uuid.UUID(str(tarea.venta_id))
+    except ValueError:
+        # Justo el caso veneno: se guarda igual, sin venta y con el id crudo en payload
+        venta_id = None
+    db.execute(insert(FacturaFallidaModel).values(
+        venta_id=venta_id,
+        motivo=motivo,
+        ultimo_error=error,
+        intentos=tarea.attempts,
+        historial=list(tarea.historial),
+        payload={"venta_id": None if tarea.venta_id is None else str(tarea.venta_id), "attempts": tarea.attempts, "mensaje_id": tarea.mensaje_id},
+        creado=datetime.utcnow(),
+    ))
+    metrics.incrementar("sunat.dlq.registradas")
+
+
+def listar(db: Session, filtro: Filtro, limite: int = 50) -> List[FacturaFallidaModel]:
+    consulta = filtro.aplicar(select(FacturaFallidaModel)).order_by(FacturaFallidaModel.id.desc()).limit(limite)
+    return list(db.scalars(consulta))
+
+
+def resumen(db: Session, filtro: Filtro) -> list:
+    """(motivo, último error, cantidad, más antigua, más reciente), de más a menos frecuente."""
+    consulta = filtro.aplicar(
+        select(
+            FacturaFallidaModel.motivo,
+            FacturaFallidaModel.ultimo_error,
+            func.count(),
+            func.min(FacturaFallidaModel.creado),
+            func.max(FacturaFallidaModel.creado),
+        )
+    ).group_by(FacturaFallidaModel.motivo, FacturaFallidaModel.ultimo_error).order_by(func.count().desc())
+    return db.execute(consulta).all()
+
+
+def reprocesar_lote(db: Session, cola: QueueAdapter, filtro: Filtro, limite: int) -> int:
+    """
+    Devuelve a la cola hasta `limite` facturas fallidas (las más antiguas
+    primero) y las marca como reprocesadas, en una transacción. SKIP LOCKED:
+    dos reprocesos en paralelo no encolan las mismas filas. Devuelve cuántas.
+    """
+    filtro = filtro._replace(solo_reprocesables=True)
+    filas = db.execute(
+        filtro.aplicar(select(FacturaFallidaModel.id, FacturaFallidaModel.venta_id))
+        .order_by(FacturaFallidaModel.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not filas:
+        db.rollback()
+        return 0
+
+    # Si el commit falla tras encolar, la venta se repite: el worker ignora las ya facturadas
+    cola.encolar_facturas(fila.venta_id for fila in filas)
+    db.execute(
+        update(FacturaFallidaModel)
+        .where(FacturaFallidaModel.id.in_([fila.id for fila in filas]))
+        .values(reprocesado=datetime.utcnow())
+    )
+    db.commit()
+    metrics.incrementar("sunat.dlq.reprocesadas", len(filas))
+    logger.info("Facturas fallidas devueltas a la cola", extra={"cantidad": len(filas)})
+    return len(filas)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import time
+from typing import List
+
+import numpy as np
+
+EMBEDDING_DIM = 1536
+
+
+def vector_simulado(texto: str) -> np.ndarray:
+    """
+    Reproduce el vector del antiguo `random.seed(seed); random.uniform(-0.1, 0.1)`.
+    `RandomState([seed])` usa el mismo MT19937 + init_by_array que el módulo
+    `random`, pero con un generador propio por llamada (sin estado global).
+    """
+    digest = hashlib.sha256(texto.encode("utf-8")).digest()
+    seed = int.from_bytes(digest, "big") % 10**8
+    generador = np.random.RandomState([seed])
+    return generador.uniform(-0.1, 0.1, EMBEDDING_DIM).astype(np.float32)
+
+
+class EmbeddingProvider:
+    """
+    Contrato de un proveedor de embeddings.
+    - modelo: forma parte de la clave de caché (cambiar de modelo no reutiliza vectores).
+    - costoso: si True, pasa por micro-batching y caché en disco.
+    """
+    modelo: str = "base"
+    costoso: bool = True
+
+    def embed_batch(self, textos: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SimulatedEmbeddingProvider(EmbeddingProvider):
+    """Vectores deterministas sin API (el comportamiento histórico del proyecto)."""
+    modelo = "simulado-sha256-v1"
+    costoso = False
+
+    def embed_batch(self, textos: List[str]) -> np.ndarray:
+        matriz = np.empty((len(textos), EMBEDDING_DIM), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            matriz[i] = vector_simulado(texto)
+        return matriz
+
+
+class FakeEmbeddingProvider(SimulatedEmbeddingProvider):
+    """
+    Proveedor local para benchmarks offline: mismos vectores que el simulado, pero
+    cada llamada cuesta `latencia_ms` + `latencia_por_texto_ms` por texto,
+    como una API remota.
+    """
+    modelo = "fake-latencia-v1"
+    costoso = True
+
+    def __init__(self, latencia_ms: float = 50.0, latencia_por_texto_ms: float = 0.2):
+        self.latencia_ms = latencia_ms
+        self.latencia_por_texto_ms = latencia_por_texto_ms
+        self.llamadas = 0
+
+    def embed_batch(self, textos: List[str]) -> np.ndarray:
+        self.llamadas += 1
+        time.sleep((self.latencia_ms + self.latencia_por_texto_ms * len(textos)) / 1000)
+        return super().embed_batch(textos)
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    costoso = True
+
+    def __init__(self, modelo: str = "text-embedding-3-small"):
+        from openai import OpenAI
+
+        self.modelo = modelo
+        self.client = OpenAI()
+
+    def embed_batch(self, textos: List[str]) -> np.ndarray:
+        respuesta = self.client.embeddings.create(
+            model=self.modelo,
+            input=textos,
+            dimensions=EMBEDDING_DIM,
+        )
+        datos = sorted(respuesta.data, key=lambda d: d.index)
+        return np.asarray([d.embedding for d in datos], dtype=np.float32)
+
+
+def crear_provider_desde_entorno() -> EmbeddingProvider:
+    """EMBEDDING_PROVIDER = simulado (default) | openai | fake"""
+    nombre = os.getenv("EMBEDDING_PROVIDER", "simulado").lower()
+
+    if nombre == "openai":
+        return OpenAIEmbeddingProvider(os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"))
+    if nombre == "fake":
+        return FakeEmbeddingProvider(
+            latencia_ms=float(os.getenv("FAKE_EMBEDDING_LATENCIA_MS", "50")),
+            latencia_por_texto_ms=float(os.getenv("FAKE_EMBEDDING_LATENCIA_TEXTO_MS", "0.2")),
+        )
+    return SimulatedEmbeddingProvider()
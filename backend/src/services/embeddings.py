@@ -0,0 +1,347 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.infrastructure.adapters.embedding_cache import EmbeddingDiskCache
+from src.services.embedding_providers import (
+    EMBEDDING_DIM,
+    EmbeddingProvider,
+    crear_provider_desde_entorno,
+)
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/var/cache/nexus/embeddings.sqlite3")
+EMBEDDING_BATCH_MAX = int(os.getenv("EMBEDDING_BATCH_MAX", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10"))
+EMBEDDING_BATCH_CONCURRENCIA = int(os.getenv("EMBEDDING_BATCH_CONCURRENCIA", "4"))
+EMBEDDING_MAX_TOKENS_TEXTO = int(os.getenv("EMBEDDING_MAX_TOKENS_TEXTO", "8191"))
+EMBEDDING_MAX_TOKENS_LOTE = int(os.getenv("EMBEDDING_MAX_TOKENS_LOTE", "300000"))
+
+
+class _LRUVectores:
+    """Caché LRU acotada (clave de contenido -> vector). Segura entre hilos."""
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self._datos: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave: bytes):
+        with self._lock:
+            vector = self._datos.get(clave)
+            if vector is not None:
+                self._datos.move_to_end(clave)
+            return vector
+
+    def put(self, clave: bytes, vector: np.ndarray):
+        if self.capacidad <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = vector
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+class PresupuestoTokens:
+    """
+    Cuenta y recorta tokens con tiktoken (cl100k_base).
+    Si el encoding no se puede descargar (entorno offline) se usa la
+    aproximación de ~4 caracteres por token.
+    """
+
+    def __init__(self, max_tokens_texto: int, max_tokens_lote: int):
+        self.max_tokens_texto = max_tokens_texto
+        self.max_tokens_lote = max_tokens_lote
+        self._encoding = None
+        self._cargado = False
+        self._lock = threading.Lock()
+
+    def _obtener_encoding(self):
+        if not self._cargado:
+            with self._lock:
+                if not self._cargado:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding("cl100k_base")
+                    except Exception as e:
+                        logger.warning("tiktoken no disponible (%s). Usando conteo aproximado.", e)
+                        self._encoding = None
+                    self._cargado = True
+        return self._encoding
+
+    def contar(self, texto: str) -> int:
+        encoding = self._obtener_encoding()
+        if encoding is None:
+            return (len(texto) + 3) // 4
+        return len(encoding.encode(texto, disallowed_special=()))
+
+    def recortar(self, texto: str) -> Tuple[str, int]:
+        """Devuelve (texto recortado al máximo por entrada, nº de tokens)."""
+        encoding = self._obtener_encoding()
+        if encoding is None:
+            recortado = texto[:self.max_tokens_texto * 4]
+            return recortado, (len(recortado) + 3) // 4
+
+        tokens = encoding.encode(texto, disallowed_special=())
+        if len(tokens) <= self.max_tokens_texto:
+            return texto, len(tokens)
+        tokens = tokens[:self.max_tokens_texto]
+        return encoding.decode(tokens), len(tokens)
+
+    def trocear(self, texto: str, max_tokens: int, solapamiento: int = 0) -> List[Tuple[str, int]]:
+        """Parte el texto en ventanas de `max_tokens` que se solapan `solapamiento` tokens."""
+        encoding = self._obtener_encoding()
+        if encoding is None:
+            return self._trocear_aproximado(texto, max_tokens, solapamiento)
+
+        tokens = encoding.encode(texto, disallowed_special=())
+        if not tokens:
+            return []
+        paso = max(1, max_tokens - solapamiento)
+        fragmentos = []
+        for inicio in range(0, max(len(tokens) - solapamiento, 1), paso):
+            ventana = tokens[inicio:inicio + max_tokens]
+            fragmentos.append((encoding.decode(ventana), len(ventana)))
+        return fragmentos
+
+    @staticmethod
+    def _trocear_aproximado(texto: str, max_tokens: int, solapamiento: int) -> List[Tuple[str, int]]:
+        # Ventanas de palabras completas, ~4 caracteres por token
+        palabras = texto.split()
+        costos = [(len(p) + 4) // 4 for p in palabras]
+        fragmentos = []
+        inicio = 0
+        while inicio < len(palabras):
+            fin, total = inicio, 0
+            while fin < len(palabras) and (fin == inicio or total + costos[fin] <= max_tokens):
+                total += costos[fin]
+                fin += 1
+            fragmentos.append((" ".join(palabras[inicio:fin]), total))
+            if fin >= len(palabras):
+                break
+            atras, solapado = fin, 0
+            while atras > inicio + 1 and solapado + costos[atras - 1] <= solapamiento:
+                atras -= 1
+                solapado += costos[atras]
+            inicio = atras
+        return fragmentos
+
+
+class _Pedido:
+    __slots__ = ("texto", "tokens", "future")
+
+    def __init__(self, texto: str, tokens: int):
+        self.texto = texto
+        self.tokens = tokens
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Agrupa llamadas concurrentes en micro-lotes: un lote sale al proveedor al
+    llegar a `max_batch` textos, al agotar `max_tokens_lote` o tras `max_espera_ms`
+    desde el primer pedido. Hasta `concurrencia` lotes viajan en paralelo.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        presupuesto: PresupuestoTokens,
+        max_batch: int = EMBEDDING_BATCH_MAX,
+        max_espera_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        concurrencia: int = EMBEDDING_BATCH_CONCURRENCIA,
+    ):
+        self.provider = provider
+        self.presupuesto = presupuesto
+        self.max_batch = max(1, max_batch)
+        self.max_espera = max_espera_ms / 1000
+        self._cola: "queue.Queue[_Pedido]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix="embed-batch")
+        self._hilo = threading.Thread(target=self._bucle, name="embed-batcher", daemon=True)
+        self._hilo.start()
+        self.lotes_enviados = 0
+        self.textos_enviados = 0
+
+    def enviar(self, textos: List[str]) -> List[Future]:
+        pedidos = []
+        for texto in textos:
+            recortado, tokens = self.presupuesto.recortar(texto)
+            pedido = _Pedido(recortado, tokens)
+            self._cola.put(pedido)
+            pedidos.append(pedido)
+        return [p.future for p in pedidos]
+
+    def _bucle(self):
+        pendiente: Optional[_Pedido] = None
+        while True:
+            primero = pendiente or self._cola.get()
+            pendiente = None
+            lote = [primero]
+            tokens = primero.tokens
+            limite = time.monotonic() + self.max_espera
+
+            while len(lote) < self.max_batch:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if tokens + pedido.tokens > self.presupuesto.max_tokens_lote:
+                    pendiente = pedido
+                    break
+                lote.append(pedido)
+                tokens += pedido.tokens
+
+            self.lotes_enviados += 1
+            self.textos_enviados += len(lote)
+            self._pool.submit(self._procesar, lote)
+
+    def _procesar(self, lote: List[_Pedido]):
+        # Textos repetidos dentro del mismo lote se envían una sola vez
+        unicos = list(dict.fromkeys(p.texto for p in lote))
+        try:
+            matriz = self.provider.embed_batch(unicos)
+        except Exception as e:
+            for p in lote:
+                p.future.set_exception(e)
+            return
+        por_texto = {texto: matriz[i] for i, texto in enumerate(unicos)}
+        for p in lote:
+            p.future.set_result(por_texto[p.texto])
+
+
+class EmbeddingEngine:
+    """
+    Punto único de embeddings para buscador, RAG y seeders.
+    Flujo: LRU en memoria -> caché en disco -> micro-batcher -> proveedor.
+    Los proveedores baratos (simulado) se calculan en línea, sin disco ni lotes.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        cache_disco: Optional[EmbeddingDiskCache] = None,
+        batcher: Optional[MicroBatcher] = None,
+        capacidad_lru: int = EMBEDDING_CACHE_SIZE,
+    ):
+        self.provider = provider
+        self.cache_disco = cache_disco
+        self.batcher = batcher
+        self._lru = _LRUVectores(capacidad_lru)
+        self._prefijo = provider.modelo.encode("utf-8") + b"\x00"
+
+    def _clave(self, texto: str) -> bytes:
+        return hashlib.sha256(self._prefijo + texto.encode("utf-8")).digest()
+
+    def embed(self, texto: str) -> np.ndarray:
+        """Vector float32 de solo lectura (compartido con la caché)."""
+        if not texto:
+            return np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        vector = self._lru.get(self._clave(texto))
+        if vector is None:
+            vector = self.embed_many([texto])[0]
+            vector.setflags(write=False)
+        return vector
+
+    def embed_many(self, textos: Iterable[str]) -> np.ndarray:
+        """Versión por lotes: devuelve una matriz (n, 1536) float32."""
+        textos = list(textos)
+        matriz = np.zeros((len(textos), EMBEDDING_DIM), dtype=np.float32)
+
+        faltantes: Dict[bytes, List[int]] = {}
+        textos_por_clave: Dict[bytes, str] = {}
+        for i, texto in enumerate(textos):
+            if not texto:
+                continue
+            clave = self._clave(texto)
+            vector = self._lru.get(clave)
+            if vector is not None:
+                matriz[i] = vector
+            else:
+                faltantes.setdefault(clave, []).append(i)
+                textos_por_clave[clave] = texto
+
+        if not faltantes:
+            return matriz
+
+        claves = list(faltantes)
+        if self.cache_disco is not None:
+            for clave, vector in self.cache_disco.get_many(claves).items():
+                self._guardar(clave, vector, faltantes.pop(clave), matriz)
+            claves = list(faltantes)
+            if not claves:
+                return matriz
+
+        nuevos = self._calcular([textos_por_clave[c] for c in claves])
+        for clave, vector in zip(claves, nuevos):
+            self._guardar(clave, vector, faltantes[clave], matriz)
+
+        if self.cache_disco is not None:
+            self.cache_disco.put_many(zip(claves, nuevos))
+        return matriz
+
+    def _calcular(self, textos: List[str]) -> List[np.ndarray]:
+        if self.batcher is None:
+            return list(self.provider.embed_batch(textos))
+        return [f.result() for f in self.batcher.enviar(textos)]
+
+    def _guardar(self, clave: bytes, vector: np.ndarray, posiciones: List[int], matriz: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        self._lru.put(clave, vector)
+        for i in posiciones:
+            matriz[i] = vector
+
+
+def crear_motor(provider: EmbeddingProvider, cache_path: Optional[str] = EMBEDDING_CACHE_PATH) -> EmbeddingEngine:
+    if not provider.costoso:
+        return EmbeddingEngine(provider)
+
+    cache_disco = None
+    if cache_path:
+        try:
+            cache_disco = EmbeddingDiskCache(cache_path, EMBEDDING_DIM)
+        except Exception as e:
+            logger.warning("Caché en disco deshabilitada (%s): %s", cache_path, e)
+
+    presupuesto = PresupuestoTokens(EMBEDDING_MAX_TOKENS_TEXTO, EMBEDDING_MAX_TOKENS_LOTE)
+    return EmbeddingEngine(provider, cache_disco, MicroBatcher(provider, presupuesto))
+
+
+_motor: Optional[EmbeddingEngine] = None
+_motor_lock = threading.Lock()
+
+
+def obtener_motor() -> EmbeddingEngine:
+    """Motor del proceso, configurado por EMBEDDING_PROVIDER."""
+    global _motor
+    if _motor is None:
+        with _motor_lock:
+            if _motor is None:
+                _motor = crear_motor(crear_provider_desde_entorno())
+    return _motor
+
+
+def embed(texto: str) -> np.ndarray:
+    return obtener_motor().embed(texto)
+
+
+def embed_many(textos: Iterable[str]) -> np.ndarray:
+    return obtener_motor().embed_many(textos)
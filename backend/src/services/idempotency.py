@@ -0,0 +1,120 @@
+"""
+Idempotency-Key sobre la tabla `idempotency_keys`.
+
+La clave se reclama DENTRO de la transacción de la operación:
+
+    INSERT ... ON CONFLICT DO NOTHING RETURNING
+
+- Si inserta, la operación es nuestra; su respuesta se guarda con
+  `guardar_respuesta` antes del commit, así que venta y clave se confirman (o
+  se deshacen) juntas.
+- Si la fila ya existe y está confirmada, se devuelve la respuesta guardada.
+- Un duplicado concurrente choca con la fila aún sin confirmar y Postgres lo
+  deja esperando en el INSERT hasta que la primera transacción termina: si
+  hace commit recibe su respuesta; si hace rollback, reclama la clave y
+  ejecuta él. Así los duplicados se coalescen sin sondear.
+
+La espera está acotada por IDEMPOTENCIA_ESPERA_MS (lock_timeout). Pasado
+IDEMPOTENCIA_TTL_S la clave caduca y se puede volver a usar; el outbox relay
+borra las caducadas con `purgar_expiradas`.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from src.core import metrics
+from src.infrastructure.models import IdempotencyKeyModel
+
+IDEMPOTENCIA_TTL_S = int(os.getenv("IDEMPOTENCIA_TTL_S", "86400"))
+IDEMPOTENCIA_ESPERA_MS = int(os.getenv("IDEMPOTENCIA_ESPERA_MS", "10000"))
+LARGO_MAX_CLAVE = 255
+
+
+class ClaveReutilizada(Exception):
+    """La misma Idempotency-Key llegó con otra petición."""
+
+
+class RespuestaGuardada(NamedTuple):
+    status_code: int
+    cuerpo: Any
+
+
+def hash_peticion(cuerpo: Any) -> str:
+    canonico = json.dumps(cuerpo, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+def reclamar(db: Session, ambito: str, clave: str, hash_cuerpo: str,
+             propietario: str = "") -> Optional[RespuestaGuardada]:
+    """
+    None si la clave es nuestra (ejecutar la operación y `guardar_respuesta`);
+    la respuesta original si es una repetición. Deja abierta la transacción.
+    """
+    ahora = datetime.utcnow()
+    expira = ahora + timedelta(seconds=IDEMPOTENCIA_TTL_S)
+    db.execute(text(f"SET LOCAL lock_timeout = '{IDEMPOTENCIA_ESPERA_MS}ms'"))
+
+    pk = (IdempotencyKeyModel.ambito == ambito, IdempotencyKeyModel.propietario == propietario,
+          IdempotencyKeyModel.clave == clave)
+    reclamada = db.execute(
+        insert(IdempotencyKeyModel)
+        .values(ambito=ambito, propietario=propietario, clave=clave, hash_peticion=hash_cuerpo,
+                creado=ahora, expira=expira)
+        .on_conflict_do_nothing()
+        .returning(IdempotencyKeyModel.clave)
+    ).first()
+    if reclamada is not None:
+        metrics.incrementar(f"idempotencia.{ambito}.nuevas")
+        return None
+
+    fila = db.execute(
+        select(IdempotencyKeyModel.hash_peticion, IdempotencyKeyModel.status_code,
+               IdempotencyKeyModel.respuesta, IdempotencyKeyModel.expira)
+        .where(*pk)
+        .with_for_update()
+    ).first()
+
+    if fila is None:
+        # La purga de caducadas la borró entre el INSERT y el SELECT: se vuelve a reclamar
+        return reclamar(db, ambito, clave, hash_cuerpo, propietario)
+
+    if fila.expira <= ahora:
+        # Caducada: se reutiliza la fila como si fuera nueva
+        db.execute(update(IdempotencyKeyModel).where(*pk).values(
+            hash_peticion=hash_cuerpo, status_code=None, respuesta=None, creado=ahora, expira=expira,
+        ))
+        metrics.incrementar(f"idempotencia.{ambito}.nuevas")
+        return None
+
+    if fila.hash_peticion != hash_cuerpo:
+        metrics.incrementar(f"idempotencia.{ambito}.conflictos")
+        raise ClaveReutilizada("La Idempotency-Key ya se usó con otra petición")
+
+    metrics.incrementar(f"idempotencia.{ambito}.repetidas")
+    return RespuestaGuardada(fila.status_code or 200, fila.respuesta)
+
+
+def guardar_respuesta(db: Session, ambito: str, clave: str, cuerpo: Any,
+                      status_code: int = 200, propietario: str = ""):
+    """Anota la respuesta en la fila reclamada; se confirma con el commit de la operación."""
+    db.execute(
+        update(IdempotencyKeyModel)
+        .where(IdempotencyKeyModel.ambito == ambito, IdempotencyKeyModel.propietario == propietario,
+               IdempotencyKeyModel.clave == clave)
+        .values(status_code=status_code, respuesta=cuerpo)
+    )
+
+
+def purgar_expiradas(db: Session) -> int:
+    """Borra las claves caducadas (índice por `expira`). Hace commit; devuelve cuántas."""
+    borradas = db.execute(
+        delete(IdempotencyKeyModel).where(IdempotencyKeyModel.expira < datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return borradas
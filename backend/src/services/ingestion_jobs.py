@@ -0,0 +1,266 @@
+"""
+Ingesta de manuales PDF como job en segundo plano.
+
+La API sólo vuelca el upload a disco (INGESTA_SPOOL_DIR) y devuelve un job id.
+El parseo (pypdf) y los embeddings corren en un ProcessPoolExecutor acotado
+(INGESTA_WORKERS procesos, INGESTA_MAX_PENDIENTES jobs en vuelo como máximo):
+el event loop de uvicorn nunca ejecuta trabajo CPU-bound del PDF.
+
+Estado del job: hash Redis `nexus:ingesta:job:<id>`. Cada avance se publica
+además en el canal `nexus:ingesta:progreso`, que main.py reenvía a /ws.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from src.core import metrics
+from src.infrastructure.adapters.redis_client import obtener_redis, obtener_redis_async
+
+logger = logging.getLogger(__name__)
+
+INGESTA_WORKERS = int(os.getenv("INGESTA_WORKERS", "2"))
+INGESTA_MAX_PENDIENTES = int(os.getenv("INGESTA_MAX_PENDIENTES", "8"))
+INGESTA_SPOOL_DIR = os.getenv("INGESTA_SPOOL_DIR", "/var/cache/nexus/ingestas")
+INGESTA_JOB_TTL_S = int(os.getenv("INGESTA_JOB_TTL_S", "86400"))
+# Intervalo mínimo entre publicaciones de progreso de un mismo job
+INGESTA_PROGRESO_INTERVALO_S = float(os.getenv("INGESTA_PROGRESO_INTERVALO_S", "0.5"))
+
+PREFIJO_JOB = "nexus:ingesta:job"
+CANAL_PROGRESO = "nexus:ingesta:progreso"
+
+EN_COLA = "EN_COLA"
+PROCESANDO = "PROCESANDO"
+COMPLETADO = "COMPLETADO"
+ERROR = "ERROR"
+
+
+class ColaIngestaLlena(Exception):
+    pass
+
+
+def _clave_job(job_id: str) -> str:
+    return f"{PREFIJO_JOB}:{job_id}"
+
+
+def _actualizar_job(job_id: str, publicar: bool = True, **campos):
+    campos["actualizado"] = time.time()
+    campos = {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in campos.items()}
+    r = obtener_redis()
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(_clave_job(job_id), mapping=campos)
+    pipe.expire(_clave_job(job_id), INGESTA_JOB_TTL_S)
+    if publicar:
+        pipe.publish(CANAL_PROGRESO, json.dumps({"tipo": "ingesta", "job_id": job_id, **campos}))
+    pipe.execute()
+
+
+def estado_job(job_id: str) -> Optional[dict]:
+    datos = obtener_redis().hgetall(_clave_job(job_id))
+    if not datos:
+        return None
+    for campo in ("paginas_total", "paginas_procesadas", "fragmentos_total", "fragmentos_embebidos"):
+        if campo in datos:
+            datos[campo] = int(datos[campo])
+    if "resultado" in datos:
+        datos["resultado"] = json.loads(datos["resultado"])
+    return {"job_id": job_id, **datos}
+
+
+# --- Proceso hijo ------------------------------------------------------------
+
+def _inicializar_proceso():
+    # Con 'spawn' el hijo importa todo de cero; por si el contexto cambia,
+    # nunca reutilizar conexiones del pool heredadas del padre.
+    from src.core.logging_config import configurar_logging
+    from src.infrastructure.database import engine
+    engine.dispose(close=False)
+    configurar_logging()
+
+
+class _Progreso:
+    """Acumula avances y los publica como mucho cada INGESTA_PROGRESO_INTERVALO_S."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.pendiente = {}
+        self.ultimo = 0.0
+
+    def __call__(self, **campos):
+        self.pendiente.update(campos)
+        ahora = time.monotonic()
+        if ahora - self.ultimo >= INGESTA_PROGRESO_INTERVALO_S:
+            self.vaciar()
+            self.ultimo = ahora
+
+    def vaciar(self):
+        if self.pendiente:
+            _actualizar_job(self.job_id, **self.pendiente)
+            self.pendiente = {}
+
+
+def _ejecutar_job(job_id: str, producto_id: str, ruta: str) -> dict:
+    from src.services.rag_service import RAGService
+
+    progreso = _Progreso(job_id)
+    _actualizar_job(job_id, estado=PROCESANDO)
+    servicio = RAGService()
+    try:
+        resultado = servicio.procesar_manual(producto_id, ruta, progreso=progreso)
+        progreso.vaciar()
+        if resultado.get("error"):
+            _actualizar_job(job_id, estado=ERROR, error=resultado["error"], resultado=resultado)
+        else:
+            _actualizar_job(job_id, estado=COMPLETADO, resultado=resultado)
+        return resultado
+    finally:
+        servicio.db.close()
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+# --- Proceso de la API -------------------------------------------------------
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_en_vuelo = 0
+
+
+def _obtener_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # 'spawn': el proceso de uvicorn tiene hilos (micro-batcher, pools);
+                # hacer fork con hilos vivos puede heredar locks tomados.
+                _executor = ProcessPoolExecutor(
+                    max_workers=INGESTA_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_proceso,
+                )
+    return _executor
+
+
+def _descartar_executor(roto: ProcessPoolExecutor):
+    """Tras un BrokenProcessPool (hijo muerto, p.ej. por OOM) el pool no sirve: el próximo envío crea otro."""
+    global _executor
+    with _lock:
+        if _executor is roto:
+            _executor = None
+            metrics.incrementar("ingesta.pool_reiniciado")
+            logger.warning("Pool de ingesta roto: se creará uno nuevo")
+    roto.shutdown(wait=False, cancel_futures=True)
+
+
+def _enviar(*args):
+    """(executor, futuro). Si el pool está roto se reemplaza y se reintenta una vez."""
+    ejecutor = _obtener_executor()
+    try:
+        return ejecutor, ejecutor.submit(*args)
+    except BrokenProcessPool:
+        _descartar_executor(ejecutor)
+        ejecutor = _obtener_executor()
+        return ejecutor, ejecutor.submit(*args)
+
+
+def _reservar_cupo():
+    global _en_vuelo
+    with _lock:
+        if _en_vuelo >= INGESTA_MAX_PENDIENTES:
+            metrics.incrementar("ingesta.rechazados")
+            raise ColaIngestaLlena(f"Hay {_en_vuelo} ingestas en curso. Reintente en unos minutos.")
+        _en_vuelo += 1
+        metrics.fijar("ingesta.en_vuelo", _en_vuelo)
+
+
+def _liberar_cupo():
+    global _en_vuelo
+    with _lock:
+        _en_vuelo -= 1
+        metrics.fijar("ingesta.en_vuelo", _en_vuelo)
+
+
+def _volcar_a_disco(archivo: UploadFile, ruta: str):
+    os.makedirs(INGESTA_SPOOL_DIR, exist_ok=True)
+    archivo.file.seek(0)
+    with open(ruta, "wb") as destino:
+        shutil.copyfileobj(archivo.file, destino, 1024 * 1024)
+
+
+async def encolar_ingesta(producto_id: str, archivo: UploadFile) -> str:
+    """Vuelca el PDF a disco, lo envía al pool de procesos y devuelve el job id."""
+    _reservar_cupo()
+    job_id = uuid.uuid4().hex
+    ruta = os.path.join(INGESTA_SPOOL_DIR, f"{job_id}.pdf")
+    inicio = time.perf_counter()
+    try:
+        await run_in_threadpool(_volcar_a_disco, archivo, ruta)
+        # Redis síncrono: fuera del event loop
+        await run_in_threadpool(_actualizar_job, job_id, estado=EN_COLA, producto_id=producto_id,
+                                archivo=archivo.filename or "", creado=time.time())
+        ejecutor, futuro = _enviar(_ejecutar_job, job_id, producto_id, ruta)
+    except Exception:
+        _liberar_cupo()
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+
+    def _al_terminar(f):
+        _liberar_cupo()
+        if f.cancelled():
+            return
+        metrics.observar("ingesta.duracion_ms", (time.perf_counter() - inicio) * 1000)
+        error = f.exception()
+        if error is not None:
+            # El hijo murió o falló antes de registrar su estado (p.ej. BrokenProcessPool)
+            metrics.incrementar("ingesta.fallidos")
+            if isinstance(error, BrokenProcessPool):
+                _descartar_executor(ejecutor)
+            try:
+                _actualizar_job(job_id, estado=ERROR, error=str(error) or type(error).__name__)
+            except Exception as e:
+                logger.warning("No se pudo registrar el fallo del job %s: %s", job_id, e)
+
+    futuro.add_done_callback(_al_terminar)
+    metrics.incrementar("ingesta.encolados")
+    return job_id
+
+
+async def reenviar_progreso(broadcast):
+    """Tarea de la API: reenvía el canal de progreso de Redis a los clientes de /ws."""
+    while True:
+        pubsub = obtener_redis_async().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CANAL_PROGRESO)
+            while True:
+                mensaje = await pubsub.get_message(timeout=1.0)
+                if mensaje is not None:
+                    await broadcast(mensaje["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Suscripción de progreso caída (%s). Reintentando...", e)
+            await asyncio.sleep(2)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+def detener_pool():
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
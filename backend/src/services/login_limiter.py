@@ -0,0 +1,74 @@
+"""
+Limitador de intentos de login en Redis (ventana fija por clave).
+
+Cada intento incrementa a la vez el contador del email y el de la IP, ANTES
+de gastar CPU en bcrypt; si alguno supera su límite se responde 429 con
+Retry-After. Un login correcto borra el contador del email (no el de la IP).
+Si Redis no responde, se deja pasar (fail-open): el executor de contraseñas
+sigue acotando la CPU.
+"""
+import logging
+import os
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from src.core import metrics
+from src.infrastructure.adapters.redis_client import obtener_redis_async
+
+logger = logging.getLogger(__name__)
+
+LOGIN_VENTANA_S = int(os.getenv("LOGIN_VENTANA_S", "300"))
+LOGIN_MAX_INTENTOS_EMAIL = int(os.getenv("LOGIN_MAX_INTENTOS_EMAIL", "5"))
+LOGIN_MAX_INTENTOS_IP = int(os.getenv("LOGIN_MAX_INTENTOS_IP", "30"))
+# Sólo detrás de un proxy propio: usar el primer X-Forwarded-For como IP del cliente
+LOGIN_CONFIAR_PROXY = os.getenv("LOGIN_CONFIAR_PROXY", "0").lower() in ("1", "true", "si")
+
+PREFIJO = "nexus:intentos"
+
+
+def ip_cliente(request: Request) -> str:
+    if LOGIN_CONFIAR_PROXY:
+        reenviada = request.headers.get("x-forwarded-for")
+        if reenviada:
+            return reenviada.split(",")[0].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+def _clave(ambito: str, tipo: str, valor: str) -> str:
+    return f"{PREFIJO}:{ambito}:{tipo}:{valor}"
+
+
+async def registrar_intento(ambito: str, ip: str, email: Optional[str] = None):
+    """Cuenta el intento y lanza 429 si el email o la IP agotaron su ventana."""
+    limites = [(_clave(ambito, "ip", ip), LOGIN_MAX_INTENTOS_IP)]
+    if email:
+        limites.append((_clave(ambito, "email", email.strip().lower()), LOGIN_MAX_INTENTOS_EMAIL))
+
+    try:
+        async with obtener_redis_async().pipeline(transaction=False) as pipe:
+            for clave, _ in limites:
+                pipe.incr(clave)
+                pipe.expire(clave, LOGIN_VENTANA_S, nx=True)
+                pipe.ttl(clave)
+            respuestas = await pipe.execute()
+    except Exception as e:
+        logger.warning("Limitador de intentos sin Redis: %s", e)
+        return
+
+    for i, (clave, limite) in enumerate(limites):
+        intentos, ttl = respuestas[i * 3], respuestas[i * 3 + 2]
+        if intentos > limite:
+            metrics.incrementar(f"login.limitados_{clave.split(':')[3]}")
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiados intentos. Espere antes de volver a intentarlo.",
+                headers={"Retry-After": str(max(ttl, 1))},
+            )
+
+
+async def limpiar_intentos(ambito: str, email: str):
+    try:
+        await obtener_redis_async().delete(_clave(ambito, "email", email.strip().lower()))
+    except Exception as e:
+        logger.warning("No se pudo limpiar el contador de intentos: %s", e)
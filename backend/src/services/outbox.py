@@ -0,0 +1,88 @@
+"""
+Transactional outbox: los mensajes para Redis se escriben en la tabla
+`outbox` dentro de la transacción que los origina (p.ej. la venta del
+checkout) y un relay (workers/outbox_relay.py) los publica después.
+
+Si la venta se confirma, su mensaje también; si Redis está caído, el mensaje
+espera en Postgres en vez de perderse. La entrega es al menos una vez: si el
+relay cae entre el RPUSH y marcar la fila como enviada, el mensaje se repite
+(el worker de SUNAT ignora ventas ya facturadas).
+"""
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from src.core import metrics
+from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from src.infrastructure.models import OutboxModel
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "500"))
+OUTBOX_RETENCION_H = float(os.getenv("OUTBOX_RETENCION_H", "72"))
+
+TIPO_FACTURA_SUNAT = "factura_sunat"
+
+# tipo -> cómo se publica un lote de payloads de ese tipo
+_DESTINOS: Dict[str, Callable[[QueueAdapter, List[dict]], None]] = {
+    TIPO_FACTURA_SUNAT: lambda cola, payloads: cola.encolar_facturas(p["venta_id"] for p in payloads),
+}
+
+
+def registrar(db: Session, tipo: str, payload: dict):
+    """Añade el mensaje a la transacción en curso. No hace commit."""
+    if tipo not in _DESTINOS:
+        raise ValueError(f"Tipo de outbox desconocido: {tipo}")
+    db.execute(insert(OutboxModel).values(tipo=tipo, payload=payload, creado=datetime.utcnow()))
+
+
+def drenar_lote(db: Session, cola: QueueAdapter, limite: int = OUTBOX_LOTE) -> int:
+    """
+    Publica hasta `limite` mensajes pendientes y los marca como enviados, en
+    una transacción. SKIP LOCKED: varios relays pueden drenar a la vez sin
+    repartirse las mismas filas. Devuelve cuántos se publicaron.
+    """
+    filas = db.execute(
+        select(OutboxModel.id, OutboxModel.tipo, OutboxModel.payload)
+        .where(OutboxModel.enviado.is_(None))
+        .order_by(OutboxModel.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not filas:
+        db.rollback()
+        return 0
+
+    por_tipo: Dict[str, List[dict]] = defaultdict(list)
+    for _, tipo, payload in filas:
+        por_tipo[tipo].append(payload)
+    try:
+        for tipo, payloads in por_tipo.items():
+            _DESTINOS[tipo](cola, payloads)
+    except Exception:
+        db.rollback()
+        metrics.incrementar("outbox.fallos_publicacion")
+        raise
+
+    db.execute(
+        update(OutboxModel)
+        .where(OutboxModel.id.in_([fila.id for fila in filas]))
+        .values(enviado=datetime.utcnow())
+    )
+    db.commit()
+    metrics.incrementar("outbox.publicados", len(filas))
+    return len(filas)
+
+
+def purgar_enviados(db: Session, retencion_h: float = OUTBOX_RETENCION_H) -> int:
+    limite = datetime.utcnow() - timedelta(hours=retencion_h)
+    borrados = db.execute(
+        delete(OutboxModel).where(OutboxModel.enviado.is_not(None), OutboxModel.enviado < limite)
+    ).rowcount
+    db.commit()
+    return borrados
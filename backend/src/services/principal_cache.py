@@ -0,0 +1,201 @@
+"""
+Caché de principals (quién es el portador del JWT) para los guardias de
+`api/deps.py`: evita un SELECT por PK en cada petición autenticada.
+
+Clave: tipo de token + `sub`. Valor: rol y flag activo. Dos niveles: dict en
+proceso con TTL (PRINCIPAL_CACHE_TTL_S) y, opcionalmente
+(PRINCIPAL_CACHE_REDIS=1), Redis compartido con TTL propio.
+
+Invalidación: eventos de sesión de SQLAlchemy. Cuando un flush cambia `rol` o
+`activo` de un UsuarioModel (o borra un usuario/cliente) se anota el id y se
+invalida tras el commit, en este proceso y en Redis. Los demás workers ven el
+cambio como mucho PRINCIPAL_CACHE_TTL_S después (su copia local caduca y el
+nivel Redis ya no la tiene).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.core import metrics
+from src.infrastructure.adapters.redis_client import obtener_redis
+from src.infrastructure.models import ClienteModel, UsuarioModel
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_CACHE_TTL_S = float(os.getenv("PRINCIPAL_CACHE_TTL_S", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_REDIS = os.getenv("PRINCIPAL_CACHE_REDIS", "0").lower() in ("1", "true", "si")
+PRINCIPAL_CACHE_REDIS_TTL_S = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL_S", "300"))
+
+PREFIJO_REDIS = "nexus:principal"
+EMPLEADO = "employee"
+CLIENTE = "client"
+
+
+class Principal:
+    """Lo que los guardias necesitan del usuario: sin entidad ORM ni sesión."""
+    __slots__ = ("id", "tipo", "rol", "activo")
+
+    def __init__(self, id: uuid.UUID, tipo: str, rol: Optional[str], activo: bool):
+        self.id = id
+        self.tipo = tipo
+        self.rol = rol
+        self.activo = activo
+
+    def a_dict(self) -> dict:
+        return {"id": str(self.id), "tipo": self.tipo, "rol": self.rol, "activo": self.activo}
+
+    @classmethod
+    def desde_dict(cls, datos: dict) -> "Principal":
+        return cls(uuid.UUID(datos["id"]), datos["tipo"], datos["rol"], datos["activo"])
+
+
+class PrincipalCache:
+    def __init__(self, ttl_s: float = PRINCIPAL_CACHE_TTL_S, capacidad: int = PRINCIPAL_CACHE_SIZE,
+                 usar_redis: bool = PRINCIPAL_CACHE_REDIS):
+        self.ttl_s = ttl_s
+        self.capacidad = capacidad
+        self.usar_redis = usar_redis
+        self._lock = threading.Lock()
+        self._entradas = {}
+
+    @staticmethod
+    def _clave(tipo: str, sub) -> str:
+        return f"{tipo}:{sub}"
+
+    def obtener(self, tipo: str, sub: uuid.UUID, db: Session) -> Optional[Principal]:
+        clave = self._clave(tipo, sub)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+        if entrada is not None and entrada[0] > ahora:
+            metrics.incrementar("principal_cache.hit_local")
+            return entrada[1]
+
+        if self.usar_redis:
+            try:
+                datos = obtener_redis().get(f"{PREFIJO_REDIS}:{clave}")
+            except Exception as e:
+                logger.warning("Redis no disponible para principals: %s", e)
+                datos = None
+            if datos is not None:
+                principal = Principal.desde_dict(json.loads(datos))
+                self._guardar_local(clave, principal)
+                metrics.incrementar("principal_cache.hit_redis")
+                return principal
+
+        metrics.incrementar("principal_cache.miss")
+        principal = self._cargar(tipo, sub, db)
+        if principal is not None:
+            self._guardar_local(clave, principal)
+            if self.usar_redis:
+                try:
+                    obtener_redis().set(f"{PREFIJO_REDIS}:{clave}", json.dumps(principal.a_dict()),
+                                        ex=PRINCIPAL_CACHE_REDIS_TTL_S)
+                except Exception as e:
+                    logger.warning("No se pudo guardar el principal en Redis: %s", e)
+        return principal
+
+    @staticmethod
+    def _cargar(tipo: str, sub: uuid.UUID, db: Session) -> Optional[Principal]:
+        if tipo == EMPLEADO:
+            fila = db.execute(
+                select(UsuarioModel.rol, UsuarioModel.activo).where(UsuarioModel.id == sub)
+            ).first()
+            if fila is None:
+                return None
+            return Principal(sub, tipo, fila.rol, fila.activo is not False)
+        existe = db.execute(select(ClienteModel.id).where(ClienteModel.id == sub)).first()
+        return Principal(sub, tipo, "CUSTOMER", True) if existe else None
+
+    def _guardar_local(self, clave: str, principal: Principal):
+        with self._lock:
+            if len(self._entradas) >= self.capacidad:
+                # Primero las caducadas; si no alcanza, las más antiguas (orden de inserción)
+                ahora = time.monotonic()
+                for k in [k for k, (expira, _) in self._entradas.items() if expira <= ahora]:
+                    del self._entradas[k]
+                while len(self._entradas) >= self.capacidad:
+                    del self._entradas[next(iter(self._entradas))]
+            self._entradas[clave] = (time.monotonic() + self.ttl_s, principal)
+
+    def invalidar(self, tipo: str, sub):
+        clave = self._clave(tipo, sub)
+        with self._lock:
+            self._entradas.pop(clave, None)
+        metrics.incrementar("principal_cache.invalidaciones")
+        if self.usar_redis:
+            try:
+                obtener_redis().delete(f"{PREFIJO_REDIS}:{clave}")
+            except Exception as e:
+                logger.warning("No se pudo invalidar el principal en Redis: %s", e)
+
+    def invalidar_todo(self):
+        with self._lock:
+            self._entradas.clear()
+        metrics.incrementar("principal_cache.invalidaciones_totales")
+        if self.usar_redis:
+            try:
+                r = obtener_redis()
+                claves = list(r.scan_iter(f"{PREFIJO_REDIS}:*", count=1000))
+                if claves:
+                    r.delete(*claves)
+            except Exception as e:
+                logger.warning("No se pudo vaciar la caché de principals en Redis: %s", e)
+
+
+cache_principals = PrincipalCache()
+
+
+# --- Invalidación por eventos de sesión ---------------------------------------
+
+_PENDIENTES = "principals_a_invalidar"
+
+
+@event.listens_for(Session, "after_flush")
+def _anotar_cambios(session: Session, flush_context):
+    # En after_flush el historial de atributos aún refleja lo que se acaba de escribir
+    pendientes = session.info.setdefault(_PENDIENTES, set())
+    for obj in session.dirty:
+        if isinstance(obj, UsuarioModel):
+            attrs = inspect(obj).attrs
+            if attrs.rol.history.has_changes() or attrs.activo.history.has_changes():
+                pendientes.add((EMPLEADO, str(obj.id)))
+    for obj in session.deleted:
+        if isinstance(obj, UsuarioModel):
+            pendientes.add((EMPLEADO, str(obj.id)))
+        elif isinstance(obj, ClienteModel):
+            pendientes.add((CLIENTE, str(obj.id)))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _anotar_masivos(orm_execute_state):
+    # UPDATE/DELETE masivos (session.execute(update(UsuarioModel)...)) no pasan por el flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (UsuarioModel, ClienteModel):
+        orm_execute_state.session.info[_PENDIENTES + "_todo"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_tras_commit(session: Session):
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if session.info.pop(_PENDIENTES + "_todo", False):
+        cache_principals.invalidar_todo()
+        return
+    for tipo, sub in pendientes or ():
+        cache_principals.invalidar(tipo, sub)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_pendientes(session: Session):
+    session.info.pop(_PENDIENTES, None)
+    session.info.pop(_PENDIENTES + "_todo", None)
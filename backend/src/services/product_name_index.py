@@ -0,0 +1,186 @@
+"""
+Índice invertido token -> productos sobre `nombre` y `sku` para el router de
+precios del chat.
+
+Los tokens se normalizan sin tildes y con un stemming ligero de plurales en
+español (cascos -> casco, motores -> motor, luces -> luz), aplicado igual al
+índice y a la pregunta. Una pregunta se resuelve con una sola pasada por sus
+palabras; los candidatos se ordenan por suma de IDF de los tokens que
+coinciden y, a igualdad, por la fracción del nombre cubierta.
+
+Se construye al arrancar y se actualiza por filas con `catalog_events`.
+"""
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.models import ProductoModel
+from src.services import catalog_events
+
+logger = logging.getLogger(__name__)
+
+_SEPARADORES = re.compile(r"[^a-z0-9]+")
+_VACIAS = frozenset({
+    "de", "del", "la", "el", "los", "las", "un", "una", "unos", "unas", "y", "o",
+    "en", "con", "para", "por", "al", "que", "me", "mi", "su", "sus",
+})
+
+
+def sin_tildes(texto: str) -> str:
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def raiz(palabra: str) -> str:
+    """Stemming de plurales: quita la 's' final y la 'e' de los plurales en -es."""
+    if len(palabra) > 3 and palabra.endswith("s") and not palabra.isdigit():
+        palabra = palabra[:-1]
+        if len(palabra) > 3 and palabra.endswith("ce"):
+            palabra = palabra[:-2] + "z"
+        elif len(palabra) > 3 and palabra.endswith("e") and palabra[-2] in "lrnd":
+            palabra = palabra[:-1]
+    elif len(palabra) > 3 and palabra.endswith("e") and palabra[-2] in "lrnd":
+        # singular con la misma raíz que su plural en -es (cable / cables)
+        palabra = palabra[:-1]
+    elif len(palabra) > 3 and palabra.endswith("ce"):
+        palabra = palabra[:-2] + "z"
+    return palabra
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    if not texto:
+        return []
+    return [raiz(t) for t in _SEPARADORES.split(sin_tildes(texto)) if len(t) > 1 and t not in _VACIAS]
+
+
+def _tokens_producto(nombre: Optional[str], sku: Optional[str]) -> FrozenSet[str]:
+    tokens = set(tokenizar(nombre)) | set(tokenizar(sku))
+    if sku:
+        tokens.add(sin_tildes(sku).strip())
+    return frozenset(tokens)
+
+
+class ProductNameIndex:
+    def __init__(self):
+        self.cargado = False
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._productos: Dict[str, Tuple[FrozenSet[str], int]] = {}
+
+    def __len__(self):
+        return len(self._productos)
+
+    def _quitar(self, producto_id: str):
+        anterior = self._productos.pop(producto_id, None)
+        if anterior is None:
+            return
+        for token in anterior[0]:
+            ids = self._postings.get(token)
+            if ids is not None:
+                ids.discard(producto_id)
+                if not ids:
+                    del self._postings[token]
+
+    def _poner(self, producto_id: str, nombre: Optional[str], sku: Optional[str]):
+        self._quitar(producto_id)
+        tokens = _tokens_producto(nombre, sku)
+        self._productos[producto_id] = (tokens, max(len(tokenizar(nombre)), 1))
+        for token in tokens:
+            self._postings[token].add(producto_id)
+
+    def cargar(self, db) -> int:
+        inicio = time.perf_counter()
+        stmt = select(ProductoModel.id, ProductoModel.nombre, ProductoModel.sku).execution_options(yield_per=5000)
+        nuevo = ProductNameIndex()
+        for producto_id, nombre, sku in db.execute(stmt):
+            nuevo._poner(str(producto_id), nombre, sku)
+        with self._lock:
+            self._postings, self._productos = nuevo._postings, nuevo._productos
+            self.cargado = True
+        logger.info("Índice de nombres cargado", extra={
+            "productos": len(self._productos), "tokens": len(self._postings),
+            "segundos": round(time.perf_counter() - inicio, 2)})
+        return len(self._productos)
+
+    def buscar(self, palabras: Iterable[str], limite: int = 5) -> List[Tuple[str, float]]:
+        """[(producto_id, score)] de mayor a menor para las palabras de la pregunta."""
+        consulta = set()
+        for palabra in palabras:
+            consulta.update(tokenizar(palabra))
+            consulta.add(sin_tildes(palabra).strip(" ¿?¡!.,;:"))
+
+        with self._lock:
+            total = len(self._productos) or 1
+            puntajes: Dict[str, float] = defaultdict(float)
+            coincidencias: Dict[str, int] = defaultdict(int)
+            for token in consulta:
+                ids = self._postings.get(token)
+                if not ids:
+                    continue
+                idf = math.log(1 + total / len(ids))
+                for producto_id in ids:
+                    puntajes[producto_id] += idf
+                    coincidencias[producto_id] += 1
+            ranking = [
+                (producto_id, puntaje, coincidencias[producto_id] / self._productos[producto_id][1])
+                for producto_id, puntaje in puntajes.items()
+            ]
+
+        ranking.sort(key=lambda r: (-r[1], -r[2]))
+        return [(producto_id, puntaje) for producto_id, puntaje, _ in ranking[:limite]]
+
+    def aplicar_cambios(self, cambio: catalog_events.CambioCatalogo):
+        """Listener de catalog_events: sólo importan altas y cambios de nombre/SKU."""
+        if not self.cargado or not cambio.contenido:
+            return
+        db = SessionLocal()
+        try:
+            if cambio.ids is None:
+                self.cargar(db)
+                return
+            filas = db.execute(
+                select(ProductoModel.id, ProductoModel.nombre, ProductoModel.sku)
+                .where(ProductoModel.id.in_(list(cambio.ids)))
+            ).all()
+            with self._lock:
+                vistos = set()
+                for producto_id, nombre, sku in filas:
+                    vistos.add(str(producto_id))
+                    self._poner(str(producto_id), nombre, sku)
+                for faltante in set(cambio.ids) - vistos:
+                    self._quitar(faltante)
+        finally:
+            db.close()
+
+
+indice_nombres = ProductNameIndex()
+
+
+def iniciar_indice_nombres():
+    """Carga el índice al arrancar la API y lo suscribe a los cambios del catálogo."""
+    version = catalog_events.version_remota()
+    db = SessionLocal()
+    try:
+        indice_nombres.cargar(db)
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice de nombres: %s", e)
+        return
+    finally:
+        db.close()
+    catalog_events.marcar_sincronizado(version)
+    catalog_events.registrar_listener(indice_nombres.aplicar_cambios)
+
+
+def buscar_productos_por_nombre(palabras: Iterable[str], limite: int = 5) -> Optional[List[Tuple[str, float]]]:
+    """None si el índice no está cargado (el llamador decide el plan B)."""
+    if not indice_nombres.cargado:
+        return None
+    return indice_nombres.buscar(palabras, limite)
@@ -1,91 +1,219 @@
 import hashlib
-import random
-from typing import List, Optional
+import logging
+import os
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
 from sqlalchemy.orm import Session
-from sqlalchemy import select, text
+from sqlalchemy import delete, insert, select, update
 from pypdf import PdfReader
 from io import BytesIO
-from fastapi import UploadFile
 
-from src.infrastructure.models import ProductoModel
+from src.infrastructure.models import ManualChunkModel, ProductoModel
 from src.infrastructure.database import SessionLocal
+from src.infrastructure.vector_index import configurar_busqueda_vectorial
+from src.services.embeddings import (
+    EMBEDDING_MAX_TOKENS_LOTE,
+    EmbeddingEngine,
+    PresupuestoTokens,
+    obtener_motor,
+)
+from src.services.catalog_events import notificar_cambio_productos
+
+logger = logging.getLogger(__name__)
+
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "400"))
+RAG_CHUNK_SOLAPAMIENTO = int(os.getenv("RAG_CHUNK_SOLAPAMIENTO", "50"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+RAG_LARGO_PASAJE = int(os.getenv("RAG_LARGO_PASAJE", "500"))
+# Fragmentos por llamada a embed_many (granularidad del progreso de ingesta)
+RAG_LOTE_EMBEDDING = int(os.getenv("RAG_LOTE_EMBEDDING", "64"))
+
+_tokens = PresupuestoTokens(RAG_CHUNK_TOKENS, EMBEDDING_MAX_TOKENS_LOTE)
+
+
+class Fragmento(NamedTuple):
+    pagina: int
+    orden: int
+    contenido: str
+    tokens: int
+    content_hash: str
+
+
+class Pasaje(NamedTuple):
+    producto_id: object
+    producto: str
+    pagina: int
+    contenido: str
+    distancia: float
+
+
+def trocear_paginas(paginas: List[str], max_tokens: int = RAG_CHUNK_TOKENS,
+                    solapamiento: int = RAG_CHUNK_SOLAPAMIENTO) -> List[Fragmento]:
+    """Fragmentos por página (nunca cruzan páginas), sin duplicados de contenido."""
+    fragmentos, vistos = [], set()
+    for numero, texto in enumerate(paginas, start=1):
+        for contenido, tokens in _tokens.trocear(" ".join(texto.split()), max_tokens, solapamiento):
+            content_hash = hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+            if content_hash in vistos:
+                continue
+            vistos.add(content_hash)
+            fragmentos.append(Fragmento(numero, len(fragmentos), contenido, tokens, content_hash))
+    return fragmentos
+
 
 class RAGService:
-    def __init__(self):
-        self.db: Session = SessionLocal()
+    def __init__(self, embeddings: EmbeddingEngine = None, db: Session = None):
+        self.db: Session = db or SessionLocal()
+        self.embeddings = embeddings or obtener_motor()
 
-    def _get_embedding(self, texto: str) -> List[float]:
-        """
-        SIMULACIÓN DETERMINISTA DE EMBEDDINGS (1536 dimensiones).
-        Genera siempre el mismo vector para el mismo texto, permitiendo probar
-        la búsqueda semántica sin pagar API de OpenAI.
-        """
-        if not texto: return [0.0] * 1536
-        
-        seed = int(hashlib.sha256(texto.encode('utf-8')).hexdigest(), 16) % 10**8
-        random.seed(seed)
-        
-        return [random.uniform(-0.1, 0.1) for _ in range(1536)]
-
-    async def ingestar_pdf(self, producto_id: str, archivo: UploadFile):
+    def procesar_manual(self, producto_id: str, content: Union[bytes, str],
+                        progreso: Optional[Callable[..., None]] = None):
         """
-        ETL: Extract (PDF) -> Transform (Vector) -> Load (PGVector)
+        ETL: Extract (PDF) -> Transform (fragmentos + vectores) -> Load (manual_chunks).
+        Es CPU-bound: desde la API se ejecuta como job (services/ingestion_jobs.py).
+        `content`: bytes del PDF o ruta en disco. `progreso(**campos)` recibe
+        paginas_total / paginas_procesadas / fragmentos_total / fragmentos_embebidos.
         """
+        progreso = progreso or (lambda **campos: None)
         try:
-            content = await archivo.read()
-            reader = PdfReader(BytesIO(content))
-            texto_completo = ""
-            for page in reader.pages:
-                texto_completo += page.extract_text() + "\n"
-            
-            if not texto_completo.strip():
-                return {"msg": "El PDF parece estar vacío o es una imagen.", "chars": 0}
+            reader = PdfReader(BytesIO(content) if isinstance(content, bytes) else content)
+            paginas = []
+            total_paginas = len(reader.pages)
+            progreso(paginas_total=total_paginas, paginas_procesadas=0)
+            for numero, page in enumerate(reader.pages, start=1):
+                paginas.append(page.extract_text() or "")
+                progreso(paginas_procesadas=numero)
+            chars = sum(len(p) for p in paginas)
 
-            vector = self._get_embedding(texto_completo[:1000])
+            if not any(p.strip() for p in paginas):
+                return {"msg": "El PDF parece estar vacío o es una imagen.", "chars": 0}
 
-            producto = self.db.query(ProductoModel).get(producto_id)
+            producto = self.db.execute(
+                select(ProductoModel.id, ProductoModel.nombre).where(ProductoModel.id == producto_id)
+            ).first()
             if not producto:
                 raise ValueError(f"Producto {producto_id} no encontrado")
-            
-            producto.descripcion = f"[MANUAL TÉCNICO]\n{texto_completo[:2000]}..." 
-            producto.embedding_vector = vector
-            
+
+            fragmentos = trocear_paginas(paginas)
+            existentes = {
+                fila.content_hash: fila
+                for fila in self.db.execute(
+                    select(ManualChunkModel.id, ManualChunkModel.content_hash,
+                           ManualChunkModel.pagina, ManualChunkModel.orden)
+                    .where(ManualChunkModel.producto_id == producto.id)
+                )
+            }
+
+            nuevos = [f for f in fragmentos if f.content_hash not in existentes]
+            hashes = {f.content_hash for f in fragmentos}
+            obsoletos = [fila.id for h, fila in existentes.items() if h not in hashes]
+            # Los que no cambiaron conservan su vector; sólo se corrige su posición
+            movidos = [
+                {"id": existentes[f.content_hash].id, "pagina": f.pagina, "orden": f.orden}
+                for f in fragmentos
+                if f.content_hash in existentes
+                and (existentes[f.content_hash].pagina, existentes[f.content_hash].orden) != (f.pagina, f.orden)
+            ]
+
+            if obsoletos:
+                self.db.execute(delete(ManualChunkModel).where(ManualChunkModel.id.in_(obsoletos)))
+            if movidos:
+                self.db.execute(update(ManualChunkModel), movidos)
+            progreso(fragmentos_total=len(nuevos), fragmentos_embebidos=0)
+            for inicio in range(0, len(nuevos), RAG_LOTE_EMBEDDING):
+                lote = nuevos[inicio:inicio + RAG_LOTE_EMBEDDING]
+                vectores = self.embeddings.embed_many([f.contenido for f in lote])
+                self.db.execute(insert(ManualChunkModel), [
+                    {
+                        "producto_id": producto.id,
+                        "pagina": f.pagina,
+                        "orden": f.orden,
+                        "contenido": f.contenido,
+                        "tokens": f.tokens,
+                        "content_hash": f.content_hash,
+                        "embedding_vector": vectores[i],
+                    }
+                    for i, f in enumerate(lote)
+                ])
+                progreso(fragmentos_embebidos=inicio + len(lote))
             self.db.commit()
-            
+            if nuevos or obsoletos:
+                # Cambió lo que el RAG puede citar: invalida las respuestas cacheadas del chat
+                notificar_cambio_productos([producto.id])
+
             return {
-                "msg": "Manual procesado y vectorizado correctamente", 
-                "chars": len(texto_completo),
-                "producto": producto.nombre
+                "msg": "Manual procesado y vectorizado correctamente",
+                "chars": chars,
+                "producto": producto.nombre,
+                "fragmentos": len(fragmentos),
+                "nuevos": len(nuevos),
+                "eliminados": len(obsoletos),
+                "sin_cambios": len(fragmentos) - len(nuevos),
             }
-            
+
         except Exception as e:
             self.db.rollback()
-            print(f" Error en ingesta PDF: {e}")
-            return {"msg": f"Error procesando PDF: {str(e)}", "chars": 0}
+            logger.exception("Error en ingesta PDF", extra={"producto_id": producto_id})
+            return {"msg": f"Error procesando PDF: {str(e)}", "chars": 0, "error": str(e)}
 
-    def consultar(self, pregunta: str) -> str:
+    def buscar_pasajes(self, pregunta: str, k: int = RAG_TOP_K, vector=None) -> List[Pasaje]:
+        """Top-k fragmentos de manuales más cercanos a la pregunta, con su producto."""
+        pregunta_vector = self.embeddings.embed(pregunta) if vector is None else vector
+        configurar_busqueda_vectorial(self.db, "rag", candidatos=k)
+
+        distancia = ManualChunkModel.embedding_vector.l2_distance(pregunta_vector)
+        stmt = (
+            select(
+                ManualChunkModel.producto_id,
+                ProductoModel.nombre,
+                ManualChunkModel.pagina,
+                ManualChunkModel.contenido,
+                distancia.label("distancia"),
+            )
+            .join(ProductoModel, ProductoModel.id == ManualChunkModel.producto_id)
+            .order_by(distancia)
+            .limit(k)
+        )
+        return [Pasaje(*fila) for fila in self.db.execute(stmt)]
+
+    def responder(self, pregunta: str, vector=None) -> Tuple[str, List]:
         """
-        Búsqueda Semántica: Encuentra el producto más relevante a la pregunta.
+        Búsqueda Semántica: pasajes de manuales más relevantes a la pregunta.
+        Si aún no hay manuales cargados, cae a la descripción del producto más cercano.
+        Devuelve (respuesta, ids de los productos citados).
         """
-        try:
-            pregunta_vector = self._get_embedding(pregunta)
-            
-            stmt = select(ProductoModel).order_by(
-                ProductoModel.embedding_vector.l2_distance(pregunta_vector)
-            ).limit(1)
-            
-            resultado = self.db.execute(stmt).scalar_one_or_none()
-            
-            if not resultado or not resultado.descripcion:
-                return "No encontré información técnica relevante en los manuales cargados."
-
+        pregunta_vector = self.embeddings.embed(pregunta) if vector is None else vector
+        pasajes = self.buscar_pasajes(pregunta, vector=pregunta_vector)
+        if pasajes:
+            cuerpo = "\n\n".join(
+                f"**{p.producto}** (pág. {p.pagina}):\n{p.contenido[:RAG_LARGO_PASAJE]}"
+                for p in pasajes
+            )
             respuesta = (
-                f"Basado en el manual de **{resultado.nombre}**:\n\n"
-                f"ℹ{resultado.descripcion[:300]}...\n\n"
-                f"*Recomendación:* Este producto es el más adecuado para tu consulta técnica."
+                f"Basado en los manuales técnicos:\n\n{cuerpo}\n\n"
+                f"*Recomendación:* **{pasajes[0].producto}** es el más adecuado para tu consulta técnica."
             )
-            return respuesta
+            return respuesta, [p.producto_id for p in pasajes]
+
+        resultado = self.db.execute(
+            select(ProductoModel.id, ProductoModel.nombre, ProductoModel.descripcion)
+            .order_by(ProductoModel.embedding_vector.l2_distance(pregunta_vector))
+            .limit(1)
+        ).first()
 
+        if not resultado or not resultado.descripcion:
+            return "No encontré información técnica relevante en los manuales cargados.", []
+
+        respuesta = (
+            f"Basado en el manual de **{resultado.nombre}**:\n\n"
+            f"ℹ{resultado.descripcion[:300]}...\n\n"
+            f"*Recomendación:* Este producto es el más adecuado para tu consulta técnica."
+        )
+        return respuesta, [resultado.id]
+
+    def consultar(self, pregunta: str) -> str:
+        try:
+            return self.responder(pregunta)[0]
         except Exception as e:
-            print(f"Error en consulta RAG: {e}")
-            return "Lo siento, tuve un error consultando la base de conocimientos."
\ No newline at end of file
+            logger.exception("Error en consulta RAG")
+            return "Lo siento, tuve un error consultando la base de conocimientos."
@@ -0,0 +1,76 @@
+"""
+Cliente asíncrono del servicio de facturación de SUNAT (modo async del worker).
+
+Un solo `httpx.AsyncClient` por worker con pool keep-alive del tamaño de la
+ventana de concurrencia: N envíos en vuelo reutilizan N conexiones en vez de
+abrir una por factura.
+
+Sin SUNAT_URL se simula el envío como el modo síncrono (latencia fija y
+fallos aleatorios en los primeros intentos). Para medir contra un servidor
+real en local: scripts/mock_sunat.py.
+"""
+import asyncio
+import os
+import random
+from typing import NamedTuple, Optional
+
+import httpx
+
+SUNAT_URL = os.getenv("SUNAT_URL")
+SUNAT_TIMEOUT_S = float(os.getenv("SUNAT_TIMEOUT_S", "10"))
+SUNAT_SIMULACION_S = float(os.getenv("SUNAT_SIMULACION_S", "2"))
+
+
+class SunatNoDisponible(Exception):
+    """Fallo transitorio (timeout, conexión, 5xx / 429): se reintenta más tarde."""
+
+
+class SunatRechazo(Exception):
+    """Fallo permanente (otro 4xx, respuesta sin CDR): reintentar no lo arregla, va a la dead letter."""
+
+
+class RespuestaSunat(NamedTuple):
+    cdr: str
+    hash_firma: str
+
+
+class ClienteSunat:
+    def __init__(self, max_conexiones: int, url: Optional[str] = SUNAT_URL):
+        self.url = url
+        self._http = None
+        if url:
+            self._http = httpx.AsyncClient(
+                timeout=SUNAT_TIMEOUT_S,
+                limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones),
+            )
+
+    async def enviar(self, venta_id: str, xml: str, intento: int = 0) -> RespuestaSunat:
+        if self._http is None:
+            return await self._simular(venta_id, intento)
+        try:
+            respuesta = await self._http.post(
+                self.url, content=xml.encode("utf-8"),
+                headers={"Content-Type": "application/xml", "X-Venta-Id": str(venta_id)},
+            )
+        except httpx.TransportError as e:
+            raise SunatNoDisponible(f"{type(e).__name__}: {e}") from e
+        if respuesta.status_code == 429 or respuesta.status_code >= 500:
+            raise SunatNoDisponible(f"SUNAT respondió {respuesta.status_code}")
+        if not respuesta.is_success:
+            raise SunatRechazo(f"SUNAT respondió {respuesta.status_code}: {respuesta.text[:300]}")
+        try:
+            datos = respuesta.json()
+            return RespuestaSunat(datos["cdr"], datos["hash_firma"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise SunatRechazo(f"Respuesta de SUNAT inválida ({type(e).__name__}): {respuesta.text[:300]}") from e
+
+    @staticmethod
+    async def _simular(venta_id: str, intento: int) -> RespuestaSunat:
+        await asyncio.sleep(SUNAT_SIMULACION_S)
+        if random.random() < 0.2 and intento < 3:
+            raise SunatNoDisponible("Servidor SUNAT no responde")
+        return RespuestaSunat(f"CDR-{venta_id}-ACEPTADO", "JKS78-SDF89-SDF78 (Firma Digital Simulada)")
+
+    async def cerrar(self):
+        if self._http is not None:
+            await self._http.aclose()
@@ -0,0 +1,202 @@
+"""
+XML UBL 2.1 (factura / boleta electrónica SUNAT) a partir de una `VentaModel`
+con sus `detalles` y el producto de cada línea.
+
+Sin DOM: el esqueleto del documento son plantillas de texto fijas (cabecera,
+línea, pie) que se rellenan con los valores ya escapados y se unen con un
+solo `"".join`. Generar una factura de 500 líneas cuesta 500 `format` de la
+plantilla de línea; medir con scripts/bench_ubl.py.
+
+Los precios de venta incluyen IGV: el valor de venta y el IGV de cada línea
+se calculan hacia atrás y los totales son la suma de las líneas ya
+redondeadas (así cuadran con lo que valida SUNAT). La firma digital va en
+UBLExtensions y la añade quien envía el documento.
+"""
+import os
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, List
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from src.infrastructure.models import (
+    CORRELATIVO_BOLETA,
+    CORRELATIVO_FACTURA,
+    ClienteModel,
+    DetalleVentaModel,
+    VentaModel,
+)
+
+SUNAT_EMISOR_RUC = os.getenv("SUNAT_EMISOR_RUC", "20000000001")
+SUNAT_EMISOR_RAZON_SOCIAL = os.getenv("SUNAT_EMISOR_RAZON_SOCIAL", "NEXUS DISTRIBUCIONES S.A.C.")
+SUNAT_SERIE_FACTURA = os.getenv("SUNAT_SERIE_FACTURA", "F001")
+SUNAT_SERIE_BOLETA = os.getenv("SUNAT_SERIE_BOLETA", "B001")
+IGV_TASA = Decimal(os.getenv("IGV_TASA", "0.18"))
+
+_CENTIMO = Decimal("0.01")
+_FACTOR_IGV = 1 + IGV_TASA
+_PORCENTAJE_IGV = f"{IGV_TASA * 100:.2f}"
+
+# Catálogos SUNAT: 01 factura / 03 boleta; 6 RUC / 1 DNI
+_TIPO_FACTURA, _TIPO_BOLETA = "01", "03"
+_DOC_RUC, _DOC_DNI = "6", "1"
+
+_CABECERA = """<?xml version="1.0" encoding="UTF-8"?>
+<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2" \
+xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" \
+xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2" \
+xmlns:ds="http://www.w3.org/2000/09/xmldsig#" \
+xmlns:ext="urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2">
+<ext:UBLExtensions><ext:UBLExtension><ext:ExtensionContent/></ext:UBLExtension></ext:UBLExtensions>
+<cbc:UBLVersionID>2.1</cbc:UBLVersionID>
+<cbc:CustomizationID>2.0</cbc:CustomizationID>
+<cbc:ID>{numero}</cbc:ID>
+<cbc:IssueDate>{fecha}</cbc:IssueDate>
+<cbc:IssueTime>{hora}</cbc:IssueTime>
+<cbc:InvoiceTypeCode listID="0101">{tipo}</cbc:InvoiceTypeCode>
+<cbc:DocumentCurrencyCode>PEN</cbc:DocumentCurrencyCode>
+<cbc:LineCountNumeric>{lineas}</cbc:LineCountNumeric>
+<cac:Signature><cbc:ID>{ruc}</cbc:ID><cac:SignatoryParty><cac:PartyIdentification><cbc:ID>{ruc}</cbc:ID>\
+</cac:PartyIdentification><cac:PartyName><cbc:Name>{emisor}</cbc:Name></cac:PartyName></cac:SignatoryParty>\
+<cac:DigitalSignatureAttachment><cac:ExternalReference><cbc:URI>#SignatureSP</cbc:URI></cac:ExternalReference>\
+</cac:DigitalSignatureAttachment></cac:Signature>
+<cac:AccountingSupplierParty><cac:Party><cac:PartyIdentification><cbc:ID schemeID="6">{ruc}</cbc:ID>\
+</cac:PartyIdentification><cac:PartyLegalEntity><cbc:RegistrationName>{emisor}</cbc:RegistrationName>\
+</cac:PartyLegalEntity></cac:Party></cac:AccountingSupplierParty>
+<cac:AccountingCustomerParty><cac:Party><cac:PartyIdentification><cbc:ID schemeID="{tipo_doc}">{doc_cliente}</cbc:ID>\
+</cac:PartyIdentification><cac:PartyLegalEntity><cbc:RegistrationName>{cliente}</cbc:RegistrationName>\
+</cac:PartyLegalEntity></cac:Party></cac:AccountingCustomerParty>
+"""
+
+_IMPUESTO = """<cac:TaxTotal><cbc:TaxAmount currencyID="PEN">{igv}</cbc:TaxAmount><cac:TaxSubtotal>\
+<cbc:TaxableAmount currencyID="PEN">{base}</cbc:TaxableAmount><cbc:TaxAmount currencyID="PEN">{igv}</cbc:TaxAmount>\
+<cac:TaxCategory>{porcentaje}<cac:TaxScheme><cbc:ID>1000</cbc:ID><cbc:Name>IGV</cbc:Name>\
+<cbc:TaxTypeCode>VAT</cbc:TaxTypeCode></cac:TaxScheme></cac:TaxCategory></cac:TaxSubtotal></cac:TaxTotal>"""
+
+_TOTALES = """
+<cac:LegalMonetaryTotal><cbc:LineExtensionAmount currencyID="PEN">{base}</cbc:LineExtensionAmount>\
+<cbc:TaxInclusiveAmount currencyID="PEN">{total}</cbc:TaxInclusiveAmount>\
+<cbc:PayableAmount currencyID="PEN">{total}</cbc:PayableAmount></cac:LegalMonetaryTotal>
+"""
+
+_LINEA = """<cac:InvoiceLine><cbc:ID>{n}</cbc:ID><cbc:InvoicedQuantity unitCode="NIU">{cantidad}</cbc:InvoicedQuantity>\
+<cbc:LineExtensionAmount currencyID="PEN">{base}</cbc:LineExtensionAmount><cac:PricingReference>\
+<cac:AlternativeConditionPrice><cbc:PriceAmount currencyID="PEN">{precio}</cbc:PriceAmount>\
+<cbc:PriceTypeCode>01</cbc:PriceTypeCode></cac:AlternativeConditionPrice></cac:PricingReference>\
+{impuesto}<cac:Item><cbc:Description>{descripcion}</cbc:Description><cac:SellersItemIdentification>\
+<cbc:ID>{sku}</cbc:ID></cac:SellersItemIdentification></cac:Item><cac:Price>\
+<cbc:PriceAmount currencyID="PEN">{valor_unitario}</cbc:PriceAmount></cac:Price></cac:InvoiceLine>
+"""
+
+_PIE = "</Invoice>\n"
+
+# Categoría de IGV de cada línea (gravado, operación onerosa): igual en todas, así
+# que se incrusta una vez al importar y cada línea es un único `format`
+_CATEGORIA_LINEA = (f"<cbc:Percent>{_PORCENTAJE_IGV}</cbc:Percent>"
+                    "<cbc:TaxExemptionReasonCode>10</cbc:TaxExemptionReasonCode>")
+_LINEA = _LINEA.replace("{impuesto}", _IMPUESTO.replace("{porcentaje}", _CATEGORIA_LINEA))
+
+
+def _esc(texto) -> str:
+    texto = "" if texto is None else str(texto)
+    # La mayoría de nombres no llevan caracteres especiales: sin copias en ese caso
+    if "&" in texto:
+        texto = texto.replace("&", "&amp;")
+    if "<" in texto:
+        texto = texto.replace("<", "&lt;")
+    if ">" in texto:
+        texto = texto.replace(">", "&gt;")
+    if '"' in texto:
+        texto = texto.replace('"', "&quot;")
+    return texto
+
+
+def _redondear(valor: Decimal) -> Decimal:
+    return valor.quantize(_CENTIMO, rounding=ROUND_HALF_UP)
+
+
+class UBLGenerator:
+
+    @staticmethod
+    def numero(venta) -> str:
+        """Serie-correlativo asignados al crear la venta (ver `numeracion`)."""
+        if venta.correlativo is None:
+            raise ValueError(f"La venta {venta.id} no tiene correlativo SUNAT")
+        return f"{venta.serie}-{venta.correlativo:08d}"
+
+    @staticmethod
+    def numeracion(cliente_id) -> dict:
+        """
+        `serie` y `correlativo` de una venta nueva como expresiones SQL, para el
+        INSERT (o el constructor ORM): se resuelven en la misma sentencia, sin
+        otro viaje. Factura si el cliente tiene RUC (11 dígitos), como `_es_factura`.
+        """
+        ruc_dni = select(ClienteModel.ruc_dni).where(ClienteModel.id == cliente_id).scalar_subquery()
+        es_factura = func.length(ruc_dni) == 11
+        return {
+            "serie": case((es_factura, SUNAT_SERIE_FACTURA), else_=SUNAT_SERIE_BOLETA),
+            # CASE evalúa sólo la rama elegida: se consume un único nextval
+            "correlativo": case((es_factura, CORRELATIVO_FACTURA.next_value()), else_=CORRELATIVO_BOLETA.next_value()),
+        }
+
+    @staticmethod
+    def _es_factura(venta) -> bool:
+        cliente = venta.cliente
+        return cliente is not None and len(cliente.ruc_dni or "") == 11
+
+    @staticmethod
+    def generar_xml_factura(venta) -> str:
+        """Documento UBL 2.1 de la venta. Necesita `venta.cliente`, `venta.detalles` y `detalle.producto`."""
+        partes: List[str] = []
+        base_total = igv_total = Decimal(0)
+
+        for n, detalle in enumerate(venta.detalles, start=1):
+            subtotal = Decimal(detalle.subtotal)
+            base = _redondear(subtotal / _FACTOR_IGV)
+            igv = subtotal - base
+            base_total += base
+            igv_total += igv
+            producto = detalle.producto
+            partes.append(_LINEA.format(
+                n=n,
+                cantidad=detalle.cantidad,
+                base=base,
+                precio=f"{detalle.precio_unitario:.2f}",
+                igv=igv,
+                descripcion=_esc(producto.nombre if producto else ""),
+                sku=_esc(producto.sku if producto else ""),
+                valor_unitario=_redondear(Decimal(detalle.precio_unitario) / _FACTOR_IGV),
+            ))
+
+        es_factura = UBLGenerator._es_factura(venta)
+        cliente = venta.cliente
+        cabecera = _CABECERA.format(
+            numero=UBLGenerator.numero(venta),
+            fecha=f"{venta.fecha:%Y-%m-%d}",
+            hora=f"{venta.fecha:%H:%M:%S}",
+            tipo=_TIPO_FACTURA if es_factura else _TIPO_BOLETA,
+            lineas=len(partes),
+            ruc=SUNAT_EMISOR_RUC,
+            emisor=_esc(SUNAT_EMISOR_RAZON_SOCIAL),
+            tipo_doc=_DOC_RUC if es_factura else _DOC_DNI,
+            doc_cliente=_esc(cliente.ruc_dni if cliente else "-"),
+            cliente=_esc(cliente.razon_social if cliente else "CLIENTES VARIOS"),
+        )
+        pie = _IMPUESTO.format(igv=igv_total, base=base_total, porcentaje="") + _TOTALES.format(
+            base=base_total, total=base_total + igv_total,
+        )
+        return "".join((cabecera, *partes, pie, _PIE))
+
+    @staticmethod
+    def generar_lote(ventas: Iterable) -> List[str]:
+        """XML de varias ventas en una llamada (mismo orden). Conviene cargarlas con `opciones_carga()`."""
+        generar = UBLGenerator.generar_xml_factura
+        return [generar(venta) for venta in ventas]
+
+    @staticmethod
+    def opciones_carga():
+        """Opciones de consulta para traer cliente, líneas y productos sin N+1."""
+        return (
+            joinedload(VentaModel.cliente),
+            selectinload(VentaModel.detalles).joinedload(DetalleVentaModel.producto),
+        )
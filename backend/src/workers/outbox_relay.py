@@ -0,0 +1,73 @@
+import sys
+import os
+import logging
+import signal
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.core.logging_config import configurar_logging
+from src.infrastructure.database import SessionLocal
+from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from src.services.idempotency import purgar_expiradas
+from src.services.outbox import drenar_lote, purgar_enviados
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_POLL_S = float(os.getenv("OUTBOX_POLL_S", "0.5"))
+OUTBOX_BACKOFF_MAX_S = float(os.getenv("OUTBOX_BACKOFF_MAX_S", "30"))
+OUTBOX_PURGA_S = float(os.getenv("OUTBOX_PURGA_S", "3600"))
+
+_detener = False
+
+
+def _pedir_parada(signum, frame):
+    global _detener
+    logger.info("Señal %s recibida: terminando tras el lote en curso", signum)
+    _detener = True
+
+
+def relay():
+    """
+    Drena la tabla outbox hacia Redis: lotes seguidos mientras haya pendientes,
+    una pausa de OUTBOX_POLL_S cuando está vacía y backoff exponencial si
+    Redis o Postgres fallan.
+    """
+    logger.info("Outbox relay iniciado")
+    cola = QueueAdapter()
+    db = SessionLocal()
+    espera_error = OUTBOX_POLL_S
+    ultima_purga = time.monotonic()
+
+    while not _detener:
+        try:
+            publicados = drenar_lote(db, cola)
+            espera_error = OUTBOX_POLL_S
+            if publicados:
+                logger.debug("Lote publicado", extra={"mensajes": publicados})
+                continue
+
+            if time.monotonic() - ultima_purga > OUTBOX_PURGA_S:
+                ultima_purga = time.monotonic()
+                borrados = purgar_enviados(db)
+                if borrados:
+                    logger.info("Mensajes enviados purgados", extra={"filas": borrados})
+                borrados = purgar_expiradas(db)
+                if borrados:
+                    logger.info("Claves de idempotencia caducadas purgadas", extra={"filas": borrados})
+            time.sleep(OUTBOX_POLL_S)
+
+        except Exception:
+            logger.exception("Fallo drenando el outbox, reintento en %.1f s", espera_error)
+            db.rollback()
+            time.sleep(espera_error)
+            espera_error = min(espera_error * 2, OUTBOX_BACKOFF_MAX_S)
+
+    db.close()
+    logger.info("Outbox relay detenido")
+
+
+if __name__ == "__main__":
+    configurar_logging()
+    signal.signal(signal.SIGTERM, _pedir_parada)
+    signal.signal(signal.SIGINT, _pedir_parada)
+    relay()
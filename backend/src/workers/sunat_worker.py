@@ -1,61 +1,324 @@
+"""
+Worker de facturación SUNAT. Dos modos (SUNAT_WORKER_MODO):
+
+- "async" (por defecto): hasta SUNAT_CONCURRENCIA envíos en vuelo en un
+  event loop, con un httpx.AsyncClient keep-alive (services/sunat/cliente.py).
+  Las escrituras a BD y las confirmaciones a Redis corren en un pool de
+  SUNAT_DB_HILOS hilos. SIGTERM deja de leer la cola y espera hasta
+  SUNAT_DRENADO_S a que terminen los envíos en vuelo; lo que no termine queda
+  sin confirmar y otra réplica lo recupera (XAUTOCLAIM).
+- "sync": una factura a la vez, como antes.
+"""
+import asyncio
+import logging
+import signal
 import sys
 import os
 import time
 import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Optional
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
 
+from sqlalchemy import update
+
+from src.core.logging_config import configurar_logging
 from src.infrastructure.database import SessionLocal
 from src.infrastructure.models import VentaModel
-from src.infrastructure.adapters.queue_adapter import QueueAdapter
+from src.infrastructure.adapters.queue_adapter import COLA_CONSUMIDOR, COLA_PROMOCION_LOTE, QueueAdapter, Tarea
+from src.services import dlq
+from src.services.sunat.cliente import ClienteSunat, RespuestaSunat, SunatNoDisponible, SunatRechazo
 from src.services.sunat.ubl_generator import UBLGenerator
 
-def procesar_facturas():
-    print("SUNAT WORKER INICIADO (Esperando facturas...)")
-    cola = QueueAdapter()
+logger = logging.getLogger(__name__)
+
+MAX_INTENTOS = 5
+# Entradas del historial de fallos que viajan con la tarea (y llegan a la dead letter)
+HISTORIAL_MAX = 10
+# Tareas por lectura: facturar tarda segundos, con 1 el reparto entre réplicas es parejo
+COLA_PREFETCH = int(os.getenv("COLA_PREFETCH", "1"))
+
+# Cada cuánto se revisan los reintentos vencidos (todos los workers lo hacen; el script Lua es atómico)
+COLA_PROMOCION_S = float(os.getenv("COLA_PROMOCION_S", "1"))
+
+SUNAT_WORKER_MODO = os.getenv("SUNAT_WORKER_MODO", "async").lower()
+SUNAT_CONCURRENCIA = int(os.getenv("SUNAT_CONCURRENCIA", "50"))
+SUNAT_DB_HILOS = int(os.getenv("SUNAT_DB_HILOS", "8"))
+SUNAT_DRENADO_S = float(os.getenv("SUNAT_DRENADO_S", "30"))
+SUNAT_REPORTE_S = float(os.getenv("SUNAT_REPORTE_S", "30"))
+
+ESTADO_FACTURADA = "FACTURADO_SUNAT"
+
+
+def enviar_a_dlq(tarea: Tarea, error: str, motivo: str):
+    db = SessionLocal()
+    try:
+        dlq.registrar(db, tarea, error, motivo)
+        db.commit()
+    finally:
+        db.close()
+
+
+def descartar_veneno(tarea: Tarea, error: str):
+    enviar_a_dlq(tarea, error, dlq.MOTIVO_VENENO)
+
+
+def _con_fallo(tarea: Tarea, error: str) -> tuple:
+    """Historial de la tarea con este fallo añadido (acotado a HISTORIAL_MAX)."""
+    entrada = {"intento": tarea.attempts + 1, "error": error[:500],
+               "fecha": datetime.utcnow().isoformat(timespec="seconds")}
+    return (tarea.historial + (entrada,))[-HISTORIAL_MAX:]
+
+
+def reintentar_o_descartar(cola: QueueAdapter, tarea: Tarea, motivo):
+    """
+    Fallo transitorio: reintento diferido con backoff (no vuelve a la cola de
+    inmediato). Agotados los intentos, la tarea pasa a la dead letter; si no se
+    puede guardar ahí, no se confirma y se recupera más tarde.
+    """
+    error = str(motivo)
+    historial = _con_fallo(tarea, error)
+    if tarea.attempts < MAX_INTENTOS:
+        espera = cola.programar_reintento(tarea.venta_id, tarea.attempts + 1, historial)
+        logger.warning("Fallo de conexión con SUNAT, reintento en %.0f s: %s", espera, error,
+                       extra={"venta_id": tarea.venta_id, "intento": tarea.attempts + 1})
+    else:
+        logger.error("Máximos intentos alcanzados, enviada a dead letter: %s", error,
+                     extra={"venta_id": tarea.venta_id})
+        enviar_a_dlq(tarea._replace(historial=historial), error, dlq.MOTIVO_MAX_INTENTOS)
+    cola.confirmar(tarea)
+
+
+def descartar_rechazo(cola: QueueAdapter, tarea: Tarea, motivo):
+    """Rechazo permanente de SUNAT: directo a la dead letter, sin gastar reintentos, y se confirma."""
+    error = str(motivo)
+    logger.error("SUNAT rechazó la factura, enviada a dead letter: %s", error, extra={"venta_id": tarea.venta_id})
+    enviar_a_dlq(tarea._replace(historial=_con_fallo(tarea, error)), error, dlq.MOTIVO_RECHAZO)
+    cola.confirmar(tarea)
+
+
+def promover_reintentos(cola: QueueAdapter) -> int:
+    """Devuelve a la cola todos los reintentos vencidos, lote a lote."""
+    total = 0
+    while True:
+        movidas = cola.promover_vencidos()
+        total += movidas
+        if movidas < COLA_PROMOCION_LOTE:
+            return total
+
+
+def procesar_tarea(db, cola: QueueAdapter, tarea: Tarea):
+    """
+    Factura una venta y confirma la tarea. Si algo inesperado falla la tarea
+    NO se confirma: otro worker (o éste) la recupera con XAUTOCLAIM.
+    """
+    venta_id, intentos = tarea.venta_id, tarea.attempts
+    logger.info("Procesando venta", extra={"venta_id": venta_id, "intento": intentos + 1})
+
+    try:
+        venta = db.query(VentaModel).options(*UBLGenerator.opciones_carga()).get(venta_id)
+        if not venta:
+            logger.error("La venta no existe en BD", extra={"venta_id": venta_id})
+            cola.confirmar(tarea)
+            return
+        if venta.estado == ESTADO_FACTURADA:
+            # Entrega al menos una vez (outbox, streams): la tarea puede llegar repetida
+            logger.info("Venta ya facturada, se ignora", extra={"venta_id": venta_id})
+            cola.confirmar(tarea)
+            return
+
+        xml_content = UBLGenerator.generar_xml_factura(venta)
+
+        time.sleep(2)
+
+        if random.random() < 0.2 and intentos < 3:
+            raise TimeoutError("Servidor SUNAT no responde")
+
+        venta.xml_generado = xml_content
+        venta.cdr_sunat = f"CDR-{venta.id}-ACEPTADO"
+        venta.estado = ESTADO_FACTURADA
+        venta.hash_firma = "JKS78-SDF89-SDF78 (Firma Digital Simulada)"
+
+        db.commit()
+        cola.confirmar(tarea)
+        logger.info("Factura aceptada, CDR generado", extra={"venta_id": venta_id})
+
+    except TimeoutError as e:
+        db.rollback()
+        reintentar_o_descartar(cola, tarea, e)
+
+
+def procesar_facturas(consumidor: str = COLA_CONSUMIDOR):
+    logger.info("SUNAT worker iniciado (esperando facturas...)", extra={"consumidor": consumidor})
+    cola = QueueAdapter(al_descartar=descartar_veneno)
     db = SessionLocal()
 
+    migradas = cola.migrar_lista_legada()
+    if migradas:
+        logger.info("Tareas de la lista anterior movidas al stream", extra={"cantidad": migradas})
+
+    ultima_promocion = 0.0
     while True:
         try:
-            task = cola.obtener_tarea()
-            if not task:
-                continue 
-
-            venta_id = task["venta_id"]
-            intentos = task["attempts"]
-
-            print(f"Procesando Venta: {venta_id} (Intento {intentos + 1})")
-            
-            venta = db.query(VentaModel).get(venta_id)
-            if not venta:
-                print(" Error: Venta no existe en BD.")
+            if time.monotonic() - ultima_promocion >= COLA_PROMOCION_S:
+                ultima_promocion = time.monotonic()
+                promover_reintentos(cola)
+            tareas = cola.leer_tareas(consumidor, cantidad=COLA_PREFETCH)
+        except Exception:
+            logger.exception("Cola de facturación no disponible")
+            time.sleep(1)
+            continue
+
+        for tarea in tareas:
+            try:
+                procesar_tarea(db, cola, tarea)
+            except Exception:
+                logger.exception("Error crítico en worker", extra={"venta_id": tarea.venta_id})
+                db.rollback()
+
+
+# --- Modo async ---------------------------------------------------------------
+
+def _preparar_envio(venta_id: str) -> Optional[str]:
+    """XML a enviar, o None si no hay nada que hacer (venta inexistente o ya facturada)."""
+    db = SessionLocal()
+    try:
+        venta = db.get(VentaModel, uuid.UUID(venta_id), options=UBLGenerator.opciones_carga())
+        if not venta:
+            logger.error("La venta no existe en BD", extra={"venta_id": venta_id})
+            return None
+        if venta.estado == ESTADO_FACTURADA:
+            logger.info("Venta ya facturada, se ignora", extra={"venta_id": venta_id})
+            return None
+        return UBLGenerator.generar_xml_factura(venta)
+    finally:
+        db.close()
+
+
+def _guardar_cdr(venta_id: str, xml: str, respuesta: RespuestaSunat):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(VentaModel)
+            .where(VentaModel.id == uuid.UUID(venta_id))
+            .values(xml_generado=xml, cdr_sunat=respuesta.cdr, hash_firma=respuesta.hash_firma,
+                    estado=ESTADO_FACTURADA)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class WorkerAsync:
+    def __init__(self, consumidor: str = COLA_CONSUMIDOR, concurrencia: int = SUNAT_CONCURRENCIA):
+        self.consumidor = consumidor
+        self.concurrencia = concurrencia
+        self.cola = QueueAdapter(al_descartar=descartar_veneno)
+        self.sunat = ClienteSunat(max_conexiones=concurrencia)
+        # Un hilo para la lectura bloqueante de la cola; otros para BD y confirmaciones
+        self._lector = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sunat-cola")
+        self._hilos = ThreadPoolExecutor(max_workers=SUNAT_DB_HILOS, thread_name_prefix="sunat-db")
+        self._en_vuelo = set()
+        self._parar = asyncio.Event()
+        self._facturadas = 0
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._hilos, partial(funcion, *args))
+
+    async def _procesar(self, tarea: Tarea):
+        logger.info("Procesando venta", extra={"venta_id": tarea.venta_id, "intento": tarea.attempts + 1})
+        try:
+            xml = await self._en_hilo(_preparar_envio, tarea.venta_id)
+            if xml is not None:
+                try:
+                    respuesta = await self.sunat.enviar(tarea.venta_id, xml, tarea.attempts)
+                except SunatNoDisponible as e:
+                    await self._en_hilo(reintentar_o_descartar, self.cola, tarea, e)
+                    return
+                except SunatRechazo as e:
+                    await self._en_hilo(descartar_rechazo, self.cola, tarea, e)
+                    return
+                await self._en_hilo(_guardar_cdr, tarea.venta_id, xml, respuesta)
+                self._facturadas += 1
+                logger.info("Factura aceptada, CDR generado", extra={"venta_id": tarea.venta_id})
+            await self._en_hilo(self.cola.confirmar, tarea)
+        except Exception:
+            # Sin confirmar: se recupera con XAUTOCLAIM
+            logger.exception("Error crítico en worker", extra={"venta_id": tarea.venta_id})
+
+    async def _promover(self):
+        while True:
+            try:
+                await self._en_hilo(promover_reintentos, self.cola)
+            except Exception:
+                logger.exception("No se pudieron promover los reintentos vencidos")
+            await asyncio.sleep(COLA_PROMOCION_S)
+
+    async def _reportar(self):
+        anterior, inicio = 0, time.monotonic()
+        while True:
+            await asyncio.sleep(SUNAT_REPORTE_S)
+            ahora = time.monotonic()
+            logger.info("Throughput del worker", extra={
+                "facturas_s": round((self._facturadas - anterior) / (ahora - inicio), 2),
+                "en_vuelo": len(self._en_vuelo), "facturadas": self._facturadas,
+            })
+            anterior, inicio = self._facturadas, ahora
+
+    async def ejecutar(self):
+        loop = asyncio.get_running_loop()
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, self._parar.set)
+        logger.info("SUNAT worker async iniciado", extra={"consumidor": self.consumidor,
+                                                          "concurrencia": self.concurrencia})
+        migradas = await loop.run_in_executor(self._lector, self.cola.migrar_lista_legada)
+        if migradas:
+            logger.info("Tareas de la lista anterior movidas al stream", extra={"cantidad": migradas})
+        fondo = [asyncio.create_task(self._reportar()), asyncio.create_task(self._promover())]
+
+        while not self._parar.is_set():
+            libres = self.concurrencia - len(self._en_vuelo)
+            if libres <= 0:
+                await asyncio.wait(self._en_vuelo, return_when=asyncio.FIRST_COMPLETED)
                 continue
+            try:
+                # Bloqueo corto: la parada se nota en <= 1 s
+                tareas = await loop.run_in_executor(
+                    self._lector, partial(self.cola.leer_tareas, self.consumidor, libres, 1000)
+                )
+            except Exception:
+                logger.exception("Cola de facturación no disponible")
+                await asyncio.sleep(1)
+                continue
+            for tarea in tareas:
+                envio = asyncio.create_task(self._procesar(tarea))
+                self._en_vuelo.add(envio)
+                envio.add_done_callback(self._en_vuelo.discard)
+
+        for tarea_fondo in fondo:
+            tarea_fondo.cancel()
+        await self._drenar()
+
+    async def _drenar(self):
+        if self._en_vuelo:
+            logger.info("Parada: esperando %s envíos en vuelo", len(self._en_vuelo))
+            _, pendientes = await asyncio.wait(set(self._en_vuelo), timeout=SUNAT_DRENADO_S)
+            for envio in pendientes:
+                envio.cancel()
+            if pendientes:
+                logger.warning("%s envíos sin terminar quedan para otra réplica", len(pendientes))
+        await self.sunat.cerrar()
+        self._lector.shutdown(wait=False)
+        self._hilos.shutdown(wait=True)
+        logger.info("SUNAT worker async detenido", extra={"facturadas": self._facturadas})
 
-            xml_content = UBLGenerator.generar_xml_factura(venta)
-            
-            time.sleep(2) 
-            
-            if random.random() < 0.2 and intentos < 3:
-                raise TimeoutError("Servidor SUNAT no responde")
-
-            venta.xml_generado = xml_content
-            venta.cdr_sunat = f"CDR-{venta.id}-ACEPTADO"
-            venta.estado = "FACTURADO_SUNAT"
-            venta.hash_firma = "JKS78-SDF89-SDF78 (Firma Digital Simulada)"
-            
-            db.commit()
-            print(f" [SUNAT] Factura Aceptada. CDR Generado.")
-
-        except TimeoutError:
-            print(f"[RETRY] Fallo de conexión. Re-encolando...")
-            if task["attempts"] < 5:
-                task["attempts"] += 1
-                cola.encolar_factura(venta_id) 
-            else:
-                print(" [DEAD LETTER] Máximos intentos alcanzados. Alerta al Admin.")
-        
-        except Exception as e:
-            print(f" Error crítico en worker: {e}")
-            if 'db' in locals(): db.rollback()
 
 if __name__ == "__main__":
-    procesar_facturas()
\ No newline at end of file
+    configurar_logging()
+    if SUNAT_WORKER_MODO == "sync":
+        procesar_facturas()
+    else:
+        asyncio.run(WorkerAsync().ejecutar())
@@ -97,6 +97,36 @@ if(searchInput) {
     searchInput.addEventListener('keypress', (e) => {
         if (e.key === 'Enter') buscarProductos();
     });
+    // Sugerencias mientras se escribe: endpoint de prefijos (la búsqueda con IA sólo con Enter/botón)
+    let temporizadorSugerencias = null;
+    searchInput.addEventListener('input', () => {
+        clearTimeout(temporizadorSugerencias);
+        temporizadorSugerencias = setTimeout(() => cargarSugerencias(searchInput.value), 120);
+    });
+}
+
+async function cargarSugerencias(texto) {
+    const lista = document.getElementById('search-sugerencias');
+    if (!lista) return;
+    if (!texto.trim()) {
+        lista.innerHTML = '';
+        return;
+    }
+    try {
+        const res = await fetch(`${API_URL}/api/market/autocomplete?q=${encodeURIComponent(texto)}&limit=8`);
+        if (!res.ok) return;
+        const sugerencias = await res.json();
+        // Nombres y SKUs vienen del catálogo: nodos con textContent, nunca HTML interpolado
+        const opciones = sugerencias.map(s => {
+            const opcion = document.createElement('option');
+            opcion.value = s.texto;
+            opcion.textContent = s.tipo === 'categoria' ? 'Categoría' : (s.sku || '');
+            return opcion;
+        });
+        lista.replaceChildren(...opciones);
+    } catch (error) {
+        console.error(" Error en autocompletado:", error);
+    }
 }
 
 function buscarProductos() {
@@ -121,6 +151,8 @@ function agregarAlCarrito(id, nombre, precio) {
 
 function guardarCarrito() {
     localStorage.setItem('nexus_cart', JSON.stringify(carrito));
+    // Otro carrito = otra compra: la Idempotency-Key sólo vale para reintentos del mismo
+    sessionStorage.removeItem('nexus_checkout_key');
     actualizarBadgeCarrito();
 }
 
@@ -184,17 +216,27 @@ async function procesarCheckout() {
     btn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Conectando con SUNAT...';
     btn.disabled = true;
 
+    let claveCompra = sessionStorage.getItem('nexus_checkout_key');
+    if (!claveCompra) {
+        claveCompra = crypto.randomUUID();
+        sessionStorage.setItem('nexus_checkout_key', claveCompra);
+    }
+
     try {
         const res = await fetch(`${API_URL}/api/market/checkout`, {
             method: 'POST',
             headers: { 
                 'Content-Type': 'application/json',
-                'Authorization': `Bearer ${token}` 
+                'Authorization': `Bearer ${token}`,
+                'Idempotency-Key': claveCompra
             },
             body: JSON.stringify(carrito)
         });
 
-        if (!res.ok) throw new Error("Error en la pasarela de pagos.");
+        if (!res.ok) {
+            const err = await res.json().catch(() => ({}));
+            throw new Error(err.detail || "Error en la pasarela de pagos.");
+        }
 
         const data = await res.json();
         